@@ -0,0 +1,271 @@
+import argparse  # command line parsing
+import json  # corpus manifests and results file
+import os  # filesystem helpers
+import platform  # machine description in the results
+import random  # deterministic corpus generation
+import shutil  # scratch directory cleanup
+import subprocess  # git revision of the tree under test
+import sys  # exit codes
+import tempfile  # scratch output / cache directories
+import time  # stage timing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor  # one fresh process per stage, probe pool
+import multiprocessing  # spawn context: a stage's peak RSS must not include the parent's
+from PIL import Image, ImageDraw, __version__ as PILLOW_VERSION  # synthetic images
+from stitch_engine import (probe_metadata, source_heights, plan_parts, render_preview, stitch_parts,  # headless pipeline
+                           default_workers, FORMAT_MAX_HEIGHT)
+from item_model import ItemStore  # the GUI's image list and height aggregate
+from transform_plan import oriented_size
+from metadata_store import MetadataStore
+from strip_cache import StripCache
+
+try:
+    import resource  # peak RSS; not available on Windows
+except ImportError:
+    resource = None
+
+CORPUS_VERSION = 1  # bump when generation changes, so cached corpora are rebuilt
+CORPUS_SIZES = [(4000, 3000), (3000, 4000), (1920, 1080), (1080, 1920), (1080, 2400), (1200, 1200), (800, 3200), (640, 480)]
+CORPUS_SCALE = 0.25  # shrink the camera-like sizes above so thousands of sources stay quick to generate
+STAGES = ("import", "import_cached", "height", "preview", "stitch", "restitch")
+PROBE_WORKERS = min(16, (os.cpu_count() or 1) * 2)  # as the GUI's IMPORT_PROBE_WORKERS
+PREVIEW_BOX = (800, 600)
+
+
+def corpus_spec(count, seed):  # deterministic list of (file name, size, format, EXIF orientation, rotation)
+    rng = random.Random(f"{seed}:{count}")
+    spec = []
+    for i in range(count):
+        w, h = rng.choice(CORPUS_SIZES)
+        size = (max(16, int(w * CORPUS_SCALE * rng.uniform(0.8, 1.2))), max(16, int(h * CORPUS_SCALE * rng.uniform(0.8, 1.2))))
+        fmt = "PNG" if rng.random() < 0.25 else "JPEG"
+        orientation = rng.choice((1, 1, 1, 3, 6, 8)) if fmt == "JPEG" else 1
+        rotation = rng.choice((0, 0, 0, 90, 180, 270))  # user rotations, as set with the rotate button
+        spec.append((f"img{i:05d}{'.png' if fmt == 'PNG' else '.jpg'}", size, fmt, orientation, rotation))
+    return spec
+
+
+def _draw_source(size, rng):  # gradient plus blocks: compresses like a photo more than flat colour does
+    w, h = size
+    img = Image.linear_gradient("L").resize(size).convert("RGB")
+    draw = ImageDraw.Draw(img)
+    for _ in range(12):
+        x0, y0 = rng.randrange(w), rng.randrange(h)
+        draw.rectangle((x0, y0, x0 + rng.randrange(1, w // 2 + 2), y0 + rng.randrange(1, h // 2 + 2)),
+                       fill=(rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+    return img
+
+
+def ensure_corpus(root, count, seed):  # (paths, rotations); reuses an existing corpus built with the same parameters
+    directory = os.path.join(root, f"corpus-{count}-{seed}")
+    manifest_path = os.path.join(directory, "manifest.json")
+    spec = corpus_spec(count, seed)
+    key = {"version": CORPUS_VERSION, "count": count, "seed": seed, "pillow": PILLOW_VERSION}
+    try:
+        with open(manifest_path, encoding="utf-8") as f:
+            fresh = json.load(f) == key
+    except (OSError, ValueError):
+        fresh = False
+    if not fresh:
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory)
+        rng = random.Random(f"{seed}:{count}:pixels")
+        for name, size, fmt, orientation, _ in spec:
+            img = _draw_source(size, rng)
+            if fmt == "PNG":
+                img.save(os.path.join(directory, name), "PNG", compress_level=1)
+            else:
+                exif = Image.Exif(); exif[0x0112] = orientation
+                img.save(os.path.join(directory, name), "JPEG", quality=90, exif=exif)
+        with open(manifest_path, "w", encoding="utf-8") as f:
+            json.dump(key, f)  # written last: an interrupted build is regenerated next time
+    paths = [os.path.join(directory, name) for name, *_ in spec]
+    rotations = {os.path.join(directory, name): rotation for name, _, _, _, rotation in spec if rotation}
+    return paths, rotations
+
+
+def peak_rss_bytes():  # high-water mark of this process and its finished children, None where unsupported
+    if resource is None: return None
+    unit = 1 if sys.platform == "darwin" else 1024  # ru_maxrss is bytes on macOS, KiB elsewhere
+    return max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) * unit
+
+
+def _probe_all(paths):  # the GUI's import path without Tk: dedupe, then header probes on a thread pool
+    index = set(); new_paths = []
+    for path in paths:
+        if path.lower().endswith((".png", ".jpg", ".jpeg")):
+            abs_fp = os.path.abspath(os.path.expanduser(path))
+            if abs_fp not in index:
+                index.add(abs_fp); new_paths.append(abs_fp)
+    with ThreadPoolExecutor(PROBE_WORKERS) as pool:
+        return list(zip(new_paths, pool.map(probe_metadata, new_paths)))
+
+
+def _stage_import(paths, rotations, args, scratch):
+    store = MetadataStore(os.path.join(scratch, "cache"))
+    model = ItemStore(); model.add_many(paths)
+    probed = _probe_all(paths)
+    for path, (size, orientation) in probed:
+        model.set_rotation(path, rotations.get(path, 0)); model.set_size(path, oriented_size(size, orientation), orientation)
+    store.put_many([(path, size, orientation) for path, (size, orientation) in probed])
+    return {"images": len(probed), "expected_height": model.total_height(args.width)}
+
+
+def _stage_import_cached(paths, rotations, args, scratch):  # second session: everything comes from the store
+    store = MetadataStore(os.path.join(scratch, "cache"))
+    store.put_many([(path, size, orientation) for path, (size, orientation) in _probe_all(paths)])
+    started = time.perf_counter()  # only the lookup is timed; the store above stands in for an earlier session
+    known = MetadataStore(os.path.join(scratch, "cache")).lookup(paths)
+    model = ItemStore(); model.add_many(paths)
+    for path, (size, orientation) in known.items():
+        model.set_rotation(path, rotations.get(path, 0)); model.set_size(path, oriented_size(size, orientation), orientation)
+    return {"images": len(known), "expected_height": model.total_height(args.width),
+            "seconds": time.perf_counter() - started}
+
+
+def _stage_height(paths, rotations, args, scratch):  # per-edit height update and the stitch-time part plan
+    sizes = {path: oriented_size(size, orientation) for path, (size, orientation) in _probe_all(paths)}
+    started = time.perf_counter()
+    model = ItemStore(); model.add_many(paths)
+    for path, size in sizes.items():
+        model.set_rotation(path, rotations.get(path, 0)); model.set_size(path, size)
+    for path in paths[:100]:  # rotate a few back and forth, as the GUI does per click
+        model.set_rotation(path, rotations.get(path, 0) + 90); model.set_rotation(path, rotations.get(path, 0))
+    total = model.total_height(args.width)
+    heights = source_heights(model.paths, model.rotations(), args.width, model.sizes())
+    parts = plan_parts(heights, FORMAT_MAX_HEIGHT[args.format])
+    return {"images": len(paths), "expected_height": total, "parts": len(parts), "seconds": time.perf_counter() - started}
+
+
+def _stage_preview(paths, rotations, args, scratch):  # keyboard-navigation style: consecutive images, cold cache
+    sample = paths[:args.previews]
+    for path in sample:
+        render_preview(path, rotations.get(path, 0), PREVIEW_BOX, draft=not args.exact)
+    return {"images": len(sample)}
+
+
+def _stage_stitch(paths, rotations, args, scratch, strip_cache=None):
+    out_path = os.path.join(scratch, "out" + (".png" if args.format == "PNG" else ".webp" if args.format.startswith("WEBP") else ".jpg"))
+    missing = []
+    results = stitch_parts(paths, rotations, args.width, out_path, args.format, args.quality, on_missing=missing.append,
+                           workers=args.workers, draft=not args.exact, preset=args.preset, strip_cache=strip_cache)
+    return {"images": len(paths) - len(missing), "height": sum(r.height for r in results), "parts": len(results),
+            "bytes": sum(r.nbytes for r in results), "encode_seconds": round(sum(r.encode_seconds for r in results), 3)}
+
+
+def _stage_restitch(paths, rotations, args, scratch):  # stitch, reverse the order, stitch again with the strip cache warm
+    strip_cache = StripCache()
+    try:
+        _stage_stitch(paths, rotations, args, scratch, strip_cache)
+        started = time.perf_counter()
+        details = _stage_stitch(paths[::-1], rotations, args, scratch, strip_cache)
+        return dict(details, cache_hits=strip_cache.hits, seconds=time.perf_counter() - started)
+    finally:
+        strip_cache.close()
+
+
+STAGE_FUNCTIONS = {"import": _stage_import, "import_cached": _stage_import_cached, "height": _stage_height,
+                   "preview": _stage_preview, "stitch": _stage_stitch, "restitch": _stage_restitch}
+
+
+def run_stage(stage, paths, rotations, args):  # runs in a fresh process; returns the stage's measurements
+    scratch = tempfile.mkdtemp(prefix="stitch-bench-")
+    try:
+        started = time.perf_counter()
+        details = STAGE_FUNCTIONS[stage](paths, rotations, args, scratch)
+        seconds = details.pop("seconds", time.perf_counter() - started)  # stages with setup time their own core
+        return dict(seconds=round(seconds, 4), peak_rss_bytes=peak_rss_bytes(), **details)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+def git_revision():
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                             capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                               capture_output=True, text=True, check=True).stdout.strip()
+        return rev + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(args):
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for count in args.sizes:
+        generated = time.perf_counter()
+        paths, rotations = ensure_corpus(args.corpus_dir, count, args.seed)
+        print(f"corpus {count}: ready in {time.perf_counter() - generated:.1f}s")
+        for stage in args.stages:
+            runs = []
+            for _ in range(args.repeat):
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:  # fresh RSS high-water mark
+                    runs.append(pool.submit(run_stage, stage, paths, rotations, args).result())
+            best = min(runs, key=lambda r: r["seconds"])
+            entry = dict(best, corpus=count, stage=stage, runs=[r["seconds"] for r in runs],
+                         peak_rss_bytes=max((r["peak_rss_bytes"] or 0) for r in runs) or None)
+            results.append(entry)
+            rss = f", peak RSS {entry['peak_rss_bytes'] / 2 ** 20:.0f} MB" if entry["peak_rss_bytes"] else ""
+            print(f"  {stage:<14} {entry['seconds']:8.3f}s{rss}")
+    return results
+
+
+def compare(results, baseline_path):  # per-stage ratios against an earlier results file
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {(r["corpus"], r["stage"]): r for r in json.load(f)["results"]}
+    print(f"compared with {baseline_path}:")
+    for r in results:
+        old = baseline.get((r["corpus"], r["stage"]))
+        if not old: continue
+        ratio = r["seconds"] / old["seconds"] if old["seconds"] else float("inf")
+        rss = ""
+        if r["peak_rss_bytes"] and old.get("peak_rss_bytes"):
+            rss = f", RSS {r['peak_rss_bytes'] / old['peak_rss_bytes']:.2f}x"
+        print(f"  {r['corpus']:>6} {r['stage']:<14} {old['seconds']:8.3f}s -> {r['seconds']:8.3f}s ({ratio:.2f}x{rss})")
+
+
+def _int_list(text):
+    return [int(v) for v in text.split(",") if v.strip()]
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Benchmark import, height estimation, preview and stitching on synthetic corpora.")
+    parser.add_argument("--sizes", type=_int_list, default=[10, 100, 1000], help="corpus sizes, comma separated (default 10,100,1000; up to 5000)")
+    parser.add_argument("--stages", type=lambda s: s.split(","), default=list(STAGES), help=f"comma separated subset of {','.join(STAGES)}")
+    parser.add_argument("--seed", type=int, default=1, help="corpus seed (default 1)")
+    parser.add_argument("--corpus-dir", default=os.path.join(tempfile.gettempdir(), "photo-stitcher-bench"),
+                        help="where generated corpora are kept between runs")
+    parser.add_argument("-o", "--output", default="benchmark-results.json", help="results file (default benchmark-results.json)")
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per stage; the fastest is reported (default 1)")
+    parser.add_argument("-w", "--width", type=int, default=1080, help="output width (default 1080)")
+    parser.add_argument("-f", "--format", default="JPEG", choices=sorted(FORMAT_MAX_HEIGHT), type=str.upper)
+    parser.add_argument("-q", "--quality", type=int, default=95)
+    parser.add_argument("--preset", default="balanced", choices=["fast", "balanced", "smallest"])
+    parser.add_argument("--workers", type=int, default=default_workers(), help="render processes (default: CPU count)")
+    parser.add_argument("--previews", type=int, default=50, help="previews rendered per corpus (default 50)")
+    parser.add_argument("--exact", action="store_true", help="disable JPEG reduced-resolution decoding")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    unknown = [s for s in args.stages if s not in STAGES]
+    if unknown:
+        print(f"error: unknown stage(s): {', '.join(unknown)}", file=sys.stderr); return 2
+    started = time.perf_counter()
+    results = run_benchmarks(args)
+    report = {"revision": git_revision(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+              "python": platform.python_version(), "pillow": PILLOW_VERSION, "platform": platform.platform(),
+              "cpus": os.cpu_count(), "settings": {k: v for k, v in vars(args).items() if k not in ("output", "baseline", "corpus_dir")},
+              "wall_seconds": round(time.perf_counter() - started, 3), "results": results}
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"results written to {args.output}")
+    if args.baseline: compare(results, args.baseline)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
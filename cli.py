@@ -0,0 +1,258 @@
+import argparse  # command line parsing
+import json  # manifests
+import os  # filesystem helpers
+import sys  # exit codes
+import time  # per-job timing
+from concurrent.futures import ProcessPoolExecutor, as_completed  # concurrent batch jobs
+from stitch_engine import stitch_parts, StitchError, default_workers  # same pipeline as the GUI; no Tk imports
+from stream_encoders import ENCODER_PRESETS
+from instrumentation import StitchTrace, configure_logging  # per-stage timings, structured logs
+from memory_budget import STITCH_MEMORY_BUDGET_BYTES  # default peak-memory budget per job
+from incremental import IncrementalStitch  # watch: append to an existing output
+from folder_watch import FolderWatcher, WATCH_SETTLE_SECONDS  # watch: new files in a folder
+
+FORMATS_BY_EXT = {".jpg": "JPEG", ".jpeg": "JPEG", ".png": "PNG", ".webp": "WEBP"}
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")  # inputs picked up by watch, as in the GUI
+OUTPUT_FORMATS = ["JPEG", "PNG", "WEBP", "WEBP_LOSSLESS"]
+
+
+def _resolve(path, base_dir):  # manifest paths are relative to the manifest
+    return os.path.abspath(os.path.join(base_dir, os.path.expanduser(path)))
+
+
+def load_image_list(manifest_path):  # JSON job, JSON list, or one path per line
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    with open(manifest_path, encoding="utf-8") as f:
+        text = f.read()
+    if manifest_path.lower().endswith(".json"):
+        data = json.loads(text)
+        return parse_job(data, base_dir)["images"] if isinstance(data, dict) else parse_images(data, base_dir)
+    return [(_resolve(line.strip(), base_dir), 0) for line in text.splitlines() if line.strip() and not line.startswith("#")]
+
+
+def parse_images(entries, base_dir):  # "path" or {"path": ..., "rotation": 90}
+    images = []
+    for entry in entries:
+        if isinstance(entry, str): images.append((_resolve(entry, base_dir), 0))
+        else: images.append((_resolve(entry["path"], base_dir), int(entry.get("rotation", 0)) % 360))
+    return images
+
+
+def parse_job(data, base_dir):  # normalize one job description from a manifest
+    output = _resolve(data["output"], base_dir) if "output" in data else None
+    return {
+        "name": data.get("name") or (os.path.basename(output) if output else "job"),
+        "images": parse_images(data.get("images", []), base_dir),
+        "width": int(data.get("width", 1080)),
+        "format": (data.get("format") or infer_format(output)).upper(),
+        "quality": int(data.get("quality", 95)),
+        "output": output,
+        "workers": int(data.get("workers", 1)),
+        "draft": bool(data.get("fast_decode", True)),
+        "max_height": int(data["max_height"]) if data.get("max_height") else None,
+        "at_boundaries": data.get("split", "boundary") != "height",
+        "preset": data.get("preset", "balanced"),
+        "subsampling": data.get("subsampling"),
+        "trace_file": _resolve(data["trace"], base_dir) if data.get("trace") else None,
+        "memory_budget": int(data["memory_mb"]) * 1024 * 1024 if "memory_mb" in data else None,  # None: the batch default
+        "trim_overlap": bool(data.get("trim_overlap", False)),
+    }
+
+
+def infer_format(output):
+    return FORMATS_BY_EXT.get(os.path.splitext(output or "")[1].lower(), "JPEG")
+
+
+def run_job(job):  # returns a summary dict; never raises, so batch results stay per-job
+    started = time.perf_counter()
+    summary = {"name": job["name"], "output": job["output"], "images": len(job["images"])}
+    missing = []
+    trace = StitchTrace()
+    try:
+        if not job["output"]: raise ValueError("missing output path")
+        if job["width"] <= 0: raise ValueError("output width must be a positive integer")
+        paths = [p for p, _ in job["images"]]
+        rotations = {p: r for p, r in job["images"] if r}
+        results = [r for r in stitch_parts(paths, rotations, job["width"], job["output"], job["format"], job["quality"],
+                                           max_height=job.get("max_height"), at_boundaries=job.get("at_boundaries", True),
+                                           on_missing=missing.append, workers=job["workers"], draft=job["draft"],
+                                           preset=job.get("preset", "balanced"), subsampling=job.get("subsampling"), trace=trace,
+                                           memory_budget=job.get("memory_budget") if job.get("memory_budget") is not None else STITCH_MEMORY_BUDGET_BYTES,
+                                           trim_overlap=job.get("trim_overlap", False), enforce_budget=job.get("enforce_budget", False))
+                   if r.count]
+        if not results: raise ValueError("no images could be processed")
+        summary.update(status="ok", stitched=len(set(p for p in paths if p not in missing)),
+                       height=sum(r.height for r in results), parts=[r.path for r in results],
+                       bytes=sum(r.nbytes for r in results),
+                       encode_seconds=round(sum(r.encode_seconds for r in results), 3))
+    except StitchError as e:
+        summary.update(status="error", error=f"{os.path.basename(e.path)}: {e.error}")
+    except Exception as e:
+        summary.update(status="error", error=str(e))
+    summary["missing"] = missing
+    summary["seconds"] = round(time.perf_counter() - started, 3)
+    trace.finish()
+    summary["stages"] = {stage: s["seconds"] for stage, s in trace.summary().items()}
+    summary["breakdown"] = trace.breakdown()
+    if job.get("trace_file"):
+        try:
+            trace.write(job["trace_file"])
+        except OSError as e:
+            summary.setdefault("error", f"could not write trace: {e}")
+    return summary
+
+
+def run_batch(jobs, concurrency):  # independent jobs across processes, results in completion order
+    if concurrency <= 1:
+        for job in jobs: yield run_job(job)
+        return
+    with ProcessPoolExecutor(max_workers=concurrency) as pool:
+        for future in as_completed([pool.submit(run_job, job) for job in jobs]):
+            yield future.result()
+
+
+def print_summary(summary):
+    if summary["status"] == "ok":
+        print(f"[ok]    {summary['name']}: {summary['stitched']}/{summary['images']} images, "
+              f"{summary['height']}px tall, {summary['bytes']} bytes, {summary['seconds']:.2f}s "
+              f"({summary['encode_seconds']:.2f}s encoding)")
+        if summary["breakdown"]:
+            print(f"        {summary['breakdown']}")
+        if len(summary["parts"]) > 1:
+            print(f"        split into {len(summary['parts'])} parts: {', '.join(os.path.basename(p) for p in summary['parts'])}")
+    else:
+        print(f"[error] {summary['name']}: {summary['error']} ({summary['seconds']:.2f}s)")
+    for path in summary["missing"]:
+        print(f"        skipped missing file: {path}")
+
+
+def run_watch(args):  # append the folder's images to one output, then every new one as it settles
+    folder = os.path.abspath(os.path.expanduser(args.folder))
+    output = os.path.abspath(os.path.expanduser(args.output))
+    params = dict(out_fmt=args.format or infer_format(output), target_w=args.width, quality=args.quality, preset=args.preset,
+                  subsampling=args.subsampling, draft=not args.exact, max_height=args.max_height)
+    try:
+        stitch = IncrementalStitch.load(output, **params) or IncrementalStitch(output, **params)
+    except ValueError as e:
+        print(f"error: {e}", file=sys.stderr); return 2
+    accept = lambda p: p.lower().endswith(IMAGE_EXTENSIONS) and not stitch.owns(p)  # our parts may live in the folder
+    watcher = FolderWatcher(folder, accept, settle=0 if args.once else args.settle, known=[img["path"] for img in stitch.images])
+    print(f"{len(stitch)} images already in {os.path.basename(output)}; watching {folder}" + (" (once)" if args.once else ""))
+    try:
+        while True:
+            ready = watcher.poll()
+            if ready:
+                trace = StitchTrace(); missing = []
+                try:
+                    results = stitch.append(ready, {}, workers=args.workers, on_missing=missing.append, trace=trace)
+                except StitchError as e:
+                    print(f"[error] {os.path.basename(e.path)}: {e.error}; output left as before", file=sys.stderr); return 1
+                trace.finish()
+                if results:
+                    print(f"[ok]    +{sum(r.count for r in results)} images -> {', '.join(os.path.basename(r.path) for r in results)}: "
+                          f"{len(stitch)} images, {stitch.height}px")
+                    if trace.breakdown(): print(f"        {trace.breakdown()}")
+                for path in missing:
+                    print(f"        skipped missing file: {path}")
+            if args.once: return 0
+            time.sleep(args.interval)
+    except KeyboardInterrupt:  # an interrupted append has already rolled back
+        return 130
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Headless photo stitcher (no Tk required).")
+    parser.add_argument("--log-level", help="DEBUG, INFO, WARNING, ... (default: $PHOTO_STITCHER_LOG_LEVEL or INFO)")
+    parser.add_argument("--log-json", action="store_true", help="log one JSON object per line")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    st = sub.add_parser("stitch", help="stitch one image list into a single output")
+    st.add_argument("images", nargs="*", help="input images, in stitch order")
+    st.add_argument("-m", "--manifest", help="JSON job / JSON list / text file with one path per line")
+    st.add_argument("-o", "--output", required=True, help="output file")
+    st.add_argument("-w", "--width", type=int, default=1080, help="output width in pixels (default 1080)")
+    st.add_argument("-f", "--format", choices=OUTPUT_FORMATS, type=str.upper, help="default: from output extension")
+    st.add_argument("-q", "--quality", type=int, default=95, help="JPEG / lossy WebP quality 0-100 (default 95)")
+    st.add_argument("--preset", choices=ENCODER_PRESETS, default="balanced",
+                    help="encoder speed/size trade-off (JPEG: fast is the same as balanced, smallest needs the whole image)")
+    st.add_argument("--subsampling", choices=["4:2:0", "4:2:2", "4:4:4"], help="JPEG chroma subsampling")
+    st.add_argument("--workers", type=int, default=default_workers(), help="render processes (default: CPU count)")
+    st.add_argument("--exact", action="store_true", help="disable JPEG reduced-resolution decoding")
+    st.add_argument("--max-height", type=int, help="split into numbered parts no taller than this (default: format limit)")
+    st.add_argument("--split", choices=["boundary", "height"], default="boundary",
+                    help="cut parts between images (default) or exactly at --max-height")
+    st.add_argument("--trace", help="write per-image, per-stage timings to this JSON file")
+    st.add_argument("--trim-overlap", action="store_true",
+                    help="remove rows repeating the previous image's bottom (consecutive screenshots)")
+    st.add_argument("--memory-mb", type=int, default=STITCH_MEMORY_BUDGET_BYTES // (1024 * 1024),
+                    help="peak-memory budget; picks render workers and in-memory vs. disk-mapped canvases (0: no limit)")
+
+    bt = sub.add_parser("batch", help="run many independent jobs from a JSON manifest")
+    bt.add_argument("manifest", help='JSON: {"jobs": [{"images": [...], "output": ..., "width": ...}, ...]}')
+    bt.add_argument("-j", "--jobs", type=int, default=default_workers(), help="jobs run at once (default: CPU count)")
+    bt.add_argument("--summary", help="also write per-job results to this JSON file")
+    bt.add_argument("--memory-mb", type=int, default=STITCH_MEMORY_BUDGET_BYTES // (1024 * 1024),
+                    help="peak-memory budget shared by the jobs running at once; a job's memory_mb overrides its share")
+
+    wt = sub.add_parser("watch", help="append every image that appears in a folder to one growing output")
+    wt.add_argument("folder", help="folder to watch; images already there are appended first, oldest first")
+    wt.add_argument("-o", "--output", required=True, help="output file; its state is kept in OUTPUT.stitch.json")
+    wt.add_argument("-w", "--width", type=int, default=1080, help="output width in pixels (default 1080)")
+    wt.add_argument("-f", "--format", choices=["JPEG", "PNG"], type=str.upper, help="default: from output extension")
+    wt.add_argument("-q", "--quality", type=int, default=95, help="JPEG quality 0-100 (default 95)")
+    wt.add_argument("--preset", choices=ENCODER_PRESETS, default="balanced",
+                    help="PNG: any; JPEG: balanced (fast is the same; smallest JPEG can't be appended to)")
+    wt.add_argument("--subsampling", choices=["4:2:0", "4:2:2", "4:4:4"], help="JPEG chroma subsampling")
+    wt.add_argument("--workers", type=int, default=default_workers(), help="render processes (default: CPU count)")
+    wt.add_argument("--exact", action="store_true", help="disable JPEG reduced-resolution decoding")
+    wt.add_argument("--max-height", type=int, help="continue in OUTPUT_part02, ... past this height (default: format limit)")
+    wt.add_argument("--settle", type=float, default=WATCH_SETTLE_SECONDS, help="seconds a new file must stay unchanged")
+    wt.add_argument("--interval", type=float, default=1.0, help="seconds between folder scans")
+    wt.add_argument("--once", action="store_true", help="append what is there now and exit (for cron / schedulers)")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    configure_logging(args.log_level, args.log_json)
+    if args.command == "stitch":
+        images = load_image_list(args.manifest) if args.manifest else []
+        images += [(os.path.abspath(os.path.expanduser(p)), 0) for p in args.images]
+        if not images:
+            print("error: no input images", file=sys.stderr); return 2
+        output = os.path.abspath(os.path.expanduser(args.output))
+        job = {"name": os.path.basename(output), "images": images, "width": args.width,
+               "format": args.format or infer_format(output), "quality": args.quality, "output": output,
+               "workers": args.workers, "draft": not args.exact, "max_height": args.max_height,
+               "at_boundaries": args.split == "boundary", "preset": args.preset, "subsampling": args.subsampling,
+               "trace_file": os.path.abspath(os.path.expanduser(args.trace)) if args.trace else None,
+               "memory_budget": args.memory_mb * 1024 * 1024, "trim_overlap": args.trim_overlap}
+        summary = run_job(job)
+        print_summary(summary)
+        return 0 if summary["status"] == "ok" else 1
+    if args.command == "watch":
+        return run_watch(args)
+
+    base_dir = os.path.dirname(os.path.abspath(args.manifest))
+    with open(args.manifest, encoding="utf-8") as f:
+        data = json.load(f)
+    jobs = [parse_job(job, base_dir) for job in (data["jobs"] if isinstance(data, dict) else data)]
+    share = args.memory_mb * 1024 * 1024 // max(1, min(args.jobs, len(jobs)))  # concurrent jobs split the budget
+    for job in jobs:
+        if job["memory_budget"] is None: job["memory_budget"] = share
+    started = time.perf_counter()
+    results = []
+    for summary in run_batch(jobs, max(1, args.jobs)):
+        print_summary(summary); results.append(summary)
+    wall = time.perf_counter() - started
+    failed = sum(1 for r in results if r["status"] != "ok")
+    busy = sum(r["seconds"] for r in results)
+    print(f"{len(results) - failed}/{len(results)} jobs ok in {wall:.2f}s wall ({busy:.2f}s summed job time)")
+    if args.summary:
+        with open(args.summary, "w", encoding="utf-8") as f:
+            json.dump({"wall_seconds": round(wall, 3), "jobs": results}, f, indent=2, ensure_ascii=False)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':  # headless entry point
+    sys.exit(main())
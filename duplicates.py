@@ -0,0 +1,83 @@
+import hashlib  # content digests
+
+HASH_CHUNK = 1024 * 1024  # read size for content digests
+PHASH_SIZE = 8  # dHash grid: 8x8 gradient bits -> 64-bit hash
+PHASH_DECODE_BOX = (64, 64)  # draft-decode target; a JPEG then decodes at 1/8 scale
+SIMILAR_BITS = 6  # hashes at most this many bits apart count as the same picture (re-encoded, resized, re-exported)
+_BANDS = 8  # the 64-bit hash split into bytes: two hashes within 7 bits share at least one byte exactly
+
+
+def content_hash(path):  # BLAKE2b of the file bytes; equal digests mean byte-identical files
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(HASH_CHUNK)
+            if not chunk: break
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def perceptual_hash(path):  # 64-bit difference hash of the image as displayed (EXIF orientation applied)
+    from PIL import Image, ImageOps  # on first use: the app builds its DuplicateIndex before Pillow is loaded
+    with Image.open(path) as img:
+        img.draft("L", PHASH_DECODE_BOX)  # JPEG: DCT-scaled decode, a tiny fraction of the full decode
+        img = ImageOps.exif_transpose(img).convert("L")
+        small = img.resize((PHASH_SIZE + 1, PHASH_SIZE), Image.BOX).tobytes()
+    bits = 0
+    for y in range(PHASH_SIZE):
+        row = small[y * (PHASH_SIZE + 1):(y + 1) * (PHASH_SIZE + 1)]
+        for x in range(PHASH_SIZE):
+            bits = bits << 1 | (row[x] < row[x + 1])
+    return bits
+
+
+def hash_image(path, perceptual=True):  # pool entry point: (digest, phash or None)
+    return content_hash(path), perceptual_hash(path) if perceptual else None
+
+
+class DuplicateIndex:  # exact (digest) and near (phash) lookups over the images already in the list
+    # Near matches use the pigeonhole principle: SIMILAR_BITS < _BANDS, so a match shares one of its 8 bytes with the
+    # query, and only hashes filed under those bytes are compared; lookup cost doesn't grow with the list
+    def __init__(self):
+        self._by_digest = {}  # digest -> {path: None}, in insertion order; the first path is the one matches report
+        self._bands = [{} for _ in range(_BANDS)]  # per byte position: byte value -> {path: phash}
+        self._entries = {}  # path -> (digest, phash)
+
+    def __contains__(self, path):
+        return path in self._entries
+
+    def match(self, digest, phash=None):  # ("exact" | "similar", path) for the first indexed match, or None
+        if digest in self._by_digest: return "exact", next(iter(self._by_digest[digest]))
+        if phash is None: return None
+        best = None
+        for band, value in enumerate(_band_values(phash)):
+            for path, other in self._bands[band].get(value, {}).items():
+                distance = bin(phash ^ other).count("1")
+                if distance <= SIMILAR_BITS and (best is None or distance < best[0]): best = (distance, path)
+        return ("similar", best[1]) if best else None
+
+    def add(self, path, digest, phash=None):
+        self.discard(path)
+        self._entries[path] = (digest, phash)
+        self._by_digest.setdefault(digest, {})[path] = None
+        if phash is not None:
+            for band, value in enumerate(_band_values(phash)):
+                self._bands[band].setdefault(value, {})[path] = phash
+
+    def discard(self, path):
+        entry = self._entries.pop(path, None)
+        if entry is None: return
+        digest, phash = entry
+        copies = self._by_digest[digest]
+        del copies[path]  # the next copy, if any, takes over the digest
+        if not copies: del self._by_digest[digest]
+        if phash is not None:
+            for band, value in enumerate(_band_values(phash)):
+                bucket = self._bands[band].get(value)
+                if bucket is not None:
+                    bucket.pop(path, None)
+                    if not bucket: del self._bands[band][value]
+
+
+def _band_values(phash):
+    return [(phash >> (8 * i)) & 0xFF for i in range(_BANDS)]
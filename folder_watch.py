@@ -0,0 +1,48 @@
+import os  # directory scans
+import time  # settle timing
+
+WATCH_SETTLE_SECONDS = 3.0  # a burst of new files is handed over once nothing in it changed for this long
+WATCH_MAX_DELAY_SECONDS = 15.0  # a settled file is handed over after this long even if others keep changing
+WATCH_POLL_MS = 2000  # UI poll interval
+
+
+class FolderWatcher:  # polls one folder for new image files; no platform notification APIs, so it works on every OS / share
+    # A file counts as complete once its (size, mtime) stopped changing; new files are released together, oldest first,
+    # when the whole burst has settled, so a camera / screenshot tool writing several files lands them in order. A file
+    # that keeps changing (a log, a sync client rewriting it) must not hold the rest back forever: once a complete file
+    # has waited max_delay, every complete file is released and only the changing ones stay behind
+    def __init__(self, folder, accept, settle=WATCH_SETTLE_SECONDS, known=(), max_delay=WATCH_MAX_DELAY_SECONDS):
+        self.folder = folder
+        self.accept = accept  # path -> bool (supported extension)
+        self.settle = settle; self.max_delay = max(settle, max_delay)
+        self._known = set(known)  # already handed over (or present when watching started)
+        self._seen = {}  # path -> ((size, mtime_ns), monotonic time it last changed)
+
+    def poll(self, now=None):  # -> new complete paths, oldest first; [] while a burst is still being written (up to max_delay)
+        now = time.monotonic() if now is None else now
+        try:
+            entries = list(os.scandir(self.folder))
+        except OSError:
+            return []  # folder unmounted / renamed: keep waiting
+        current = set()
+        for entry in entries:
+            path = entry.path
+            if path in self._known or not self.accept(path): continue
+            try:
+                if not entry.is_file(): continue
+                st = entry.stat()
+            except OSError:
+                continue
+            current.add(path)
+            stamp = (st.st_size, st.st_mtime_ns)
+            seen = self._seen.get(path)
+            if seen is None or seen[0] != stamp: self._seen[path] = (stamp, now)
+        for path in list(self._seen):
+            if path not in current: del self._seen[path]  # removed / renamed before it settled
+        settled = [p for p, (_, changed) in self._seen.items() if now - changed >= self.settle]
+        if len(settled) < len(self._seen) and not any(now - self._seen[p][1] >= self.max_delay for p in settled):
+            return []
+        ready = sorted(settled, key=lambda p: (self._seen[p][0][1], p))
+        self._known.update(ready)
+        for path in ready: del self._seen[path]
+        return ready
@@ -0,0 +1,18 @@
+def rotated_size(size, rotation):  # (w, h) after a multiple-of-90 rotation
+    w, h = size
+    return (h, w) if rotation in (90, 270) else (w, h)
+
+
+def scaled_height(size, rotation, target_w):  # stitched height of one source, 0 if it will be skipped
+    ow, oh = rotated_size(size, rotation)
+    if not ow or not oh:
+        return 0
+    return max(1, int(target_w * (oh / ow)))
+
+
+def fit_size(size, rotation, box_size):  # largest rotated size that fits box_size, keeping aspect ratio
+    img_w, img_h = rotated_size(size, rotation)
+    if img_w == 0 or img_h == 0:
+        raise ValueError("图片宽度或高度为0")
+    scale = min(box_size[0] / img_w, box_size[1] / img_h)
+    return (max(1, int(img_w * scale)), max(1, int(img_h * scale))), scale
@@ -0,0 +1,76 @@
+from collections import Counter  # effective size -> number of images
+from geometry import rotated_size, scaled_height  # same rounding as the stitcher
+
+
+class HeightModel:  # incremental expected-height aggregate, updated per add / delete / rotate
+    # Holds no per-image state: callers (item_model.ItemStore) add and remove (size, rotation) pairs as they change
+    def __init__(self):
+        self._sizes = Counter()  # effective (w, h) -> count; photo sets have few distinct sizes
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def add(self, size, rotation=0):
+        self._sizes[rotated_size(size, rotation)] += 1; self._count += 1
+
+    def remove(self, size, rotation=0):
+        effective = rotated_size(size, rotation)
+        self._sizes[effective] -= 1; self._count -= 1
+        if not self._sizes[effective]: del self._sizes[effective]
+
+    def clear(self):
+        self._sizes.clear(); self._count = 0
+
+    def total_height(self, target_w):  # O(distinct sizes); order doesn't matter for the sum
+        return sum(count * scaled_height(size, 0, target_w) for size, count in self._sizes.items())
+
+
+class TrimModel:  # rows trimmed between neighbouring screenshots, as a running total updated per changed pair
+    # Callers (item_model.ItemStore) link / unlink each adjacent pair as rows move, rotate, get probed or go away,
+    # and set() lands a detection result. Each pair's trim scales with the output width, so the total is kept per
+    # pixel of width and a width change costs O(1)
+    def __init__(self):
+        self.overlaps = {}  # (upper path, rotation, lower path, rotation) -> (bottom, top) fractions of height, or None
+        self._pairs = {}  # adjacent pair key -> (upper, lower) displayed height / width, None while unprobed
+        self._unknown = {}  # adjacent pairs with no result yet, not handed out by take_unknown; ordered, for runs
+        self._rows_per_px = 0.0
+
+    def __len__(self):
+        return len(self._pairs)
+
+    def link(self, upper, lower):  # two items (path, rotation, size) that just became neighbours
+        key = (upper.path, upper.rotation, lower.path, lower.rotation)
+        self._pairs[key] = (_aspect(upper.size, upper.rotation), _aspect(lower.size, lower.rotation))
+        self._rows_per_px += self._trim(key)
+        if key not in self.overlaps: self._unknown[key] = None
+
+    def unlink(self, upper, lower):
+        key = (upper.path, upper.rotation, lower.path, lower.rotation)
+        self._rows_per_px -= self._trim(key)
+        del self._pairs[key]; self._unknown.pop(key, None)
+        if not self._pairs: self._rows_per_px = 0.0  # drop float drift whenever the list empties
+
+    def set(self, key, found):  # detection result for a pair, current neighbours or not
+        if key in self._pairs: self._rows_per_px -= self._trim(key)
+        self.overlaps[key] = found
+        if key in self._pairs: self._rows_per_px += self._trim(key)
+        self._unknown.pop(key, None)
+
+    def take_unknown(self):  # neighbour pairs still to analyse, each handed out once, in the order they appeared
+        keys = list(self._unknown); self._unknown.clear()
+        return keys
+
+    def trimmed_rows(self, target_w):  # ≈ rows removed at target_w (each pair's rounding isn't replayed)
+        return max(0, round(target_w * self._rows_per_px))
+
+    def _trim(self, key):
+        found = self.overlaps.get(key); upper, lower = self._pairs[key]
+        if not found or upper is None or lower is None: return 0.0
+        return found[0] * upper + found[1] * lower
+
+
+def _aspect(size, rotation):  # stitched rows per pixel of output width, None while the size is unknown
+    if size is None: return None
+    ow, oh = rotated_size(size, rotation)
+    return oh / ow if ow and oh else 0.0
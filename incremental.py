@@ -0,0 +1,189 @@
+import base64  # raw rows in the JSON state
+import json  # state file
+import logging  # event levels
+import os  # filesystem helpers
+import re  # part file names
+import time  # per-stage timing
+from instrumentation import get_logger, log_event  # structured diagnostics
+from stitch_engine import (iter_rendered, StitchResult, StitchError, StitchCancelled,  # same render pipeline as a full stitch
+                           FORMAT_MAX_HEIGHT, JPEG_MAX_DIMENSION)
+from stream_encoders import open_stream_writer, normalize_preset, streams_output  # resumable PNG / JPEG writers
+
+log = get_logger("incremental")
+
+STATE_SUFFIX = ".stitch.json"  # saved next to the output
+STATE_VERSION = 1
+
+
+class IncrementalStitch:  # an output that only grows: new images are appended, earlier ones are never decoded again
+    # State per image (source identity, rotation, height, offset, part) and per part file (size, writer checkpoint)
+    # is saved next to the output after every append. Parts roll over at max_height: out.jpg, out_part02.jpg, ...
+    def __init__(self, out_path, out_fmt, target_w, quality=95, preset="balanced", subsampling=None, draft=True,
+                 max_height=None):
+        if not streams_output(out_fmt, preset):
+            raise ValueError(f"{out_fmt} ({preset}) output is encoded as a whole and can't be appended to")
+        limit = FORMAT_MAX_HEIGHT.get(out_fmt, JPEG_MAX_DIMENSION)
+        self.out_path = out_path
+        self.params = {"format": out_fmt, "width": target_w, "quality": quality, "preset": normalize_preset(out_fmt, preset),
+                       "subsampling": subsampling, "draft": bool(draft), "max_height": min(max_height or limit, limit)}
+        self.images = []  # {"path", "mtime_ns", "size", "rotation", "height", "offset", "part"}, in output order
+        self.parts = []  # {"path", "height", "bytes", "writer": checkpoint}
+        self._paths = set()
+
+    def __contains__(self, path):
+        return path in self._paths
+
+    def __len__(self):
+        return len(self.images)
+
+    @property
+    def state_path(self):
+        return self.out_path + STATE_SUFFIX
+
+    @property
+    def height(self):
+        return sum(part["height"] for part in self.parts)
+
+    @classmethod
+    def load(cls, out_path, **params):  # saved state for out_path if it still matches the files and the params, else None
+        stitch = cls(out_path, **params)
+        try:
+            with open(stitch.state_path, encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        saved = state.get("params") or {}
+        if saved.get("preset"): saved["preset"] = normalize_preset(saved.get("format"), saved["preset"])  # JPEG "fast" states
+        if state.get("version") != STATE_VERSION or saved != stitch.params:
+            log_event(log, logging.INFO, "state_mismatch", output=out_path, reason="params"); return None
+        for part in state["parts"]:
+            try:
+                size = os.path.getsize(part["path"])
+            except OSError:
+                size = None
+            if size != part["bytes"]:  # edited, replaced or half-written since: appending would corrupt it
+                log_event(log, logging.INFO, "state_mismatch", output=part["path"], reason="size", expected=part["bytes"], found=size)
+                return None
+        stitch.images = state["images"]; stitch._paths = {image["path"] for image in stitch.images}
+        stitch.parts = [dict(part, writer=_decode(part["writer"])) for part in state["parts"]]
+        return stitch
+
+    def save(self):  # atomic: a crash leaves the previous state, which load() then rejects by file size
+        state = {"version": STATE_VERSION, "params": self.params, "images": self.images,
+                 "parts": [dict(part, writer=_encode(part["writer"])) for part in self.parts]}
+        tmp = self.state_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp, self.state_path)
+
+    def part_path(self, index):  # the first part keeps the output name, so a growing output stays where it was
+        if index == 0: return self.out_path
+        root, ext = os.path.splitext(self.out_path)
+        return f"{root}_part{index + 1:02d}{ext}"
+
+    def owns(self, path):  # output, any part (including ones not rolled over to yet) or state file, e.g. to skip when watching
+        path = os.path.abspath(path); out = os.path.abspath(self.out_path)
+        if path in (out, out + STATE_SUFFIX, out + STATE_SUFFIX + ".tmp"): return True
+        root, ext = os.path.splitext(out)
+        return re.fullmatch(re.escape(root) + r"_part\d{2,}" + re.escape(ext), path) is not None
+
+    def append(self, paths, rotations, workers=1, progress=None, cancel_event=None, on_missing=None, trace=None,
+               strip_cache=None):
+        # Renders only `paths` (minus images already in the output) and appends them; returns a StitchResult per part
+        # written to. On any error or cancel every touched part is restored to its previous checkpoint
+        paths = [p for p in dict.fromkeys(paths) if p not in self._paths]
+        if not paths: return []
+        p = self.params; target_w = p["width"]
+        parts = [dict(part) for part in self.parts]; created = []
+        results = {}; added = []
+        fp = writer = None; index = None; done = 0
+        rendered = iter_rendered(paths, rotations, target_w, workers, p["draft"], trace, strip_cache)
+        try:
+            for i_path, strip, error in rendered:
+                if cancel_event is not None and cancel_event.is_set():
+                    raise StitchCancelled()
+                if isinstance(error, FileNotFoundError):
+                    log_event(log, logging.WARNING, "source_missing", path=i_path)
+                    if on_missing: on_missing(i_path)
+                elif error is not None:
+                    raise StitchError(i_path, error)
+                elif strip is None:
+                    log_event(log, logging.WARNING, "source_empty", path=i_path)
+                else:
+                    if writer is None or writer.height + strip.height > p["max_height"]:
+                        if writer is not None: self._close_part(fp, writer, parts[index])
+                        index = len(parts) - 1 if writer is None and parts and parts[-1]["height"] + strip.height <= p["max_height"] else len(parts)
+                        fp, writer = self._open_part(parts, index, created)
+                    offset = writer.height
+                    started = time.perf_counter(); before = fp.tell()
+                    writer.write_strip(strip)
+                    if trace is not None: trace.record("encode", time.perf_counter() - started, i_path, fp.tell() - before)
+                    try:
+                        st = os.stat(i_path)
+                        identity = (st.st_mtime_ns, st.st_size)
+                    except OSError:
+                        identity = (None, None)
+                    added.append({"path": i_path, "mtime_ns": identity[0], "size": identity[1], "rotation": rotations.get(i_path, 0) % 360,
+                                  "height": strip.height, "offset": offset, "part": index})
+                    results[index] = results.get(index, 0) + 1
+                done += 1
+                if progress: progress(done, len(paths), fp.tell() if fp is not None else 0)
+            if cancel_event is not None and cancel_event.is_set():
+                raise StitchCancelled()
+            if writer is not None:
+                started = time.perf_counter()
+                self._close_part(fp, writer, parts[index]); fp = None
+                if trace is not None: trace.record("finish", time.perf_counter() - started, self.part_path(index))
+        except BaseException:
+            rendered.close()
+            if fp is not None: fp.close()
+            self._rollback(created)
+            raise
+        self.parts = parts; self.images.extend(added); self._paths.update(image["path"] for image in added)
+        self.save()
+        log_event(log, logging.INFO, "appended", output=self.out_path, images=len(added), total=len(self.images),
+                  height=self.height, parts=len(self.parts))
+        return [StitchResult(parts[i]["path"], target_w, parts[i]["height"], count, parts[i]["bytes"]) for i, count in sorted(results.items())]
+
+    def _open_part(self, parts, index, created):  # resume the part's checkpoint, or start a new part file
+        p = self.params
+        if index < len(parts):
+            fp = open(parts[index]["path"], "r+b")
+            return fp, open_stream_writer(fp, p["format"], p["width"], p["quality"], p["preset"], p["subsampling"],
+                                          resume=parts[index]["writer"])
+        path = self.part_path(index)
+        parts.append({"path": path, "height": 0, "bytes": 0, "writer": None}); created.append(path)
+        fp = open(path, "wb")
+        return fp, open_stream_writer(fp, p["format"], p["width"], p["quality"], p["preset"], p["subsampling"])
+
+    def _close_part(self, fp, writer, part):
+        try:
+            writer.close()
+            part.update(height=writer.height, bytes=fp.tell(), writer=writer.checkpoint())
+        finally:
+            fp.close()
+
+    def _rollback(self, created):  # parts that existed get their old tail back; parts made by this append are removed
+        p = self.params
+        for part in self.parts:
+            if part["path"] in created: continue
+            try:
+                with open(part["path"], "r+b") as fp:
+                    writer = open_stream_writer(fp, p["format"], p["width"], p["quality"], p["preset"], p["subsampling"],
+                                                resume=part["writer"])
+                    writer.close()
+            except OSError as e:
+                log_event(log, logging.ERROR, "rollback_failed", path=part["path"], error=e)
+        for path in created:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def _encode(checkpoint):  # bytes values (pending rows) as base64 for JSON
+    return {k: {"base64": base64.b64encode(v).decode("ascii")} if isinstance(v, bytes) else v for k, v in checkpoint.items()}
+
+
+def _decode(checkpoint):
+    return {k: base64.b64decode(v["base64"]) if isinstance(v, dict) and "base64" in v else v for k, v in checkpoint.items()}
@@ -0,0 +1,98 @@
+import json  # trace files and JSON log lines
+import logging  # structured events go through the standard logging tree
+import os  # trace file location
+import threading  # parts of a multi-part stitch record concurrently
+import time  # wall clock for the trace
+from collections import defaultdict  # per-stage aggregates
+
+LOGGER_NAME = "photo_stitcher"
+STAGE_LABELS = {"decode": "解码", "rotate": "旋转", "resize": "缩放", "wait": "等待",  # GUI status bar; CLI / service use the keys
+                "encode": "编码", "finish": "收尾", "cache": "缓存", "overlap": "去重叠"}
+
+
+def get_logger(name):  # module loggers live under one root so a single level / handler covers the app
+    return logging.getLogger(f"{LOGGER_NAME}.{name}")
+
+
+def log_event(logger, level, event, **fields):  # "event key=value ..." for people, record.event / record.fields for tools
+    if not logger.isEnabledFor(level): return  # leaves debug-level events nearly free when they are off
+    text = " ".join(f"{k}={v:.4f}" if isinstance(v, float) else f"{k}={v}" for k, v in fields.items())
+    logger.log(level, f"{event} {text}".rstrip(), extra={"event": event, "fields": fields})
+
+
+class JsonLogFormatter(logging.Formatter):  # one JSON object per line
+    def format(self, record):
+        entry = {"time": round(record.created, 3), "level": record.levelname, "logger": record.name,
+                 "event": getattr(record, "event", None) or record.getMessage()}
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info: entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def configure_logging(level=None, json_lines=False):  # level defaults to PHOTO_STITCHER_LOG_LEVEL, then INFO
+    level = (level or os.environ.get("PHOTO_STITCHER_LOG_LEVEL") or "INFO").upper()
+    handler = logging.StreamHandler()
+    handler.setFormatter(JsonLogFormatter() if json_lines else logging.Formatter("%(levelname)s %(name)s: %(message)s"))
+    root = logging.getLogger(LOGGER_NAME)
+    root.handlers[:] = [handler]; root.setLevel(level); root.propagate = False
+
+
+class StitchTrace:  # per-image, per-stage durations and bytes for one stitch; cheap enough to leave on
+    def __init__(self):
+        self.started = time.time()
+        self._t0 = time.perf_counter()
+        self.wall_seconds = None
+        self._lock = threading.Lock()
+        self._seconds = defaultdict(float); self._bytes = defaultdict(int); self._counts = defaultdict(int)
+        self._events = []  # (offset seconds, stage, path, seconds, bytes); plain tuples keep 10k+ images cheap
+
+    def record(self, stage, seconds, path=None, nbytes=0):
+        with self._lock:
+            self._seconds[stage] += seconds; self._bytes[stage] += nbytes; self._counts[stage] += 1
+            self._events.append((time.perf_counter() - self._t0, stage, path, seconds, nbytes))
+
+    def record_many(self, timings, path=None, nbytes=None):  # timings: {stage: seconds}; nbytes: {stage: bytes}
+        for stage, seconds in timings.items():
+            self.record(stage, seconds, path, (nbytes or {}).get(stage, 0))
+
+    def finish(self):
+        self.wall_seconds = time.perf_counter() - self._t0
+
+    def summary(self):  # {stage: {"seconds", "bytes", "count"}}
+        with self._lock:
+            return {stage: {"seconds": round(self._seconds[stage], 4), "bytes": self._bytes[stage], "count": self._counts[stage]}
+                    for stage in self._seconds}
+
+    def breakdown(self, labels=None):  # short text, slowest stage first; worker stages are summed across processes
+        # labels: {stage: display name} (STAGE_LABELS in the GUI); the stage keys otherwise
+        stages = sorted(self.summary().items(), key=lambda item: -item[1]["seconds"])
+        return " · ".join(f"{(labels or {}).get(stage, stage)} {s['seconds']:.1f}s" for stage, s in stages if s["seconds"] >= 0.05)
+
+    def to_dict(self):
+        with self._lock:
+            events = [{"t": round(t, 4), "stage": stage, "path": path, "seconds": round(seconds, 5), "bytes": nbytes}
+                      for t, stage, path, seconds, nbytes in self._events]
+        return {"started": self.started, "wall_seconds": None if self.wall_seconds is None else round(self.wall_seconds, 4),
+                "stages": self.summary(), "events": events}
+
+    def write(self, path):  # JSON trace file
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=1)
+
+
+class StartupTimer:  # milestones from process start to a usable window, as seconds since `started_at`
+    def __init__(self, started_at):  # a time.perf_counter() value taken before the app's imports
+        self._t0 = started_at
+        self.started = time.time() - (time.perf_counter() - started_at)
+        self.marks = {}  # milestone -> seconds, in the order reached; only the first mark of a name counts
+        self.modules = {}  # background-loaded module -> import seconds
+
+    def mark(self, name):
+        return self.marks.setdefault(name, round(time.perf_counter() - self._t0, 4))
+
+    def to_dict(self):
+        return {"started": self.started, "marks": dict(self.marks), "modules": dict(self.modules)}
+
+    def write(self, path):  # JSON report file
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=1)
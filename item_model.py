@@ -0,0 +1,150 @@
+import itertools  # item ids
+from height_model import HeightModel, TrimModel  # expected-height aggregates kept in step with sizes / rotations / order
+
+
+class ImageItem:  # one imported image; __slots__ keeps 10k+ items to a few dozen bytes of fields each
+    __slots__ = ("id", "path", "rotation", "width", "height", "orientation", "duplicate")
+
+    def __init__(self, item_id, path):
+        self.id = item_id; self.path = path
+        self.rotation = 0  # manual rotation, degrees counter-clockwise as Image.rotate takes it (left turn = 90)
+        self.width = self.height = None  # as displayed (EXIF orientation applied); None until probed
+        self.orientation = None  # EXIF orientation, for thumbnails stored in file orientation
+        self.duplicate = None  # ("exact" | "similar", earlier path) when flagged on import
+
+    @property
+    def size(self):
+        return None if self.width is None else (self.width, self.height)
+
+
+class ItemStore:  # the image list: stitch order plus one ImageItem per path, O(1) by path, id or position
+    # `paths` is the ordered list every view reads (list widget, overview, stitch snapshots); it is only changed
+    # through the bulk operations below, which keep the items, the id and position indexes and the height / trim
+    # aggregates in step, each touching only the rows it moves
+    def __init__(self):
+        self.paths = []  # stitch order
+        self._items = {}  # path -> ImageItem
+        self._positions = {}  # path -> index in paths
+        self._by_id = {}  # id -> ImageItem
+        self._ids = itertools.count(1)
+        self.heights = HeightModel()  # over items whose size is known
+        self.trims = TrimModel()  # over adjacent pairs
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __contains__(self, path):
+        return path in self._items
+
+    def __getitem__(self, idx):  # item at a list position
+        return self._items[self.paths[idx]]
+
+    def __iter__(self):  # items in stitch order
+        items = self._items
+        return (items[path] for path in self.paths)
+
+    def get(self, path):
+        return self._items.get(path)
+
+    def by_id(self, item_id):
+        return self._by_id.get(item_id)
+
+    def index(self, path):  # position in paths, or None
+        return self._positions.get(path)
+
+    # --- per-item reads (0 / None for unknown paths, so callers racing a delete don't need to check) ---
+    def rotation(self, path):
+        item = self._items.get(path)
+        return item.rotation if item else 0
+
+    def size(self, path):
+        item = self._items.get(path)
+        return item.size if item else None
+
+    def orientation(self, path):
+        item = self._items.get(path)
+        return item.orientation if item else None
+
+    # --- snapshots for worker threads / processes ---
+    def rotations(self):  # {path: rotation} for rotated images, as stitch_parts takes it
+        return {item.path: item.rotation for item in self._items.values() if item.rotation}
+
+    def sizes(self):  # {path: (w, h)} for probed images, as source_heights takes it
+        return {item.path: (item.width, item.height) for item in self._items.values() if item.width is not None}
+
+    # --- edits ---
+    def add_many(self, paths):  # append paths not in the list yet (also deduped within the batch); returns them
+        added = []
+        for path in paths:
+            if path in self._items: continue
+            item = ImageItem(next(self._ids), path)
+            self._items[path] = item; self._by_id[item.id] = item
+            self._positions[path] = len(self.paths) + len(added)
+            added.append(path)
+        self.paths.extend(added)
+        for idx in range(len(self.paths) - len(added) - 1, len(self.paths) - 1): self._link(idx)
+        return added
+
+    def remove_many(self, paths):  # returns the removed items
+        # Rows below the first removed one move up, so this is O(rows from there to the end); rows above are untouched
+        doomed = {path for path in paths if path in self._items}
+        if not doomed: return []
+        gone = sorted(self._positions[path] for path in doomed)
+        for idx in {i for p in gone for i in (p - 1, p)}: self._unlink(idx)
+        removed = [self._items.pop(path) for path in doomed]
+        first = min(self._positions.pop(path) for path in doomed)
+        self.paths[first:] = [p for p in itertools.islice(self.paths, first, None) if p not in doomed]
+        for idx in range(first, len(self.paths)): self._positions[self.paths[idx]] = idx
+        for item in removed:
+            del self._by_id[item.id]
+            if item.width is not None: self.heights.remove(item.size, item.rotation)
+        for idx in {p - k - 1 for k, p in enumerate(gone)}: self._link(idx)  # the row above each removed run
+        return removed
+
+    def move_block(self, indices, step):  # shift the rows at sorted `indices` by one; a block at the edge stays put
+        # One swap per row; returns the rows' new indices
+        paths = self.paths
+        order = indices if step < 0 else indices[::-1]  # walk toward the edge we move to, so blocks shift as a unit
+        limit = 0 if step < 0 else len(paths) - 1  # first free slot at that edge
+        moved = []
+        for idx in order:
+            if idx == limit:  # pinned against the edge (or against a pinned neighbour)
+                limit -= step; continue
+            top = min(idx, idx + step)
+            for pair in (top - 1, top, top + 1): self._unlink(pair)
+            paths[idx + step], paths[idx] = paths[idx], paths[idx + step]
+            for pair in (top - 1, top, top + 1): self._link(pair)
+            self._positions[paths[idx]] = idx; self._positions[paths[idx + step]] = idx + step
+            moved.append(idx + step)
+        return moved
+
+    def set_size(self, path, size, orientation=None):  # displayed (w, h) from a probe / the metadata store
+        item = self._items.get(path)
+        if item is None: return
+        if item.width is not None: self.heights.remove(item.size, item.rotation)
+        idx = self._positions[path]; self._unlink(idx - 1); self._unlink(idx)
+        item.width, item.height = size; item.orientation = orientation
+        self.heights.add(size, item.rotation)
+        self._link(idx - 1); self._link(idx)
+
+    def set_rotation(self, path, rotation):
+        item = self._items.get(path)
+        if item is None: return
+        rotation %= 360
+        if item.width is not None:
+            self.heights.remove(item.size, item.rotation); self.heights.add(item.size, rotation)
+        idx = self._positions[path]; self._unlink(idx - 1); self._unlink(idx)
+        item.rotation = rotation
+        self._link(idx - 1); self._link(idx)
+
+    def total_height(self, target_w):  # expected stitched height of the probed images
+        return self.heights.total_height(target_w)
+
+    def trimmed_rows(self, target_w):  # ≈ rows the overlap trim removes between current neighbours
+        return self.trims.trimmed_rows(target_w)
+
+    def _link(self, idx):  # rows idx and idx + 1 became neighbours (no-op past either end)
+        if 0 <= idx < len(self.paths) - 1: self.trims.link(self._items[self.paths[idx]], self._items[self.paths[idx + 1]])
+
+    def _unlink(self, idx):
+        if 0 <= idx < len(self.paths) - 1: self.trims.unlink(self._items[self.paths[idx]], self._items[self.paths[idx + 1]])
@@ -1,23 +1,102 @@
+import time  # progress ETA, startup timing
+STARTED = time.perf_counter()  # before the imports below, so the startup report includes them
 import tkinter as tk  # Tkinter GUI toolkit
 from tkinter import ttk  # themed widgets
-from tkinter import filedialog, messagebox, Listbox, END, ANCHOR  # common Tk helpers
-from PIL import Image, ImageTk  # Pillow image utilities
+from tkinter import filedialog, messagebox, END  # common Tk helpers
 import os  # filesystem helpers
-import tkinterdnd2  # drag-and-drop support
+import tkinterdnd2  # drag-and-drop support; the tkdnd Tcl package itself is loaded after the first paint
 import re  # parse DnD payloads
 import sys  # platform detection
+import importlib  # background preloading of the imaging modules
+# Only Pillow-free modules are imported up front; Pillow, the render pipeline and the codecs are imported where they
+# are used, and PRELOAD_MODULES loads them on a background thread once the window is on screen
+from geometry import fit_size  # size arithmetic, same rounding as the stitcher
+from item_model import ItemStore  # the image list: order, per-image state, expected-height aggregate
+from preview_cache import PreviewCache, PreviewPrefetcher  # LRU of rendered previews + background warmup
+from strip_cache import StripCache  # resized strips kept between stitches
+from thumbnail_list import ThumbnailList  # virtualized image list with lazy thumbnails
+from folder_watch import FolderWatcher, WATCH_POLL_MS  # new files in a watched folder
+from duplicates import DuplicateIndex  # exact / near-duplicate detection on import
+from instrumentation import STAGE_LABELS, StartupTimer, StitchTrace, configure_logging, get_logger, log_event  # timings + structured logs
+import logging  # event levels
+import multiprocessing  # frozen-app support for the render pool
+import threading  # background stitch worker
+import queue  # worker -> UI event channel
+from concurrent.futures import ThreadPoolExecutor  # background header probing on import
+
+log = get_logger("app")
+TRACE_PATH = os.environ.get("PHOTO_STITCHER_TRACE")  # optional JSON trace of the latest stitch
+STARTUP_REPORT_PATH = os.environ.get("PHOTO_STITCHER_STARTUP_REPORT")  # optional JSON startup timings
+DEFERRED_SETUP_DEADLINE_MS = 2000  # deferred startup work runs by then even if the window is never drawn (started minimized)
+PRELOAD_MODULES = ("PIL.ImageTk", "stitch_engine", "metadata_store", "overlap", "incremental", "overview")
+
+# Memory cap for cached preview bitmaps; override with PHOTO_STITCHER_PREVIEW_CACHE_MB
+PREVIEW_CACHE_MAX_BYTES = int(os.environ.get("PHOTO_STITCHER_PREVIEW_CACHE_MB", "128")) * 1024 * 1024
+IMPORT_PROBE_WORKERS = min(16, (os.cpu_count() or 1) * 2)  # header reads are mostly I/O
+PREFETCH_RADIUS = 3  # neighbours rendered ahead of (and then behind) keyboard navigation
+OVERLAP_ANALYSIS_WIDTH = 360  # width the expected-height estimate detects screenshot overlaps at
+
+OUTPUT_FORMATS = {"JPEG": "JPEG", "PNG": "PNG", "WebP": "WEBP", "WebP无损": "WEBP_LOSSLESS"}  # menu label -> format code
+ENCODER_PRESET_CHOICES = {"快速": "fast", "均衡": "balanced", "最小": "smallest"}  # menu label -> encoder preset
+DUPLICATE_CHOICES = {"跳过相同": ("skip", False), "跳过相同和相似": ("skip", True),  # menu label -> (action, perceptual hash)
+                     "仅标记": ("flag", True), "不检测": (None, False)}
+
+
+def _format_bytes(nbytes):  # human-readable file size for status messages
+    return f"{nbytes / (1024 * 1024):.2f} MB" if nbytes >= 1024 * 1024 else f"{nbytes / 1024:.1f} KB"
+
+class AppRoot(tkinterdnd2.Tk):  # tkinterdnd2's root window, with the tkdnd package loaded on demand
+    def __init__(self):
+        tk.Tk.__init__(self)  # tkinterdnd2.Tk.__init__ would also load tkdnd before anything is drawn
+        self.TkdndVersion = None
+
+    def enable_drag_and_drop(self):  # the same package load tkinterdnd2.Tk.__init__ does; raises if tkdnd is missing
+        self.TkdndVersion = tkinterdnd2.TkinterDnD._require(self)
+
 
 class PhotoStitcherApp:  # main application class
-    def __init__(self, master):  # master is tkinterdnd2.Tk
+    def __init__(self, master, startup=None):  # master is AppRoot; startup: StartupTimer for the startup report
         self.master = master  # keep root reference
+        self.startup = startup or StartupTimer(time.perf_counter())
         master.title("图片拼接工具")  # window title
         master.geometry("800x750")  # default window size
 
-        self.image_paths = []  # ordered list of imported image paths
-        self.image_objects = {}  # keep PhotoImage references alive
-        self.rotations = {}  # rotation per image path
-        self.image_original_dimensions = {}  # cache original w/h
+        self.items = ItemStore()  # imported images in stitch order, with rotation / size / orientation per image
+        self.preview_cache = PreviewCache(PREVIEW_CACHE_MAX_BYTES)  # rendered PhotoImages, LRU
+        self.strip_cache = StripCache()  # re-stitching after a reorder / format change skips decode + resize
+        self.prefetcher = PreviewPrefetcher(self._render_preview_image)  # renders neighbours off the Tk thread
+        self._prefetch_poll_job = None  # after() id while prefetch results are pending
+        self._nav_direction = 1  # +1 down / -1 up, for prefetch ordering
+        self._background_pool = ThreadPoolExecutor(max_workers=IMPORT_PROBE_WORKERS)  # header probes, thumbnail writes
+        self._thumbs_in_flight = set()  # (path, mtime_ns) with a thumbnail job queued / running; list, overview and
+        self._thumbs_lock = threading.Lock()  # prefetcher render from different threads, so one job serves them all
+        self.metadata_store = None  # survives restarts; opened in the background after the first paint, None if unavailable
+        self._preload_thread = None  # imports PRELOAD_MODULES + opens the metadata store
+        self._preloaded_store = None  # handed from the preload thread to the Tk thread
+        self._probe_results = queue.Queue()  # (path, future) from finished probes
+        self._probe_pending = set()  # paths whose dimensions are still being read
+        self._probe_poll_job = None  # after() id while probes are outstanding
         self._preview_debounce_job = None  # debounce job id for preview
+        self._stitch_thread = None  # background stitch worker, if running
+        self._stitch_cancel = None  # threading.Event shared with the worker
+        self._stitch_events = None  # queue of worker events drained on the Tk thread
+        self.overview = None  # StitchOverview window, created on first use
+        self._overlap_pending = set()  # pair keys being analysed
+        self._overlap_results = queue.Queue()  # (pair key, result) from the background pool
+        self._overlap_poll_job = None
+        self._stitch_is_append = False  # the running job is a watch-mode append
+        self.watcher = None  # FolderWatcher while watch mode is on
+        self.incremental = None  # IncrementalStitch the watched folder is appended to
+        self._watch_poll_job = None
+        self._watch_workers = 1
+        self._append_queued = False  # new images arrived while a stitch / append was running
+        self.duplicate_index = DuplicateIndex()  # hashes of the listed images
+        self._hash_order = []  # paths awaiting hashes, in import order: earlier images are the originals
+        self._hash_done = {}  # path -> (digest, phash) or None (unreadable), until its turn in _hash_order
+        self._hash_results = queue.Queue()  # (path, perceptual, future) from the background pool
+        self._hash_poll_job = None
+        self._combine_after_hashing = False  # "拼接" was pressed while hashes were still pending
+        self._skipped_duplicates = 0  # since the last import status
 
         # --- Layout Frames ---
         main_content_frame = tk.Frame(master, padx=10, pady=5)  # list + controls container
@@ -45,13 +124,14 @@ class PhotoStitcherApp:  # main application class
         self.status_label = tk.Label(top_frame, text="请导入图片或拖拽图片到此窗口...", anchor="w")  # status label
         self.status_label.pack(side=tk.LEFT, fill=tk.X, expand=True)
 
+        self.cancel_button = tk.Button(top_frame, text="取消", command=self.cancel_stitch, state=tk.DISABLED)  # cancel running stitch
+        self.cancel_button.pack(side=tk.RIGHT)
+
         # --- List Widgets ---
-        self.image_listbox = Listbox(list_frame, selectmode=tk.EXTENDED, width=50)  # image queue
+        self.image_listbox = ThumbnailList(list_frame, lambda: self.items.paths, self._render_preview_image,  # image queue; only visible rows are drawn
+                                           self.items.rotation, self._describe_row, lambda: self.fast_decode_var.get(),
+                                           index_of=self.items.index)
         self.image_listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        
-        scrollbar = tk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self.image_listbox.yview)  # list scrollbar
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        self.image_listbox.config(yscrollcommand=scrollbar.set)
 
         # --- Control Buttons ---
         self.up_button = tk.Button(controls_frame, text="上移", command=self.move_up)
@@ -69,6 +149,12 @@ class PhotoStitcherApp:  # main application class
         self.right_rotate_button = tk.Button(controls_frame, text="右转90°", command=self.rotate_right)
         self.right_rotate_button.pack(fill=tk.X, pady=2)
 
+        self.overview_button = tk.Button(controls_frame, text="拼接总览", command=self.open_overview)
+        self.overview_button.pack(fill=tk.X, pady=2)
+
+        self.watch_button = tk.Button(controls_frame, text="监视文件夹", command=self.toggle_watch)  # append new files to one output
+        self.watch_button.pack(fill=tk.X, pady=2)
+
         self.preview_label = tk.Label(controls_frame, text="图片预览", relief=tk.SUNKEN, anchor=tk.CENTER)
         self.preview_label.pack(fill=tk.BOTH, expand=True, pady=10)
         self.image_listbox.bind("<<ListboxSelect>>", self.show_preview)
@@ -102,7 +188,7 @@ class PhotoStitcherApp:  # main application class
         self.expected_height_var = tk.StringVar(value="0 像素")
         tk.Label(bottom_frame, textvariable=self.expected_height_var, anchor="w").grid(row=0, column=4, sticky="we")
 
-        tk.Label(bottom_frame, text="JPEG质量:").grid(row=1, column=0, sticky="w", pady=(5,0), padx=(0,5))  # JPEG quality
+        tk.Label(bottom_frame, text="质量:").grid(row=1, column=0, sticky="w", pady=(5,0), padx=(0,5))  # JPEG quality
         self.jpeg_quality_var = tk.IntVar(value=95)
         self.jpeg_quality_scale = tk.Scale(bottom_frame, from_=0, to=100, orient=tk.HORIZONTAL, variable=self.jpeg_quality_var, command=self._update_quality_display_label)
         self.jpeg_quality_scale.grid(row=1, column=1, columnspan=2, sticky="we", pady=(5,0), padx=(0,10))
@@ -111,34 +197,127 @@ class PhotoStitcherApp:  # main application class
         
         tk.Label(bottom_frame, text="输出格式:").grid(row=2, column=0, sticky="w", pady=(5,0), padx=(0,5))  # output format
         self.output_format_var = tk.StringVar(value="JPEG")
-        self.output_format_menu = ttk.Combobox(bottom_frame, textvariable=self.output_format_var, values=["JPEG", "PNG"], state="readonly", width=7)
+        self.output_format_menu = ttk.Combobox(bottom_frame, textvariable=self.output_format_var, values=list(OUTPUT_FORMATS), state="readonly", width=9)
         self.output_format_menu.grid(row=2, column=1, sticky="w", pady=(5,0), padx=(0,10))
+
+        tk.Label(bottom_frame, text="编码预设:").grid(row=2, column=3, sticky="e", pady=(5,0), padx=(10,5))  # encoder speed/size preset
+        self.encoder_preset_var = tk.StringVar(value="均衡")
+        self.encoder_preset_menu = ttk.Combobox(bottom_frame, textvariable=self.encoder_preset_var, values=list(ENCODER_PRESET_CHOICES), state="readonly", width=6,
+                                                postcommand=self._offer_presets)
+        self.encoder_preset_menu.grid(row=2, column=4, sticky="w", pady=(5,0))
         self.output_format_menu.bind("<<ComboboxSelected>>", self._output_format_changed)
 
+        tk.Label(bottom_frame, text="并行进程:").grid(row=3, column=0, sticky="w", pady=(5,0), padx=(0,5))  # render workers
+        cores = os.cpu_count() or 1  # stitch_engine.default_workers(), without importing the pipeline yet
+        self.worker_count_var = tk.IntVar(value=cores)
+        self.worker_count_spinbox = tk.Spinbox(bottom_frame, from_=1, to=max(64, cores), textvariable=self.worker_count_var, width=5)
+        self.worker_count_spinbox.grid(row=3, column=1, sticky="w", pady=(5,0), padx=(0,10))
+
+        self.fast_decode_var = tk.BooleanVar(value=True)  # JPEG DCT-scaled decoding; off = pixel-exact output
+        tk.Checkbutton(bottom_frame, text="JPEG快速解码", variable=self.fast_decode_var).grid(row=3, column=3, columnspan=2, sticky="w", pady=(5,0))
+
+        tk.Label(bottom_frame, text="分段高度:").grid(row=4, column=0, sticky="w", pady=(5,0), padx=(0,5))  # max part height
+        self.part_height_var = tk.StringVar(value="")  # empty = split only past the format's limit
+        tk.Entry(bottom_frame, textvariable=self.part_height_var, width=10).grid(row=4, column=1, sticky="we", pady=(5,0), padx=(0,10))
+        tk.Label(bottom_frame, text="像素(留空=自动)").grid(row=4, column=2, sticky="w", pady=(5,0))
+        self.split_at_boundary_var = tk.BooleanVar(value=True)  # cut parts between images rather than mid-image
+        tk.Checkbutton(bottom_frame, text="在图片边界分段", variable=self.split_at_boundary_var).grid(row=4, column=3, columnspan=2, sticky="w", pady=(5,0))
+
+        tk.Label(bottom_frame, text="色度采样:").grid(row=5, column=0, sticky="w", pady=(5,0), padx=(0,5))  # JPEG chroma subsampling
+        self.subsampling_var = tk.StringVar(value="4:2:0")
+        self.subsampling_menu = ttk.Combobox(bottom_frame, textvariable=self.subsampling_var, values=["4:2:0", "4:2:2", "4:4:4"], state="readonly", width=7)
+        self.subsampling_menu.grid(row=5, column=1, sticky="w", pady=(5,0), padx=(0,10))
+        self.trim_overlap_var = tk.BooleanVar(value=False)  # crop rows repeated between consecutive screenshots
+        tk.Checkbutton(bottom_frame, text="去除截图重叠", variable=self.trim_overlap_var,
+                       command=self._update_expected_height_display).grid(row=5, column=3, columnspan=2, sticky="w", pady=(5,0))
+
+        tk.Label(bottom_frame, text="重复图片:").grid(row=6, column=0, sticky="w", pady=(5,0), padx=(0,5))  # duplicate handling on import
+        self.duplicate_mode_var = tk.StringVar(value="跳过相同")
+        ttk.Combobox(bottom_frame, textvariable=self.duplicate_mode_var, values=list(DUPLICATE_CHOICES), state="readonly", width=12).grid(row=6, column=1, columnspan=2, sticky="w", pady=(5,0))
 
         self.combine_button = tk.Button(bottom_frame, text="拼接图片并保存", command=self.combine_and_save_images)  # stitch & save
-        self.combine_button.grid(row=0, column=5, rowspan=3, sticky="nsew", padx=(20,0), pady=(0,0))
+        self.combine_button.grid(row=0, column=5, rowspan=7, sticky="nsew", padx=(20,0), pady=(0,0))
 
 
-        # Drag-and-drop registration
-        self.master.drop_target_register(tkinterdnd2.DND_FILES)
-        self.master.dnd_bind('<<Drop>>', self.handle_drop)
+        self.master.protocol("WM_DELETE_WINDOW", self._on_close)  # stop a running stitch before exiting
         
         # --- Initial UI State ---
         self._update_expected_height_display()
         self._update_quality_display_label(self.jpeg_quality_var.get())
         self._output_format_changed()
 
+        # Drag-and-drop, the imaging modules and the metadata store wait until the window has been drawn once
+        self.startup.mark("widgets")
+        self.master.bind("<Expose>", self._on_expose, add="+")  # every widget carries the root's bindings
+        self.master.after(DEFERRED_SETUP_DEADLINE_MS, lambda: self._finish_startup(painted=False))
+
+    def _on_expose(self, event):
+        if self._preload_thread is None: self.master.after_idle(self._finish_startup)  # behind the redraws just scheduled
+
+    def _finish_startup(self, painted=True):  # runs once: after the first paint, or at the deadline if there is none
+        if self._preload_thread is not None: return
+        if painted: self.startup.mark("first_paint")
+        try:
+            self.master.enable_drag_and_drop()
+            self.master.drop_target_register(tkinterdnd2.DND_FILES)
+            self.master.dnd_bind('<<Drop>>', self.handle_drop)
+            self.startup.mark("drag_and_drop")
+        except Exception as e:  # no tkdnd for this platform: the import button still works
+            log_event(log, logging.WARNING, "dnd_unavailable", error=e)
+        self._preload_thread = threading.Thread(target=self._preload, daemon=True)
+        self._preload_thread.start()
+        self.master.after(50, self._poll_preload)
+
+    def _preload(self):  # background thread: the imports deferred at startup, then the codec plugins and the cache
+        for name in PRELOAD_MODULES:
+            started = time.perf_counter()
+            try:
+                importlib.import_module(name)
+            except Exception as e:  # surfaces again, with context, where the module is first used
+                log_event(log, logging.WARNING, "preload_failed", module=name, error=e)
+            self.startup.modules[name] = round(time.perf_counter() - started, 4)
+        started = time.perf_counter()
+        try:
+            from PIL import Image
+            Image.init()  # every codec plugin, instead of on the first open / save of a less common format
+        except Exception as e:
+            log_event(log, logging.WARNING, "preload_failed", module="PIL plugins", error=e)
+        self.startup.modules["PIL plugins"] = round(time.perf_counter() - started, 4)
+        self._preloaded_store = self._open_metadata_store()  # SQLite + cache directory: disk I/O kept off the Tk thread
+
+    def _poll_preload(self):
+        if self._preload_thread.is_alive():
+            self.master.after(50, self._poll_preload); return
+        self.metadata_store = self._preloaded_store
+        self.startup.mark("ready")
+        marks = self.startup.marks  # seconds since process start
+        log_event(log, logging.INFO, "startup", **marks, preload=sum(self.startup.modules.values()))
+        if STARTUP_REPORT_PATH:
+            try:
+                self.startup.write(STARTUP_REPORT_PATH)
+            except OSError as e:
+                log_event(log, logging.WARNING, "startup_report_failed", path=STARTUP_REPORT_PATH, error=e)
+
+    def _offer_presets(self):  # preset menu: only presets that differ for the chosen format (JPEG has no separate "fast")
+        from stream_encoders import format_presets  # on first use: the encoders need Pillow
+        presets = format_presets(OUTPUT_FORMATS.get(self.output_format_var.get(), "JPEG"))
+        labels = [label for label, preset in ENCODER_PRESET_CHOICES.items() if preset in presets]
+        self.encoder_preset_menu.config(values=labels)
+        if self.encoder_preset_var.get() not in labels: self.encoder_preset_var.set("均衡")
+
     def _output_format_changed(self, event=None):  # toggle quality slider based on format
         if not hasattr(self, 'output_format_var') or not hasattr(self, 'jpeg_quality_scale') or not hasattr(self, 'quality_display_label_var'):
             return
 
-        selected_format = self.output_format_var.get()
-        is_png = (selected_format == "PNG")
+        selected_format = OUTPUT_FORMATS.get(self.output_format_var.get(), "JPEG")
+        is_lossless = selected_format in ("PNG", "WEBP_LOSSLESS")  # quality slider only applies to lossy formats
         
-        self.jpeg_quality_scale.config(state=tk.DISABLED if is_png else tk.NORMAL)
+        self.jpeg_quality_scale.config(state=tk.DISABLED if is_lossless else tk.NORMAL)
+        if hasattr(self, 'subsampling_menu'):
+            self.subsampling_menu.config(state="readonly" if selected_format == "JPEG" else tk.DISABLED)
+        if event is not None: self._offer_presets()  # a user change; the default JPEG / 均衡 needs no check at startup
         
-        if is_png:
+        if is_lossless:
             if "%" in self.quality_display_label_var.get():
                  self.quality_display_label_var.set("N/A")
         else:
@@ -149,54 +328,75 @@ class PhotoStitcherApp:  # main application class
         if value is None: value = self.jpeg_quality_var.get()
         self.quality_display_label_var.set(f"{int(float(value))}%")
 
-    def _calculate_expected_output_height(self):  # compute expected stitched height
-        total_h = 0
-        if not hasattr(self, 'output_width_var') or not hasattr(self, 'image_paths') or not hasattr(self, 'image_original_dimensions'):
+    def _output_width(self):  # current output width, or 0 while the entry is empty / invalid
+        try:
+            target_w = int(self.output_width_var.get())
+        except (ValueError, tk.TclError):
             return 0
+        return target_w if target_w > 0 else 0
 
-        try:
-            target_w_str = self.output_width_var.get()
-            if not target_w_str: return 0
-            target_w = int(target_w_str)
-            if target_w <= 0 or not self.image_paths: return 0
-        except (ValueError, tk.TclError): return 0
+    def _calculate_expected_output_height(self):  # compute expected stitched height
+        if not hasattr(self, 'output_width_var') or not hasattr(self, 'items'):
+            return 0
 
-        for img_path in self.image_paths:
+        target_w = self._output_width()
+        if not target_w or not self.items: return 0
+
+        # Aggregate over distinct effective sizes; kept current by import / delete / rotate
+        started = time.perf_counter()
+        total = self.items.total_height(target_w)
+        if self.trim_overlap_var.get(): self._queue_overlaps(); total -= self.items.trimmed_rows(target_w)
+        log_event(log, logging.DEBUG, "expected_height", images=len(self.items.heights), height=total, seconds=time.perf_counter() - started)
+        return total
+
+    def _queue_overlaps(self):  # analyse neighbour pairs that appeared since the last call (items.trims tracks them)
+        todo = []  # runs of consecutive images, so each image is decoded once per run
+        for key in self.items.trims.take_unknown():
+            if key in self._overlap_pending: continue
+            self._overlap_pending.add(key)
+            upper, lower = key[:2], key[2:]
+            if todo and todo[-1][-1] == upper: todo[-1].append(lower)
+            else: todo.append([upper, lower])
+        for run in todo:
+            self._background_pool.submit(self._analyze_overlaps, run)
+        if todo and self._overlap_poll_job is None:
+            self._overlap_poll_job = self.master.after(100, self._collect_overlap_results)
+
+    def _analyze_overlaps(self, run):  # runs on the background pool: [(path, rotation), ...] in list order
+        from stitch_engine import render_strip
+        from overlap import row_signature, find_overlap
+        previous = None
+        for path, rotation in run:
             try:
-                if img_path not in self.image_original_dimensions:
-                    temp_img = Image.open(img_path)
-                    ow, oh = temp_img.size
-                    self.image_original_dimensions[img_path] = (ow, oh)
-                    print(f"Cache miss for {img_path}, loaded dimensions: ({ow}, {oh})")
-                    temp_img.close()
-                else:
-                    ow, oh = self.image_original_dimensions[img_path]
-
-                rotation = self.rotations.get(img_path, 0)
-                if rotation == 90 or rotation == 270:
-                    effective_w, effective_h = oh, ow
-                else:
-                    effective_w, effective_h = ow, oh
-                
-                if effective_w == 0: continue
-                aspect_ratio = effective_h / effective_w
-                scaled_h = int(target_w * aspect_ratio)
-                total_h += scaled_h
-            except FileNotFoundError:
-                print(f"Warning: File not found during height calculation: {img_path}")
-                if img_path in self.image_original_dimensions:
-                    del self.image_original_dimensions[img_path]
-                continue
-            except Exception as e:
-                print(f"Warning: Could not process image {img_path} for height calculation: {e}")
-                continue
-        return total_h
+                signature = row_signature(render_strip(path, rotation, OVERLAP_ANALYSIS_WIDTH))
+            except Exception:
+                signature = None  # unreadable: no trim; the stitch reports the file itself
+            if previous is not None:
+                (upper, upper_sig), found = previous, None
+                if upper_sig is not None and signature is not None:
+                    found = find_overlap(upper_sig, signature)
+                    if found: found = (found[0] / upper_sig.height, found[1] / signature.height)
+                self._overlap_results.put((upper + (path, rotation), found))
+            previous = ((path, rotation), signature)
+
+    def _collect_overlap_results(self):  # apply finished analyses on the Tk thread
+        self._overlap_poll_job = None
+        landed = False
+        while True:
+            try:
+                key, found = self._overlap_results.get_nowait()
+            except queue.Empty:
+                break
+            self._overlap_pending.discard(key); self.items.trims.set(key, found); landed = True
+        if landed: self._update_expected_height_display()
+        if self._overlap_pending:
+            self._overlap_poll_job = self.master.after(200, self._collect_overlap_results)
 
     def _update_expected_height_display(self, *args):  # update UI label for expected height
-        if not hasattr(self, 'output_width_var') or not hasattr(self, 'expected_height_var') or not hasattr(self, 'image_paths'):
+        if not hasattr(self, 'output_width_var') or not hasattr(self, 'expected_height_var') or not hasattr(self, 'items'):
             return
 
-        if not self.image_paths:
+        if not self.items:
              self.expected_height_var.set("0 像素")
              return
 
@@ -215,87 +415,191 @@ class PhotoStitcherApp:  # main application class
             return
 
         height = self._calculate_expected_output_height()
-        self.expected_height_var.set(f"{height} 像素")
+        if self.overview is not None: self.overview.schedule_refresh()  # same triggers: list, width, rotation, probes
+        if self._probe_pending:
+            self.expected_height_var.set(f"≥{height} 像素 (读取尺寸中 {len(self._probe_pending)})")
+        elif self.trim_overlap_var.get() and self._overlap_pending:
+            self.expected_height_var.set(f"≤{height} 像素 (分析重叠中 {len(self._overlap_pending)})")
+        elif self.trim_overlap_var.get():
+            self.expected_height_var.set(f"≈{height} 像素")  # overlaps were measured at a smaller width
+        else:
+            self.expected_height_var.set(f"{height} 像素")
     
-    def _process_new_image_paths(self, file_paths_to_add):  # add a batch of new image paths
-        if not file_paths_to_add: return
-        newly_added = 0
-        for fp_orig in file_paths_to_add:
-            if self._is_image_file(fp_orig):
-                abs_fp = os.path.abspath(os.path.expanduser(fp_orig))                 
-                if abs_fp not in self.image_paths:
-                    self.image_paths.append(abs_fp)
-                    self.image_listbox.insert(END, os.path.basename(abs_fp)); newly_added += 1
-                    # prime dimension cache on first add
-                    try:
-                        img = Image.open(abs_fp)
-                        self.image_original_dimensions[abs_fp] = img.size
-                        img.close()
-                    except Exception as e:
-                        print(f"Error opening {abs_fp} to cache dimensions: {e}")
-                        pass
-                                    
-        if newly_added > 0:
-            self.status_label.config(text=f"已导入 {len(self.image_paths)} 张图片。")
+    def _process_new_image_paths(self, file_paths_to_add):  # add a batch of new image paths; returns the ones actually added
+        if not file_paths_to_add: return []
+        started = time.perf_counter()
+        new_paths = self.items.add_many(os.path.abspath(os.path.expanduser(fp_orig)) for fp_orig in file_paths_to_add
+                                        if self._is_image_file(fp_orig))  # hashed lookup, also dedupes within the batch
+
+        if new_paths:
+            self.image_listbox.refresh()  # rows are drawn on demand, so this is O(1) in the batch size
+            self._probe_dimensions(new_paths)  # header probing continues in the background
+            self._hash_new_images(new_paths)  # so does duplicate detection
+            self.status_label.config(text=f"已导入 {len(self.items)} 张图片。")
             last_idx = self.image_listbox.size() - 1
             self.image_listbox.selection_clear(0, END); self.image_listbox.selection_set(last_idx)
             self.image_listbox.activate(last_idx); self.image_listbox.see(last_idx); self.show_preview()
-        elif not self.image_paths:
+        elif not self.items:
             self.status_label.config(text="未导入有效图片。请拖拽PNG, JPG, JPEG图片到此窗口。")
         self._update_expected_height_display()
+        log_event(log, logging.DEBUG, "import", offered=len(file_paths_to_add), added=len(new_paths),
+                  pending_probes=len(self._probe_pending), seconds=time.perf_counter() - started)
+        return new_paths
 
-    def move_up(self):  # move selected item up
-        sel = self.image_listbox.curselection(); idx = sel[0] if sel else -1
-        if idx > 0:
-            txt=self.image_listbox.get(idx); self.image_listbox.delete(idx); self.image_listbox.insert(idx-1, txt)
-            self.image_listbox.selection_set(idx-1); self.image_listbox.activate(idx-1)
-            p = self.image_paths.pop(idx); self.image_paths.insert(idx-1, p)
-            self.show_preview()
-            self._update_expected_height_display()
+    def _open_metadata_store(self):  # a broken cache must never stop the app
+        try:
+            from metadata_store import MetadataStore
+            return MetadataStore()
+        except Exception as e:
+            log_event(log, logging.WARNING, "cache_disabled", error=e)
+            return None
+
+    def _probe_dimensions(self, paths):  # prime the dimension cache: persistent store first, then a thread pool
+        from stitch_engine import probe_metadata
+        from transform_plan import oriented_size
+        todo = [p for p in paths if self.items.size(p) is None]
+        known = self.metadata_store.lookup(todo) if self.metadata_store and todo else {}
+        results = self._probe_results
+        for path in todo:
+            if path in known:
+                size, orientation = known[path]
+                self.items.set_size(path, oriented_size(size, orientation), orientation)
+                continue
+            self._probe_pending.add(path)
+            future = self._background_pool.submit(probe_metadata, path)
+            future.add_done_callback(lambda f, path=path: results.put((path, f)))
+        if self._probe_pending and self._probe_poll_job is None:
+            self._probe_poll_job = self.master.after(50, self._collect_probe_results)
+
+    def _collect_probe_results(self):  # apply finished probes on the Tk thread
+        from transform_plan import oriented_size
+        self._probe_poll_job = None
+        probed = []
+        while True:
+            try:
+                path, future = self._probe_results.get_nowait()
+            except queue.Empty:
+                break
+            self._probe_pending.discard(path)
+            if path not in self.items: continue  # deleted while probing
+            try:
+                size, orientation = future.result()
+                self.items.set_size(path, oriented_size(size, orientation), orientation)
+                probed.append((path, size, orientation))
+            except Exception as e:
+                log_event(log, logging.WARNING, "probe_failed", path=path, error=e)
+        if probed and self.metadata_store:
+            self.metadata_store.put_many(probed)  # one transaction per poll
+        if probed: self.image_listbox.refresh()  # captions show the new sizes
+        self._update_expected_height_display()
+        if self._probe_pending:
+            self._probe_poll_job = self.master.after(100, self._collect_probe_results)
 
-    def move_down(self):  # move selected item down
-        sel = self.image_listbox.curselection(); idx = sel[0] if sel else -1
-        if idx != -1 and idx < self.image_listbox.size()-1:
-            txt=self.image_listbox.get(idx); self.image_listbox.delete(idx); self.image_listbox.insert(idx+1, txt)
-            self.image_listbox.selection_set(idx+1); self.image_listbox.activate(idx+1)
-            p = self.image_paths.pop(idx); self.image_paths.insert(idx+1, p)
-            self.show_preview()
-            self._update_expected_height_display()
-            
-    def delete_selected(self):  # delete selected items
+    def move_up(self):  # move every selected item up one row; a block already at the top stays put
+        self._move_selected(-1)
+
+    def move_down(self):  # move every selected item down one row; a block already at the bottom stays put
+        self._move_selected(1)
+
+    def _move_selected(self, step):  # one swap per selected row; selection and the active row follow their paths
+        sel = self.image_listbox.curselection()
+        if not sel: return
+        moved = self.items.move_block(sel, step)
+        if not moved: return
+        self.image_listbox.refresh(); self.image_listbox.see(moved[-1] if step < 0 else moved[0])
+        self.show_preview()
+        self._update_expected_height_display()
+
+    def delete_selected(self):  # delete selected items; one pass over the list, per-image cleanup only for the deleted ones
         selected_indices = self.image_listbox.curselection()
         if not selected_indices:
             messagebox.showwarning("无选择", "请选择要删除的图片。"); return
-        # delete from end to avoid shifting indices
-        sorted_indices_to_delete = sorted(selected_indices, reverse=True)
         min_deleted_idx = selected_indices[0]
+        self._forget_paths({self.items.paths[idx] for idx in selected_indices})
 
-        for idx in sorted_indices_to_delete:
-            if 0 <= idx < len(self.image_paths):
-                removed_path = self.image_paths.pop(idx)
-                self.image_listbox.delete(idx)
-                if removed_path in self.image_objects: del self.image_objects[removed_path]
-                if removed_path in self.rotations: del self.rotations[removed_path]
-                if removed_path in self.image_original_dimensions:
-                    del self.image_original_dimensions[removed_path]
-            else:
-                print(f"Warning: Invalid index {idx} during deletion. List size: {self.image_listbox.size()}, Paths size: {len(self.image_paths)}")
-
-        self.status_label.config(text=f"已导入 {len(self.image_paths)} 张图片。")
+        self.status_label.config(text=f"已导入 {len(self.items)} 张图片。")
         
         if not self.image_listbox.size():
             self.preview_label.config(image=None, text="图片预览"); self.preview_label.image=None
-            if not self.image_paths: self.status_label.config(text="请导入图片或拖拽图片到此窗口...")
+            if not self.items: self.status_label.config(text="请导入图片或拖拽图片到此窗口...")
         else:
             new_selection_idx = min(min_deleted_idx, self.image_listbox.size() - 1)
-            if new_selection_idx >= 0:
-                self.image_listbox.selection_set(new_selection_idx)
-                self.image_listbox.activate(new_selection_idx)
-                self.image_listbox.see(new_selection_idx)
+            self.image_listbox.selection_clear(0, END)
+            self.image_listbox.selection_set(new_selection_idx)
+            self.image_listbox.activate(new_selection_idx)
+            self.image_listbox.see(new_selection_idx)
             self.show_preview()
         
         self._update_expected_height_display()
 
+    def _forget_paths(self, doomed):  # drop a set of paths from the list and every per-image cache; one pass over the list
+        self.items.remove_many(doomed)
+        for removed_path in doomed:
+            self.preview_cache.discard_path(removed_path)
+            self.strip_cache.discard_path(removed_path)
+            if self.overview is not None: self.overview.discard_path(removed_path)
+            self.duplicate_index.discard(removed_path)
+        self.image_listbox.discard(doomed); self.image_listbox.refresh()
+
+    def _hash_new_images(self, paths):  # content (+ perceptual) hashes: persistent store first, then the background pool
+        from duplicates import hash_image
+        action, perceptual = DUPLICATE_CHOICES[self.duplicate_mode_var.get()]
+        if action is None: return
+        known = self.metadata_store.lookup_hashes(paths) if self.metadata_store else {}
+        results = self._hash_results
+        for path in paths:
+            self._hash_order.append(path)
+            cached = known.get(path)
+            if cached is not None and (cached[1] is not None or not perceptual):
+                self._hash_done[path] = cached; continue
+            future = self._background_pool.submit(hash_image, path, perceptual)
+            future.add_done_callback(lambda f, path=path: results.put((path, f)))
+        if self._hash_poll_job is None:
+            self._hash_poll_job = self.master.after(50, self._collect_hash_results)
+
+    def _collect_hash_results(self):  # judge finished hashes in import order on the Tk thread
+        self._hash_poll_job = None
+        hashed = []
+        while True:
+            try:
+                path, future = self._hash_results.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                self._hash_done[path] = future.result(); hashed.append((path, *self._hash_done[path]))
+            except Exception as e:  # unreadable: never a duplicate; the stitch reports it
+                log_event(log, logging.WARNING, "hash_failed", path=path, error=e)
+                self._hash_done[path] = None
+        if hashed and self.metadata_store: self.metadata_store.put_hashes(hashed)
+        action, perceptual = DUPLICATE_CHOICES[self.duplicate_mode_var.get()]
+        ready = 0
+        while ready < len(self._hash_order) and self._hash_order[ready] in self._hash_done: ready += 1
+        skipped = set(); flagged = 0
+        for path in self._hash_order[:ready]:
+            hashes = self._hash_done.pop(path)
+            item = self.items.get(path)
+            if hashes is None or item is None: continue  # deleted while hashing
+            found = self.duplicate_index.match(hashes[0], hashes[1] if perceptual else None)  # a cached phash alone doesn't opt in
+            if found is not None and action == "skip":
+                skipped.add(path); log_event(log, logging.INFO, "duplicate_skipped", path=path, kind=found[0], original=found[1]); continue
+            if found is not None and action == "flag":
+                item.duplicate = found; flagged += 1
+            self.duplicate_index.add(path, *hashes)
+        del self._hash_order[:ready]
+        if skipped:
+            self._forget_paths(skipped); self._skipped_duplicates += len(skipped)
+            self._update_expected_height_display()
+        if skipped or flagged: self.image_listbox.refresh()  # captions name the original
+        if self._hash_order:
+            self._hash_poll_job = self.master.after(100, self._collect_hash_results); return
+        if self._skipped_duplicates:
+            self.status_label.config(text=f"已导入 {len(self.items)} 张图片，跳过 {self._skipped_duplicates} 张重复图片。")
+            self._skipped_duplicates = 0
+        if self._combine_after_hashing:
+            self._combine_after_hashing = False; self.combine_and_save_images()
+        if self.watcher is not None and self._append_queued and self._stitch_thread is None:
+            self._append_queued = False; self._queue_append()
+
     def rotate_image(self, direction):  # core rotation logic
         selected_indices = self.image_listbox.curselection()
         if not selected_indices:
@@ -303,17 +607,19 @@ class PhotoStitcherApp:  # main application class
 
         rotated_count = 0
         for idx in selected_indices:
-            if 0 <= idx < len(self.image_paths):
-                img_path = self.image_paths[idx]
-                current_rot = self.rotations.get(img_path,0)
+            if 0 <= idx < len(self.items):
+                img_path = self.items.paths[idx]
+                current_rot = self.items.rotation(img_path)
                 # left = +90, right = -90 (Pillow uses CCW positive)
                 new_rot = (current_rot + (90 if direction == "left" else -90) + 360) % 360
-                self.rotations[img_path] = new_rot  # store new rotation
+                self.items.set_rotation(img_path, new_rot)  # store new rotation; keeps the height aggregate current
+                self.preview_cache.discard_path(img_path)  # old renderings can't be hit again
                 rotated_count +=1  # count rotated items
             else:
-                print(f"Warning: Invalid index {idx} during rotation. List size: {self.image_listbox.size()}, Paths size: {len(self.image_paths)}")
+                log_event(log, logging.WARNING, "invalid_index", action="rotate", index=idx, rows=self.image_listbox.size(), paths=len(self.items))
 
         if rotated_count > 0:
+            self.image_listbox.refresh()  # row thumbnails are keyed by rotation
             self.show_preview()  # refresh preview
             self._update_expected_height_display()  # height may change after rotations
 
@@ -322,11 +628,7 @@ class PhotoStitcherApp:  # main application class
     def rotate_right(self):  # rotate 90° clockwise
         self.rotate_image("right")
 
-    def combine_and_save_images(self):  # stitch images and save to file
-        if not self.image_paths:
-            messagebox.showerror("错误", "没有图片可以拼接。");
-            return
-        
+    def _output_settings(self):  # validated (width, format, preset, quality, workers, max part height), or None after an error dialog
         try:  # validate output width
             target_w_str = self.output_width_var.get()
             if not target_w_str:
@@ -337,65 +639,274 @@ class PhotoStitcherApp:  # main application class
         except ValueError:
             messagebox.showerror("宽度无效", "输出宽度必须是有效的正整数。"); return
         
-        out_fmt=self.output_format_var.get()  # output format
+        from stitch_engine import default_workers, FORMAT_MAX_HEIGHT
+        out_fmt=OUTPUT_FORMATS[self.output_format_var.get()]  # output format code
+        preset = ENCODER_PRESET_CHOICES[self.encoder_preset_var.get()]  # encoder speed/size trade-off
         jpg_q=self.jpeg_quality_var.get()  # JPEG quality
-        self.status_label.config(text="处理中..."); self.master.update_idletasks()  # show busy status
-        
-        proc_imgs=[]; total_h=0  # resized images + running height
-        for i_path in self.image_paths:
-            try:
-                img=Image.open(i_path).convert("RGB")  # normalize mode
-                rot=self.rotations.get(i_path,0);  # rotation degrees
-                if rot: img=img.rotate(rot,expand=True,fillcolor=(255,255,255))  # rotate if needed
-                ow,oh=img.size
-                if not ow or not oh:
-                    print(f"Skipping image with zero dimension: {i_path}")
-                    continue
-                if ow == 0: 
-                    print(f"Skipping image with zero width: {i_path}")
-                    continue
-                aspect_ratio = oh / ow
-                nh=int(target_w * aspect_ratio)
-                nh = max(1, nh)
-                resized=img.resize((target_w,nh),Image.Resampling.LANCZOS)  # high-quality resample
-                proc_imgs.append(resized); total_h+=nh
-            except FileNotFoundError:
-                messagebox.showwarning("文件丢失", f"图片 {os.path.basename(i_path)} 未找到，已跳过。")
-                print(f"File not found during combining: {i_path}")
-                continue
-            except Exception as e:
-                messagebox.showerror("图片处理错误", f"处理 {os.path.basename(i_path)} 错: {e}")
-                self.status_label.config(text="处理失败。")
-                return
-        
-        if not proc_imgs:
-            self.status_label.config(text="无成功处理图片。注意：可能所有图片都无法打开或尺寸无效。");
-            return
-        
-        comb_img=Image.new('RGB',(target_w,total_h),(255,255,255)); cy=0  # final canvas
-        for img in proc_imgs:
-            comb_img.paste(img,(0,cy)); cy+=img.height
-        
+        try:
+            workers = max(1, int(self.worker_count_var.get()))  # render processes
+        except (ValueError, tk.TclError):
+            workers = default_workers()
+        part_h_str = self.part_height_var.get().strip()
+        if part_h_str and (not part_h_str.isdigit() or int(part_h_str) <= 0):
+            messagebox.showerror("分段高度无效", "分段高度必须是正整数，或留空自动分段。"); return
+        max_part_h = min(int(part_h_str), FORMAT_MAX_HEIGHT[out_fmt]) if part_h_str else FORMAT_MAX_HEIGHT[out_fmt]
+        return target_w, out_fmt, preset, jpg_q, workers, max_part_h
+
+    def _ask_output_path(self, out_fmt):  # save dialog for out_fmt; "" when cancelled
+        from stitch_engine import FORMAT_EXTENSIONS
         self.status_label.config(text="选择保存路径..."); self.master.update_idletasks()  # prompt to save
-        def_ext = (".jpg" if out_fmt=="JPEG" else ".png")
-        f_types = [(f"{out_fmt} files", f"*.{out_fmt.lower()}"), ("All files", "*.*")]
-        s_path = filedialog.asksaveasfilename(
+        def_ext = FORMAT_EXTENSIONS[out_fmt]
+        fmt_label = self.output_format_var.get()
+        f_types = [(f"{fmt_label} files", f"*{def_ext}"), ("All files", "*.*")]
+        return filedialog.asksaveasfilename(
             initialdir=os.path.expanduser("~/Desktop"),
             defaultextension=def_ext,
             filetypes=f_types,
-            title=f"保存为 {out_fmt}"
+            title=f"保存为 {fmt_label}"
         )
-        if s_path:
+
+    def combine_and_save_images(self):  # stitch images and save to file
+        if not self.items:
+            messagebox.showerror("错误", "没有图片可以拼接。");
+            return
+        if self._hash_order:  # duplicates must be settled before the image list is snapshotted
+            self._combine_after_hashing = True
+            self.status_label.config(text="正在检测重复图片，完成后开始拼接..."); return
+        flagged = [item.path for item in self.items if item.duplicate and item.duplicate[1] in self.items]
+        if flagged:
+            answer = messagebox.askyesnocancel("重复图片", f"列表中有 {len(flagged)} 张图片与前面的图片相同或相似。\n是否在拼接前移除它们？")
+            if answer is None: return
+            if answer:
+                self._forget_paths(set(flagged)); self._update_expected_height_display()
+                if not self.items: return
+        
+        settings = self._output_settings()
+        if settings is None: return
+        target_w, out_fmt, preset, jpg_q, workers, max_part_h = settings
+
+        # Plan parts up front from known dimensions, so the part count is known before any decoding
+        from stitch_engine import source_heights, plan_parts
+        paths = list(self.items.paths); rotations = self.items.rotations()
+        sizes = self.items.sizes()
+        heights = source_heights(paths, rotations, target_w, sizes)
+        at_boundaries = self.split_at_boundary_var.get()
+        part_count = len(plan_parts(heights, max_part_h, at_boundaries))
+        if part_count > 1 and not messagebox.askokcancel(
+                "分段输出", f"总高度 {sum(heights)} 像素超过单张上限 {max_part_h} 像素，\n将拆分为 {part_count} 个文件（文件名后缀 _part01 ...）。"):
+            self.status_label.config(text="保存已取消。"); return
+
+        # Output path comes first: strips are streamed straight into the file as they are rendered
+        s_path = self._ask_output_path(out_fmt)
+        if not s_path:
+            self.status_label.config(text="保存已取消。"); return
+
+        # Snapshot the job so list edits during the stitch don't race the worker
+        largest_source = max((w * h for w, h in sizes.values()), default=0)  # sizes the memory plan
+        job = dict(paths=paths, rotations=rotations, target_w=target_w, out_path=s_path, out_fmt=out_fmt, quality=jpg_q,
+                   workers=workers, draft=self.fast_decode_var.get(), heights=heights, max_height=max_part_h,
+                   at_boundaries=at_boundaries, preset=preset, subsampling=self.subsampling_var.get(), trace=StitchTrace(),
+                   strip_cache=self.strip_cache, source_pixels=largest_source, trim_overlap=self.trim_overlap_var.get())
+        self._start_stitch_job(job)
+
+    def _start_stitch_job(self, job, run=None):  # run(**job, ...) on a worker thread; stitch_parts or IncrementalStitch.append
+        from stitch_engine import stitch_parts
+        self._stitch_is_append = run is not None
+        run = run or stitch_parts
+        self._stitch_cancel = threading.Event()
+        self._stitch_events = queue.Queue()
+        self._stitch_started = time.monotonic()
+        self._set_stitch_running(True)
+        self.status_label.config(text="处理中...")  # show busy status
+        self._stitch_thread = threading.Thread(target=self._stitch_worker, args=(job, run), daemon=True)
+        self._stitch_thread.start()
+        self.master.after(100, self._poll_stitch_job)
+
+    def _stitch_worker(self, job, run):  # runs off the Tk thread
+        from stitch_engine import StitchError, StitchCancelled
+        post = self._stitch_events.put  # only the queue is touched here; Tk is updated by _poll_stitch_job
+        try:
+            results = run(**job, on_missing=lambda p: post(("missing", p)),
+                          progress=lambda done, total, nbytes: post(("progress", (done, total, nbytes))),
+                          cancel_event=self._stitch_cancel)
+            job["trace"].finish()
+            log_event(log, logging.INFO, "stitch_done", images=len(job["paths"]), wall=job["trace"].wall_seconds,
+                      **{stage: s["seconds"] for stage, s in job["trace"].summary().items()})
+            if TRACE_PATH: job["trace"].write(TRACE_PATH)
+            post(("done", ([r for r in results if r.count], job["trace"])))
+        except StitchCancelled:
+            post(("cancelled", job.get("out_path")))
+        except StitchError as e:
+            post(("stitch_error", e))
+        except Exception as e:
+            post(("save_error", e))
+
+    def _poll_stitch_job(self):  # drain worker events on the Tk thread
+        events = self._stitch_events
+        last_progress = None
+        while True:
             try:
-                if out_fmt=="JPEG": comb_img.save(s_path,"JPEG",quality=jpg_q)
-                else: comb_img.save(s_path,"PNG",optimize=True)
-                messagebox.showinfo("成功", f"已保存到: {s_path}")
-                self.status_label.config(text=f"已保存: {os.path.basename(s_path)}")
-            except Exception as e:
-                messagebox.showerror("保存错误", f"保存出错: {e}")
-                self.status_label.config(text="保存失败。")
+                kind, payload = events.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "progress":
+                last_progress = payload; continue
+            if kind == "missing":  # missing sources are skipped, as before
+                messagebox.showwarning("文件丢失", f"图片 {os.path.basename(payload)} 未找到，已跳过。"); continue
+            self._finish_stitch_job(kind, payload); return
+        if last_progress: self._show_stitch_progress(*last_progress)
+        self.master.after(100, self._poll_stitch_job)
+
+    def _show_stitch_progress(self, done, total, nbytes):  # images done, bytes written, ETA
+        elapsed = time.monotonic() - self._stitch_started
+        eta = elapsed / done * (total - done) if done else 0
+        text = f"处理中 {done}/{total} 张，已写入 {nbytes / (1024 * 1024):.1f} MB，预计剩余 {int(eta)} 秒"
+        if self._stitch_cancel.is_set(): text = "正在取消..."
+        self.status_label.config(text=text)
+
+    def _finish_stitch_job(self, kind, payload):
+        self._set_stitch_running(False)
+        self._stitch_thread = None
+        if self._stitch_is_append:
+            self._finish_append(kind, payload)
+        elif kind == "cancelled":
+            self.status_label.config(text="拼接已取消。")
+        elif kind == "stitch_error":
+            messagebox.showerror("图片处理错误", f"处理 {os.path.basename(payload.path)} 错: {payload.error}")
+            self.status_label.config(text="处理失败。")
+        elif kind == "save_error":
+            messagebox.showerror("保存错误", f"保存出错: {payload}")
+            self.status_label.config(text="保存失败。")
+        elif not payload[0]:
+            self.status_label.config(text="无成功处理图片。注意：可能所有图片都无法打开或尺寸无效。")
+        else:  # report encoder cost and the per-stage breakdown alongside the output
+            payload, trace = payload
+            stats = f"{_format_bytes(sum(r.nbytes for r in payload))}，编码耗时 {sum(r.encode_seconds for r in payload):.2f} 秒"
+            breakdown = trace.breakdown(STAGE_LABELS)
+            breakdown = f"  [{breakdown}]" if breakdown else ""
+            if len(payload) == 1:
+                self.status_label.config(text=f"已保存: {os.path.basename(payload[0].path)}（{stats}）{breakdown}")
+                messagebox.showinfo("成功", f"已保存到: {payload[0].path}\n{stats}")
+            else:
+                names = "\n".join(f"{os.path.basename(r.path)}  {_format_bytes(r.nbytes)}" for r in payload)
+                self.status_label.config(text=f"已保存 {len(payload)} 个分段: {os.path.basename(payload[0].path)} ...（{stats}{breakdown}")
+                messagebox.showinfo("成功", f"已保存 {len(payload)} 个分段到 {os.path.dirname(payload[0].path)}:\n{names}\n{stats}")
+
+        if self.watcher is not None and self._append_queued:  # images that arrived while the worker was busy
+            self._append_queued = False; self._queue_append()
+
+    def _finish_append(self, kind, payload):  # watch mode reports in the status line; a failure stops watching
+        if kind in ("cancelled", "stitch_error", "save_error"):
+            if kind == "stitch_error":
+                messagebox.showerror("图片处理错误", f"处理 {os.path.basename(payload.path)} 错: {payload.error}")
+            elif kind == "save_error":
+                messagebox.showerror("保存错误", f"追加出错: {payload}")
+            self._stop_watch()
+            self.status_label.config(text="追加已取消，已停止监视。输出已恢复到上次追加后的状态。"); return
+        results, trace = payload
+        stitch = self.incremental
+        if stitch is None: return
+        if results:
+            breakdown = trace.breakdown(STAGE_LABELS)
+            self.status_label.config(text=f"已追加 {sum(r.count for r in results)} 张到 {os.path.basename(results[-1].path)}"
+                                          f"（共 {len(stitch)} 张，{stitch.height} 像素）" + (f"  [{breakdown}]" if breakdown else ""))
         else:
-            self.status_label.config(text="保存已取消。")
+            self.status_label.config(text=f"正在监视 {self.watcher.folder}（共 {len(stitch)} 张）")
+
+    def toggle_watch(self):  # watch a folder and append every new image to one growing output
+        if self.watcher is not None:
+            self._stop_watch(); self.status_label.config(text="已停止监视。"); return
+        settings = self._output_settings()
+        if settings is None: return
+        target_w, out_fmt, preset, jpg_q, workers, max_part_h = settings
+        from stream_encoders import streams_output
+        from incremental import IncrementalStitch
+        if not streams_output(out_fmt, preset):
+            messagebox.showerror("无法追加", "监视模式需要可追加写入的输出：JPEG（快速/均衡）或 PNG。"); return
+        folder = filedialog.askdirectory(title="选择要监视的文件夹")
+        if not folder: return
+        s_path = self._ask_output_path(out_fmt)
+        if not s_path:
+            self.status_label.config(text="已取消监视。"); return
+        params = dict(out_fmt=out_fmt, target_w=target_w, quality=jpg_q, preset=preset, subsampling=self.subsampling_var.get(),
+                      draft=self.fast_decode_var.get(), max_height=max_part_h)
+        self.incremental = IncrementalStitch.load(s_path, **params) or IncrementalStitch(s_path, **params)  # same settings: keep growing it
+        folder = os.path.abspath(folder)
+        try:
+            present = [os.path.join(folder, name) for name in os.listdir(folder)]
+        except OSError as e:
+            messagebox.showerror("监视失败", f"无法读取文件夹: {e}"); self.incremental = None; return
+        self.watcher = FolderWatcher(folder, self._is_image_file, known=present)  # only files that appear from now on
+        self._watch_workers = workers
+        self.watch_button.config(text="停止监视")
+        log_event(log, logging.INFO, "watch_start", folder=folder, output=s_path, resumed=len(self.incremental))
+        self.status_label.config(text=f"正在监视 {folder}，新图片将追加到 {os.path.basename(s_path)}")
+        self._queue_append()  # images already in the list come first
+        self._watch_poll_job = self.master.after(WATCH_POLL_MS, self._watch_poll)
+
+    def _watch_poll(self):
+        self._watch_poll_job = None
+        if self.watcher is None: return
+        ready = self.watcher.poll()
+        if ready and self._process_new_image_paths(ready): self._queue_append()
+        self._watch_poll_job = self.master.after(WATCH_POLL_MS, self._watch_poll)
+
+    def _queue_append(self):  # append list images the output doesn't have yet, in list order; later edits above them don't rewrite it
+        stitch = self.incremental
+        if stitch is None: return
+        if self._stitch_thread is not None or self._hash_order:  # duplicates are skipped before they reach the output
+            self._append_queued = True; return
+        paths = [p for p in self.items.paths if p not in stitch]
+        if not paths: return
+        job = dict(paths=paths, rotations=self.items.rotations(), workers=self._watch_workers, trace=StitchTrace(),
+                   strip_cache=self.strip_cache)
+        self._start_stitch_job(job, stitch.append)
+
+    def _stop_watch(self):  # a running append finishes (or is cancelled) on its own
+        if self._watch_poll_job is not None:
+            self.master.after_cancel(self._watch_poll_job); self._watch_poll_job = None
+        if self.watcher is not None: log_event(log, logging.INFO, "watch_stop", folder=self.watcher.folder)
+        self.watcher = None; self.incremental = None; self._append_queued = False
+        self.watch_button.config(text="监视文件夹")
+
+    def _set_stitch_running(self, running):  # toggle stitch / cancel buttons
+        self.combine_button.config(state=tk.DISABLED if running else tk.NORMAL)
+        self.cancel_button.config(state=tk.NORMAL if running else tk.DISABLED)
+
+    def cancel_stitch(self):  # ask the worker to stop; it removes the partial output itself
+        if self._stitch_cancel is not None and self._stitch_thread is not None:
+            self._stitch_cancel.set()
+            self.status_label.config(text="正在取消...")
+
+    def open_overview(self):  # to-scale overview of the whole stitch, built from thumbnails
+        if self.overview is None or not self.overview.window.winfo_exists():
+            from overview import StitchOverview
+            self.overview = StitchOverview(self)
+        else:
+            self.overview.show()
+
+    def _describe_row(self, path):  # secondary caption in the image list
+        item = self.items.get(path)
+        if item is None or item.width is None: return "读取尺寸中..." if path in self._probe_pending else None
+        rotation = item.rotation
+        caption = f"{item.width}×{item.height}" + (f" · 旋转 {rotation}°" if rotation else "")
+        duplicate = item.duplicate
+        if duplicate and duplicate[1] in self.items:
+            caption += f" · {'相同' if duplicate[0] == 'exact' else '相似'}于 {os.path.basename(duplicate[1])}"
+        return caption
+
+    def select_index(self, idx):  # make one image the only selection and preview it
+        lb = self.image_listbox
+        lb.selection_clear(0, END); lb.selection_set(idx); lb.activate(idx); lb.see(idx)
+        self.show_preview()
+
+    def _on_close(self):  # cancel and wait briefly so the partial output gets cleaned up
+        self._stop_watch()
+        if self._stitch_thread is not None:
+            self._stitch_cancel.set()
+            self._stitch_thread.join(timeout=10)
+        self.strip_cache.close()  # removes spilled strips
+        self.master.destroy()
 
     def _is_image_file(self, filepath):  # check supported image suffix
         if not isinstance(filepath, str):
@@ -457,9 +968,9 @@ class PhotoStitcherApp:  # main application class
                 self.preview_label.image = None
                 return
 
-        if not (0 <= active_idx < len(self.image_paths)):
+        if not (0 <= active_idx < len(self.items)):
             actual_size = lb.size()
-            paths_size = len(self.image_paths)
+            paths_size = len(self.items)
 
             if actual_size == 0 or paths_size == 0 :
                  self.preview_label.config(image=None, text="图片预览")
@@ -478,20 +989,9 @@ class PhotoStitcherApp:  # main application class
                  self.preview_label.image = None
                  return
 
-        image_path = self.image_paths[active_idx]  # resolve path for active item
-
-        try:  # open, rotate if needed, and render to preview
-            img = Image.open(image_path)
-
-            rotation_angle = self.rotations.get(image_path, 0)
-            if rotation_angle != 0:
-                img = img.rotate(rotation_angle, expand=True)
-
-            img_w, img_h = img.size
-
-            if img_w == 0 or img_h == 0:
-                raise ValueError("图片宽度或高度为0")
+        image_path = self.items.paths[active_idx]  # resolve path for active item
 
+        try:  # reuse a cached bitmap, or open, rotate and render to preview
             self.preview_label.update_idletasks()
             container_w = self.preview_label.winfo_width()
             container_h = self.preview_label.winfo_height()
@@ -499,30 +999,20 @@ class PhotoStitcherApp:  # main application class
             # if container is too small, skip until next configure
             if container_w < 10 or container_h < 10:
                 return
-            
-            # Scale to fit preview container while preserving aspect ratio
-            target_w = container_w
-            target_h = container_h
-            
-            scale_w = target_w / img_w
-            scale_h = target_h / img_h
-            scale = min(scale_w, scale_h)
 
-            if scale <= 0:
-                return
+            cache_key = self._preview_cache_key(image_path, container_w, container_h)
+            photo_img = self.preview_cache.get(cache_key)
+            if photo_img is None:
+                started = time.perf_counter()
+                from PIL import ImageTk
+                img_resized = self._render_preview_image(image_path, self.items.rotation(image_path), (container_w, container_h), self.fast_decode_var.get())
+                photo_img = ImageTk.PhotoImage(img_resized)
+                self.preview_cache.put(cache_key, photo_img, img_resized.width * img_resized.height * 4)  # Tk keeps 32-bit pixels
+                log_event(log, logging.DEBUG, "preview_rendered", path=image_path, seconds=time.perf_counter() - started)
 
-            display_w = int(img_w * scale)
-            display_h = int(img_h * scale)
-            
-            display_w = max(1, display_w)
-            display_h = max(1, display_h)
-            
-            img_resized = img.resize((display_w, display_h), Image.Resampling.LANCZOS)
-            photo_img = ImageTk.PhotoImage(img_resized)
-            
             self.preview_label.config(image=photo_img, text="")
             self.preview_label.image = photo_img  # keep reference to avoid GC
-            self.image_objects[image_path] = photo_img
+            self._schedule_prefetch(active_idx, container_w, container_h)
         except Exception as e:
             current_text = self.preview_label.cget("text")
             if "无法预览" not in current_text:
@@ -531,14 +1021,85 @@ class PhotoStitcherApp:  # main application class
                      self.preview_label.image = None
                  except tk.TclError:
                      pass
-            print(f"Error showing preview for {image_path} (event: {event}): {e}")
+            log_event(log, logging.ERROR, "preview_failed", path=image_path, error=e)
+
+    def _render_preview_image(self, image_path, rotation, box_size, fast_decode):  # PIL image; safe off the Tk thread
+        from stitch_engine import render_preview
+        from metadata_store import THUMB_MAX_SIDE
+        from transform_plan import TransformPlan, oriented_size
+        store = self.metadata_store
+        thumb = store.load_thumbnail(image_path) if store else None
+        orientation = self.items.orientation(image_path)
+        if thumb is not None and orientation is not None:  # orientation unknown until the probe lands
+            display_size, scale = fit_size(oriented_size(thumb.size, orientation), rotation, box_size)
+            if scale <= 1 or max(thumb.size) < THUMB_MAX_SIDE:  # thumbnail has enough pixels (or is the whole image)
+                return TransformPlan(thumb.size, thumb.mode, orientation, rotation, display_size).execute(thumb)
+        img = render_preview(image_path, rotation, box_size, fast_decode)
+        if store and thumb is None:
+            try:
+                key = (image_path, os.stat(image_path).st_mtime_ns)
+            except OSError:
+                return img
+            with self._thumbs_lock:
+                if key in self._thumbs_in_flight: return img
+                self._thumbs_in_flight.add(key)
+            self._background_pool.submit(self._store_thumbnail, image_path, key)
+        return img
+
+    def _store_thumbnail(self, image_path, key):  # runs on the background pool
+        from stitch_engine import render_thumbnail
+        from metadata_store import THUMB_MAX_SIDE
+        try:
+            self.metadata_store.save_thumbnail(image_path, render_thumbnail(image_path, THUMB_MAX_SIDE))
+        except Exception as e:
+            log_event(log, logging.WARNING, "thumbnail_failed", path=image_path, error=e)
+        finally:  # stored: later renders load it; failed: the next render may try again
+            with self._thumbs_lock:
+                self._thumbs_in_flight.discard(key)
+
+    def _preview_cache_key(self, image_path, container_w, container_h):  # stale on file edits, rotation or resize
+        return (image_path, os.stat(image_path).st_mtime_ns, self.items.rotation(image_path),
+                container_w, container_h, self.fast_decode_var.get())
+
+    def _schedule_prefetch(self, active_idx, container_w, container_h):  # warm the cache along the direction of travel
+        step = self._nav_direction
+        order = [active_idx + step * i for i in range(1, PREFETCH_RADIUS + 1)]
+        order += [active_idx - step * i for i in range(1, PREFETCH_RADIUS + 1)]
+        fast = self.fast_decode_var.get()
+        plan = []
+        for idx in order:
+            if not 0 <= idx < len(self.items): continue
+            path = self.items.paths[idx]
+            try:
+                key = self._preview_cache_key(path, container_w, container_h)
+            except OSError:
+                continue
+            if key not in self.preview_cache:
+                plan.append((key, (path, self.items.rotation(path), (container_w, container_h), fast)))
+        self.prefetcher.schedule(plan)
+        if plan and self._prefetch_poll_job is None:
+            self._prefetch_poll_job = self.master.after(30, self._collect_prefetched)
+
+    def _collect_prefetched(self):  # PhotoImages must be created on the Tk thread
+        from PIL import ImageTk
+        self._prefetch_poll_job = None
+        while True:
+            try:
+                key, img = self.prefetcher.results.get_nowait()
+            except queue.Empty:
+                break
+            if self.items.rotation(key[0]) == key[2]:  # rotated meanwhile: the render is stale
+                self.preview_cache.put(key, ImageTk.PhotoImage(img), img.width * img.height * 4)
+        if self.prefetcher.busy() or not self.prefetcher.results.empty():
+            self._prefetch_poll_job = self.master.after(30, self._collect_prefetched)
 
     def _handle_key_up_arrow(self, event):  # Up arrow without Shift: move selection up
+        self._nav_direction = -1  # prefetch ahead of travel
         lb = self.image_listbox
         is_shifted = (event.state & 0x0001) != 0
 
         if is_shifted:
-            # let default Listbox Shift+Up behavior handle range selection
+            # the list's own Shift+Up binding extends the range
             return
 
         # Non-Shift custom handling
@@ -570,11 +1131,12 @@ class PhotoStitcherApp:  # main application class
         return "break"
 
     def _handle_key_down_arrow(self, event):  # Down arrow without Shift: move selection down
+        self._nav_direction = 1  # prefetch ahead of travel
         lb = self.image_listbox
         is_shifted = (event.state & 0x0001) != 0
 
         if is_shifted:
-            # let default Listbox Shift+Down behavior handle range selection
+            # the list's own Shift+Down binding extends the range
             return
 
         # Non-Shift custom handling
@@ -606,6 +1168,7 @@ class PhotoStitcherApp:  # main application class
         return "break"
 
     def _handle_control_key_up_arrow(self, event):  # Ctrl/Cmd + Up toggles selection
+        self._nav_direction = -1  # prefetch ahead of travel
         lb = self.image_listbox
         if lb.size() == 0: return "break"
 
@@ -645,6 +1208,7 @@ class PhotoStitcherApp:  # main application class
         return "break"
 
     def _handle_control_key_down_arrow(self, event):  # Ctrl/Cmd + Down toggles selection
+        self._nav_direction = 1  # prefetch ahead of travel
         lb = self.image_listbox
         if lb.size() == 0: return "break"
 
@@ -683,21 +1247,11 @@ class PhotoStitcherApp:  # main application class
 
 
 if __name__ == '__main__':  # app entry point
-    root = tkinterdnd2.Tk()  # DnD-enabled root window
-    app = PhotoStitcherApp(root)
-    # Bind dynamic callbacks; guard with hasattr in case of future changes.
-    if hasattr(app, 'output_width_var') and app.output_width_var:
-        app.output_width_var.trace_add("write", app._update_expected_height_display)
-    
-    if hasattr(app, 'jpeg_quality_scale') and app.jpeg_quality_scale:
-        app.jpeg_quality_scale.config(command=app._update_quality_display_label)
-    
-    if hasattr(app, 'output_format_menu') and app.output_format_menu:
-        app.output_format_menu.bind("<<ComboboxSelected>>", app._output_format_changed)
-    
-    # Initialize labels and state
-    if hasattr(app, '_update_quality_display_label'): app._update_quality_display_label()
-    if hasattr(app, '_output_format_changed'): app._output_format_changed()
-    if hasattr(app, '_update_expected_height_display'): app._update_expected_height_display()
-    
+    multiprocessing.freeze_support()  # render pool workers in packaged builds
+    configure_logging()  # PHOTO_STITCHER_LOG_LEVEL=DEBUG adds per-import / per-preview timings
+    startup = StartupTimer(STARTED)  # PHOTO_STITCHER_STARTUP_REPORT=path writes it as JSON once the app is ready
+    startup.mark("imports")
+    root = AppRoot()  # drag-and-drop is enabled after the first paint
+    startup.mark("root")
+    app = PhotoStitcherApp(root, startup)  # callbacks and initial label state are set up in __init__
     root.mainloop()  # start Tk event loop
@@ -0,0 +1,64 @@
+import os  # budget override
+
+# Peak-memory budget for one stitch job; override with PHOTO_STITCHER_MEMORY_MB (0 disables the governor)
+STITCH_MEMORY_BUDGET_BYTES = int(os.environ.get("PHOTO_STITCHER_MEMORY_MB", "1024")) * 1024 * 1024
+WORKER_OVERHEAD_BYTES = 40 * 1024 * 1024  # interpreter + Pillow in each render process
+STRIPS_PER_WORKER = 2  # iter_rendered keeps ~2 strips per worker in flight
+# Canvas encoders' own working set per output pixel, on top of the canvas: libwebp imports the picture as
+# ARGB (+ YUV planes when lossy); optimized / progressive libjpeg keeps every DCT coefficient until the end
+ENCODER_BYTES_PER_PIXEL = {"WEBP": 5.5, "WEBP_LOSSLESS": 8.0, "JPEG": 3.0}
+CANVAS_BYTES_PER_PIXEL = {"memory": 3, "mmap": 0}  # a mapped scratch canvas is file-backed; the OS pages it out
+
+
+class MemoryPlan:  # how one stitch job will run, and why
+    def __init__(self, strategy, workers, part_workers, estimate, budget, reason, over_budget=False):
+        self.strategy = strategy  # "memory" | "stream" | "mmap"
+        self.workers = workers  # render processes for a single-part stitch
+        self.part_workers = part_workers  # parts encoded side by side
+        self.estimate = estimate  # expected peak bytes with the chosen settings
+        self.budget = budget
+        self.reason = reason
+        self.over_budget = over_budget  # even the leanest setting is expected to exceed the budget
+
+    def as_fields(self):  # for log_event
+        return dict(strategy=self.strategy, workers=self.workers, part_workers=self.part_workers,
+                    estimate_mb=round(self.estimate / 1024 / 1024, 1), budget_mb=round(self.budget / 1024 / 1024, 1),
+                    over_budget=self.over_budget, reason=self.reason)
+
+
+def _mb(nbytes):
+    return f"{nbytes / 1024 / 1024:.0f} MB"
+
+
+def plan_memory(target_w, part_heights, max_strip_h, out_fmt, streaming, workers, budget, source_pixels=0):
+    # part_heights: output rows per part; max_strip_h: tallest single strip; source_pixels: largest source (w * h)
+    # streaming: the encoder takes strips as they come (see stream_encoders.streams_output)
+    strip = target_w * max_strip_h * 3
+    render = WORKER_OVERHEAD_BYTES + source_pixels * 3 + STRIPS_PER_WORKER * strip  # one render process / part thread
+    tallest = max(part_heights, default=0)
+    encoder = 0 if streaming else target_w * tallest * ENCODER_BYTES_PER_PIXEL.get(out_fmt, 3.0)
+    single = len(part_heights) <= 1
+    for strategy in (("stream",) if streaming else ("memory", "mmap")):
+        canvas = 0 if streaming else target_w * tallest * CANVAS_BYTES_PER_PIXEL[strategy]
+        if single:  # one output: the process pool renders, one canvas / encoder
+            fit = _fit(budget, canvas + encoder, render, workers)
+            estimate = canvas + encoder + max(1, fit) * render
+        else:  # parts side by side, each rendering serially into its own canvas / encoder
+            fit = _fit(budget, 0, render + canvas + encoder, min(workers, len(part_heights)))
+            estimate = max(1, fit) * (render + canvas + encoder)
+        if fit >= 1: break  # otherwise fall through to the leanest strategy, over budget
+    fit = max(1, fit)
+    if strategy == "stream":
+        reason = "streaming encoder; only in-flight strips are held"
+    else:
+        reason = f"canvas {_mb(target_w * tallest * 3)} + encoder {_mb(encoder)}"
+        reason += f" fit in {_mb(budget)}" if strategy == "memory" else f" exceed {_mb(budget)}; canvas mapped to a scratch file"
+    limit = workers if single else min(workers, len(part_heights))
+    if fit < limit: reason += f"; {fit} of {limit} {'render workers' if single else 'parts side by side'}"
+    return MemoryPlan(strategy, fit if single else 1, 1 if single else fit, estimate, budget, reason,
+                      over_budget=estimate > budget)
+
+
+def _fit(budget, fixed, each, limit):  # how many units of `each` fit next to `fixed`, capped at limit
+    if each <= 0: return limit
+    return max(0, min(limit, int((budget - fixed) // each)))
@@ -0,0 +1,185 @@
+import hashlib  # thumbnail file names
+import os  # filesystem helpers
+import sqlite3  # persistent metadata index
+import sys  # platform cache locations
+import threading  # the store is shared by the Tk thread and background workers
+import time  # LRU timestamps
+from PIL import Image  # thumbnail files
+
+THUMB_MAX_SIDE = 640  # big enough to serve the preview pane directly
+THUMB_QUALITY = 85
+STORE_MAX_BYTES = int(os.environ.get("PHOTO_STITCHER_CACHE_MB", "512")) * 1024 * 1024  # thumbnail budget
+STORE_MAX_ROWS = 200000  # metadata rows are tiny, but don't grow forever
+
+
+def default_cache_dir():  # per-user cache location; PHOTO_STITCHER_CACHE_DIR overrides
+    if os.environ.get("PHOTO_STITCHER_CACHE_DIR"):
+        return os.environ["PHOTO_STITCHER_CACHE_DIR"]
+    if sys.platform == "darwin":
+        return os.path.expanduser("~/Library/Caches/PhotoStitcher")
+    if sys.platform.startswith("win"):
+        return os.path.join(os.environ.get("LOCALAPPDATA", os.path.expanduser("~")), "PhotoStitcher", "Cache")
+    return os.path.join(os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "photo-stitcher")
+
+
+def file_signature(path):  # (size, mtime_ns): any edit invalidates the cached entry
+    st = os.stat(path)
+    return st.st_size, st.st_mtime_ns
+
+
+class MetadataStore:  # SQLite index of dimensions / orientation plus a directory of thumbnail files
+    def __init__(self, cache_dir=None, max_bytes=STORE_MAX_BYTES):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.thumb_dir = os.path.join(self.cache_dir, "thumbs")
+        self.max_bytes = max_bytes
+        os.makedirs(self.thumb_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(self.cache_dir, "metadata.sqlite3"), check_same_thread=False)
+        self._db.execute("""CREATE TABLE IF NOT EXISTS images (
+            path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER,
+            width INTEGER, height INTEGER, orientation INTEGER,
+            thumb TEXT, thumb_bytes INTEGER DEFAULT 0, last_used REAL)""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS images_last_used ON images(last_used)")
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(images)")}
+        for column in ("content_hash", "phash"):  # added after the first release; phash is hex (SQLite integers are signed)
+            if column not in columns: self._db.execute(f"ALTER TABLE images ADD COLUMN {column} TEXT")
+        self._db.commit()
+
+    def lookup(self, paths):  # {path: ((w, h), orientation)} for entries whose file is unchanged
+        found = {}; touched = []
+        paths = list(paths)
+        with self._lock:
+            for start in range(0, len(paths), 500):  # stay under SQLite's bound-parameter limit
+                chunk = paths[start:start + 500]
+                rows = self._db.execute(
+                    f"SELECT path, size, mtime_ns, width, height, orientation FROM images WHERE width IS NOT NULL AND path IN ({','.join('?' * len(chunk))})",
+                    chunk).fetchall()
+                for path, size, mtime_ns, w, h, orientation in rows:
+                    try:
+                        if file_signature(path) != (size, mtime_ns): continue
+                    except OSError:
+                        continue
+                    found[path] = ((w, h), orientation); touched.append(path)
+            now = time.time()
+            self._db.executemany("UPDATE images SET last_used=? WHERE path=?", [(now, p) for p in touched])
+            self._db.commit()
+        return found
+
+    def put_many(self, entries):  # entries: (path, (w, h), orientation); keeps a still-valid thumbnail
+        rows = []
+        for path, (w, h), orientation in entries:
+            try:
+                size, mtime_ns = file_signature(path)
+            except OSError:
+                continue
+            rows.append((path, size, mtime_ns, w, h, orientation, time.time()))
+        with self._lock:
+            for path, size, mtime_ns, *_ in rows:
+                self._drop_stale_thumb(path, size, mtime_ns)
+            self._db.executemany("""INSERT INTO images (path, size, mtime_ns, width, height, orientation, last_used)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(path) DO UPDATE SET size=excluded.size, mtime_ns=excluded.mtime_ns, width=excluded.width,
+                    height=excluded.height, orientation=excluded.orientation, last_used=excluded.last_used,
+                    content_hash=CASE WHEN {same} THEN content_hash END, phash=CASE WHEN {same} THEN phash END""".format(same=_SAME_FILE), rows)
+            self._trim_rows()
+            self._db.commit()
+
+    def lookup_hashes(self, paths):  # {path: (digest, phash or None)} for unchanged files hashed before
+        found = {}
+        paths = list(paths)
+        with self._lock:
+            for start in range(0, len(paths), 500):
+                chunk = paths[start:start + 500]
+                rows = self._db.execute(
+                    f"SELECT path, size, mtime_ns, content_hash, phash FROM images WHERE content_hash IS NOT NULL AND path IN ({','.join('?' * len(chunk))})",
+                    chunk).fetchall()
+                for path, size, mtime_ns, digest, phash in rows:
+                    try:
+                        if file_signature(path) != (size, mtime_ns): continue
+                    except OSError:
+                        continue
+                    found[path] = (digest, int(phash, 16) if phash else None)
+        return found
+
+    def put_hashes(self, entries):  # entries: (path, digest, phash or None); a row for a changed file loses its stale metadata
+        rows = []
+        for path, digest, phash in entries:
+            try:
+                size, mtime_ns = file_signature(path)
+            except OSError:
+                continue
+            rows.append((path, size, mtime_ns, digest, None if phash is None else f"{phash:016x}", time.time()))
+        with self._lock:
+            for path, size, mtime_ns, *_ in rows:
+                self._drop_stale_thumb(path, size, mtime_ns)
+            self._db.executemany("""INSERT INTO images (path, size, mtime_ns, content_hash, phash, last_used)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(path) DO UPDATE SET width=CASE WHEN {same} THEN width END, height=CASE WHEN {same} THEN height END,
+                    orientation=CASE WHEN {same} THEN orientation END, content_hash=excluded.content_hash,
+                    phash=COALESCE(excluded.phash, CASE WHEN {same} THEN phash END),
+                    size=excluded.size, mtime_ns=excluded.mtime_ns, last_used=excluded.last_used""".format(same=_SAME_FILE), rows)
+            self._trim_rows()
+            self._db.commit()
+
+    def load_thumbnail(self, path):  # PIL image (unrotated) or None
+        with self._lock:
+            row = self._db.execute("SELECT size, mtime_ns, thumb FROM images WHERE path=?", (path,)).fetchone()
+        if not row or not row[2]: return None
+        try:
+            if file_signature(path) != (row[0], row[1]): return None
+            with Image.open(os.path.join(self.thumb_dir, row[2])) as thumb:
+                thumb.load()
+                return thumb
+        except OSError:
+            return None
+
+    def save_thumbnail(self, path, thumb):  # thumb: PIL image of the unrotated source
+        try:
+            size, mtime_ns = file_signature(path)
+        except OSError:
+            return
+        name = hashlib.sha1(f"{path}\0{size}\0{mtime_ns}".encode("utf-8")).hexdigest() + ".jpg"
+        thumb_path = os.path.join(self.thumb_dir, name)
+        thumb.convert("RGB").save(thumb_path, "JPEG", quality=THUMB_QUALITY)
+        nbytes = os.path.getsize(thumb_path)
+        with self._lock:
+            self._drop_stale_thumb(path, size, mtime_ns)
+            cur = self._db.execute("UPDATE images SET thumb=?, thumb_bytes=?, last_used=? WHERE path=? AND size=? AND mtime_ns=?",
+                                   (name, nbytes, time.time(), path, size, mtime_ns))
+            if not cur.rowcount:  # metadata row missing or stale: the thumbnail can't be looked up
+                _remove_quietly(thumb_path)
+            self._evict_thumbs()
+            self._db.commit()
+
+    def _drop_stale_thumb(self, path, size, mtime_ns):
+        row = self._db.execute("SELECT thumb FROM images WHERE path=? AND (size!=? OR mtime_ns!=?)", (path, size, mtime_ns)).fetchone()
+        if row and row[0]:
+            _remove_quietly(os.path.join(self.thumb_dir, row[0]))
+            self._db.execute("UPDATE images SET thumb=NULL, thumb_bytes=0 WHERE path=?", (path,))
+
+    def _evict_thumbs(self):  # least recently used thumbnails go first
+        total = self._db.execute("SELECT COALESCE(SUM(thumb_bytes), 0) FROM images").fetchone()[0]
+        if total <= self.max_bytes: return
+        for path, name, nbytes in self._db.execute(
+                "SELECT path, thumb, thumb_bytes FROM images WHERE thumb IS NOT NULL ORDER BY last_used").fetchall():
+            _remove_quietly(os.path.join(self.thumb_dir, name))
+            self._db.execute("UPDATE images SET thumb=NULL, thumb_bytes=0 WHERE path=?", (path,))
+            total -= nbytes
+            if total <= self.max_bytes: break
+
+    def _trim_rows(self):
+        excess = self._db.execute("SELECT COUNT(*) FROM images").fetchone()[0] - STORE_MAX_ROWS
+        if excess <= 0: return
+        for path, name in self._db.execute("SELECT path, thumb FROM images ORDER BY last_used LIMIT ?", (excess,)).fetchall():
+            if name: _remove_quietly(os.path.join(self.thumb_dir, name))
+            self._db.execute("DELETE FROM images WHERE path=?", (path,))
+
+
+_SAME_FILE = "size=excluded.size AND mtime_ns=excluded.mtime_ns"  # upsert: the stored row still describes this file
+
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -0,0 +1,151 @@
+import time  # per-image timing
+from PIL import Image, ImageChops, ImageFilter, ImageStat  # row signatures and their differences, all in C
+
+SIGNATURE_WIDTH = 32  # samples per row: enough to tell text lines apart, small enough to compare thousands of offsets
+ROW_TOLERANCE = 8  # mean absolute luminance difference per (smoothed, phase-matched) row still counted as equal
+SIGNATURE_BLUR = 2  # smoothing radius: absorbs what the sub-row phases below don't (resampling ringing at sharp edges)
+BLUR_REACH = 3 * SIGNATURE_BLUR  # rows this close to a bar edge are smeared into it by the smoothing
+SUBROW_PHASES = (0.0, 0.25, 0.5, 0.75)  # scroll offsets rarely land on whole output rows: lower is also tried shifted by these
+REFINE_ROWS = 3  # the smoothed match is refined on the raw rows within this distance
+MIN_OVERLAP_ROWS = 16  # shorter matches are too likely to be coincidence
+BAND_ROWS = 24  # rows of the upper image located in the lower one; the rest of the overlap is then verified
+MIN_BAND_STDDEV = 4.0  # a band this flat (blank background) can't be located reliably
+MIN_ROW_DETAIL = 3  # mean deviation from its own average that makes a row evidence; blank rows match anything
+MIN_EVIDENCE_ROWS = 3 * BAND_ROWS // 2  # detailed rows a verified overlap needs; one repeated list item or bubble is not enough
+BAR_TOLERANCE = 1  # a fixed bar is the same pixels in both images; only resampling rounding may differ
+MAX_FIXED_FRACTION = 0.25  # status / navigation bars are at most this share of the image
+MAX_NOISY_ROWS = 2  # a verified overlap may pass over this many differing rows in a row (resampling at sharp edges)
+
+
+def row_signature(strip):  # 'L' image SIGNATURE_WIDTH wide with one row per strip row
+    return strip.resize((SIGNATURE_WIDTH, strip.height), Image.BOX).convert("L")
+
+
+def _row_diffs(a, b):  # per-row mean absolute difference of two equally sized signatures, as bytes
+    return ImageChops.difference(a, b).resize((1, a.height), Image.BOX).tobytes()
+
+
+def _row_detail(signature):  # per-row mean absolute deviation from the row's own average, as bytes
+    flat = signature.resize((1, signature.height), Image.BOX).resize(signature.size, Image.NEAREST)
+    return _row_diffs(signature, flat)
+
+
+def _fixed_footer(upper, lower):  # trailing rows identical in both: a navigation / tool bar that doesn't scroll
+    # Compared on the raw signatures, strictly: smoothing would blend the bar's edge with the content scrolling above it,
+    # and list rows that happen to line up would otherwise pass for part of the bar
+    limit = int(min(upper.height, lower.height) * MAX_FIXED_FRACTION)
+    if limit <= 0: return 0
+    diffs = _row_diffs(upper.crop((0, upper.height - limit, SIGNATURE_WIDTH, upper.height)),
+                       lower.crop((0, lower.height - limit, SIGNATURE_WIDTH, lower.height)))
+    for i, d in enumerate(reversed(diffs)):
+        if d > BAR_TOLERANCE: return i
+    return limit
+
+
+def _matched_run(diffs):  # rows matching upward from the bottom, riding over short noisy runs
+    run = bad = 0
+    for d in reversed(diffs):
+        if d > ROW_TOLERANCE:
+            bad += 1
+            if bad > MAX_NOISY_ROWS: break
+        else:
+            run += bad + 1; bad = 0
+    return run
+
+
+def _band_offsets(band, lower, count):  # offsets e < count where every band row matches lower's row e + j
+    # One pass per band row over all offsets at once: band row j tiled down `count` rows against lower shifted by j,
+    # keeping the worst per-row difference; C loops over offsets, Python only over the BAND_ROWS rows
+    worst = None
+    for j in range(band.height):
+        tiled = band.crop((0, j, SIGNATURE_WIDTH, j + 1)).resize((SIGNATURE_WIDTH, count), Image.NEAREST)
+        diffs = ImageChops.difference(lower.crop((0, j, SIGNATURE_WIDTH, j + count)), tiled).resize((1, count), Image.BOX)
+        worst = diffs if worst is None else ImageChops.lighter(worst, diffs)
+    return [e for e, d in enumerate(worst.tobytes()) if d <= ROW_TOLERANCE]
+
+
+def find_overlap(upper, lower):  # signatures of consecutive images -> (rows to cut off upper's bottom, rows to cut off lower's top) or None
+    # A textured band from the bottom of upper's scrolling content is located in lower at every offset (and sub-row
+    # phase) at once; each hit must then match row by row all the way up to lower's status bar, which may differ (the
+    # clock) and is cut off with the duplicated content above `top`
+    raw_upper, raw_lower = upper, lower
+    footer = _fixed_footer(upper, lower)
+    content_end = upper.height - footer  # upper's content stops here; its footer is dropped when lower continues it
+    header_limit = int(lower.height * MAX_FIXED_FRACTION)  # a verified run must reach up into lower's status bar area
+    upper = upper.filter(ImageFilter.GaussianBlur(SIGNATURE_BLUR)); lower = lower.filter(ImageFilter.GaussianBlur(SIGNATURE_BLUR))
+    match_end = content_end - BLUR_REACH if footer else content_end  # blurred rows next to the footer are not content
+    band_end = match_end
+    while band_end - BAND_ROWS >= 0:  # lowest band of upper's content with enough texture
+        band = upper.crop((0, band_end - BAND_ROWS, SIGNATURE_WIDTH, band_end))
+        if max(ImageStat.Stat(band).stddev) >= MIN_BAND_STDDEV: break
+        band_end -= BAND_ROWS
+    else:
+        return None
+    band_start = band_end - BAND_ROWS
+    count = lower.height - footer - BAND_ROWS + 1
+    if count <= 0: return None
+    detail = _row_detail(upper)
+    next_rows = lower.crop((0, 1, SIGNATURE_WIDTH, lower.height + 1))
+    found = []  # (top, verified rows, lower row the verified run reaches up to, mean difference)
+    for phase in SUBROW_PHASES:
+        shifted = Image.blend(lower, next_rows, phase) if phase else lower  # row e holds lower at e + phase
+        for e in _band_offsets(band, shifted, count):
+            top = e + content_end - band_start  # lower's rows above this (+ phase) are already in upper
+            if top >= lower.height - footer: continue  # lower would add nothing
+            end = top - (content_end - match_end)  # lower's row level with match_end
+            span = min(match_end, end)
+            diffs = _row_diffs(upper.crop((0, match_end - span, SIGNATURE_WIDTH, match_end)),
+                               shifted.crop((0, end - span, SIGNATURE_WIDTH, end)))
+            rows = _matched_run(diffs)
+            if rows < max(MIN_OVERLAP_ROWS, match_end - band_start): continue  # must reach through the band
+            if sum(d >= MIN_ROW_DETAIL for d in detail[match_end - rows:match_end]) < MIN_EVIDENCE_ROWS: continue  # mostly blank
+            found.append((top + phase, rows, 0 if rows == span else end - rows, sum(diffs[-rows:]) / rows))  # 0: hit upper's top
+    if not found: return None
+    # The true overlap matches up to lower's status bar, the leading rows both images share apart from the clock; a
+    # look-alike (a repeated list item) stops somewhere in the content below it
+    bar = _matched_run(_row_diffs(upper.crop((0, 0, SIGNATURE_WIDTH, header_limit)),
+                                  lower.crop((0, 0, SIGNATURE_WIDTH, header_limit)))[::-1])
+    found = [f for f in found if f[2] <= min(header_limit, bar + 3 * BLUR_REACH)]
+    if not found: return None
+    reach = min(f[2] for f in found)
+    found = sorted(f for f in found if f[2] <= reach + 2 * BLUR_REACH)
+    # Repetitive layouts (lists, chats) can match all the way up at several offsets: of those with comparable evidence
+    # the smallest overlap wins, since trimming too little repeats a few rows while trimming too much loses content
+    longest = max(f[1] for f in found)
+    top = next(f[0] for f in found if 2 * f[1] >= longest)
+    cluster = [f for f in found if 0 <= f[0] - top <= 2 * REFINE_ROWS]
+    top, _, reach, _ = min(cluster, key=lambda f: f[3])  # its best offset within the smoothing blur
+    top = round(top)
+    window = min(content_end, top - reach - BLUR_REACH) - REFINE_ROWS  # same content rows compared for every nearby offset
+    if window < MIN_OVERLAP_ROWS: return footer, top
+    def raw_difference(t):
+        if t >= raw_lower.height: return float("inf")
+        return sum(_row_diffs(raw_upper.crop((0, content_end - window, SIGNATURE_WIDTH, content_end)),
+                              raw_lower.crop((0, t - window, SIGNATURE_WIDTH, t))))
+    return footer, min(range(top - REFINE_ROWS, top + REFINE_ROWS + 1), key=raw_difference)
+
+
+def trim_overlaps(rendered, trace=None):  # (path, strip, error) stream with overlaps between neighbours cropped away
+    # Holds one strip back, since the next image decides how much of its bottom is cut. Errors and missing
+    # images pass through in order and break the chain, so unrelated images are never compared
+    held = None  # (path, strip as cropped so far, signature of the whole strip)
+    try:
+        for i_path, strip, error in rendered:
+            if strip is None:
+                if held is not None: yield held[0], held[1], None; held = None
+                yield i_path, strip, error; continue
+            started = time.perf_counter()
+            signature = row_signature(strip)
+            if held is not None:
+                prev_path, prev_strip, prev_signature = held
+                found = find_overlap(prev_signature, signature)
+                if found is not None:
+                    bottom, top = found
+                    if bottom: prev_strip = prev_strip.crop((0, 0, prev_strip.width, max(1, prev_strip.height - bottom)))
+                    strip = strip.crop((0, top, strip.width, strip.height))
+                if trace is not None: trace.record("overlap", time.perf_counter() - started, i_path)
+                yield prev_path, prev_strip, None
+            held = (i_path, strip, signature)
+        if held is not None: yield held[0], held[1], None
+    finally:
+        rendered.close()
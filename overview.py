@@ -0,0 +1,143 @@
+import bisect  # viewport -> image index
+import itertools  # prefix sums of strip heights
+import os  # tile captions
+import queue  # finished tiles from the render thread
+import tkinter as tk  # overview window
+from PIL import ImageTk  # tiles as PhotoImages
+from preview_cache import PreviewCache, PreviewPrefetcher  # tile LRU + background renderer
+from stitch_engine import scaled_height  # same rounding as the stitcher
+
+OVERVIEW_WIDTH = 320  # initial canvas width; tiles follow the window width
+OVERVIEW_CACHE_MAX_BYTES = 64 * 1024 * 1024  # rendered tiles, shared by scrolling back and forth
+OVERVIEW_OVERSCAN = 0.5  # viewport heights rendered ahead above and below
+PLACEHOLDER_FILL = "#d9d9d9"
+
+
+class StitchOverview:  # scrollable, to-scale overview of the whole stitch; only tiles near the viewport exist
+    def __init__(self, app):
+        self.app = app  # reads app.items (order, rotations, sizes) and renders through app._render_preview_image
+        self.window = tk.Toplevel(app.master)
+        self.window.title("拼接总览")
+        self.window.geometry(f"{OVERVIEW_WIDTH + 40}x700")
+        self.window.protocol("WM_DELETE_WINDOW", self.window.withdraw)  # hidden, not destroyed: keeps tiles + thread
+        self.info_var = tk.StringVar(value="")
+        tk.Label(self.window, textvariable=self.info_var, anchor="w").pack(side=tk.TOP, fill=tk.X, padx=5)
+        self.canvas = tk.Canvas(self.window, width=OVERVIEW_WIDTH, bg="white", highlightthickness=0)
+        scrollbar = tk.Scrollbar(self.window, orient=tk.VERTICAL, command=self.canvas.yview)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.canvas.config(yscrollcommand=lambda first, last: (scrollbar.set(first, last), self._schedule_update()))
+        self.canvas.bind("<Configure>", lambda e: self.schedule_refresh())
+        self.canvas.bind("<Button-1>", self._on_click)
+        self.canvas.bind("<MouseWheel>", lambda e: self.canvas.yview_scroll(-1 if e.delta > 0 else 1, "units"))
+        self.canvas.bind("<Button-4>", lambda e: self.canvas.yview_scroll(-1, "units"))  # X11 wheel
+        self.canvas.bind("<Button-5>", lambda e: self.canvas.yview_scroll(1, "units"))
+
+        self.tiles = PreviewCache(OVERVIEW_CACHE_MAX_BYTES)  # key (path, rotation, w, h, fast) -> PhotoImage
+        self.renderer = PreviewPrefetcher(app._render_preview_image)  # stored thumbnails first, so sources are rarely decoded
+        self._layout = []  # (path, rotation, top, height) per image, canvas pixels
+        self._tops = []  # top of each tile, for bisect
+        self._shown = {}  # (index, path, rotation, top, height) -> (canvas ids, tile key, PhotoImage or None)
+        self._view_w = OVERVIEW_WIDTH
+        self._refresh_job = None; self._update_job = None; self._poll_job = None
+        self.schedule_refresh()
+
+    def show(self):
+        self.window.deiconify(); self.window.lift()
+        self.schedule_refresh()
+
+    def visible(self):
+        return self.window.winfo_exists() and self.window.state() != "withdrawn"
+
+    def schedule_refresh(self):  # list / width / rotation changed; coalesced into one relayout
+        if self._refresh_job is None:
+            self._refresh_job = self.window.after(50, self._refresh)
+
+    def _schedule_update(self):  # viewport moved
+        if self._update_job is None:
+            self._update_job = self.window.after_idle(self._update_view)
+
+    def discard_path(self, path):
+        self.tiles.discard_path(path)
+
+    def _refresh(self):  # O(n) prefix sums over the current order; tiles themselves are reused
+        self._refresh_job = None
+        if not self.visible(): return
+        app = self.app
+        target_w = app._output_width() or 1080
+        view_w = max(1, self.canvas.winfo_width())
+        scale = view_w / target_w
+        items = list(app.items)
+        heights = [scaled_height(item.size, item.rotation, target_w) if item.width is not None else 0 for item in items]
+        tops = [0] + list(itertools.accumulate(heights))
+        self._layout = [(item.path, item.rotation, tops[i] * scale, heights[i] * scale) for i, item in enumerate(items)]
+        self._tops = [top for _, _, top, _ in self._layout]
+        self._view_w = view_w
+        self.canvas.config(scrollregion=(0, 0, view_w, max(1, tops[-1] * scale)))
+        known = sum(1 for h in heights if h)
+        self.info_var.set(f"{known} 张，{tops[-1]} 像素高（宽 {target_w}，缩放 {scale:.3f}）")
+        self._update_view()
+
+    def _visible_range(self, overscan):
+        top = self.canvas.canvasy(0); height = self.canvas.winfo_height()
+        start = max(0, bisect.bisect_right(self._tops, top - overscan * height) - 1)
+        end = bisect.bisect_left(self._tops, top + height * (1 + overscan))
+        return start, min(end, len(self._layout))
+
+    def _update_view(self):  # create tiles entering the viewport, drop the ones that left, queue missing renders
+        self._update_job = None
+        if not self._layout:
+            self.canvas.delete("all"); self._shown.clear(); return
+        start, end = self._visible_range(OVERVIEW_OVERSCAN)
+        fast = self.app.fast_decode_var.get()
+        wanted = {}
+        for idx in range(start, end):
+            path, rotation, top, height = self._layout[idx]
+            if height < 1: continue
+            box = (self._view_w, max(1, round(height)))
+            wanted[(idx, path, rotation, top, height)] = (path, rotation, box[0], box[1], fast)
+        for sig in [s for s in self._shown if s not in wanted]:
+            self.canvas.delete(*self._shown.pop(sig)[0])
+        view_top, view_bottom = self._visible_range(0)
+        plan_near = []; plan_far = []
+        for sig, key in wanted.items():
+            if sig not in self._shown:
+                self._shown[sig] = self._draw_tile(sig, key)
+            if key not in self.tiles:
+                job = (key, (key[0], key[1], (key[2], key[3]), key[4]))
+                (plan_near if view_top <= sig[0] < view_bottom else plan_far).append(job)
+        self.renderer.schedule(plan_near + plan_far)  # what is on screen first, then the overscan
+        if (plan_near or plan_far) and self._poll_job is None:
+            self._poll_job = self.window.after(30, self._collect_tiles)
+
+    def _draw_tile(self, sig, key):  # placeholder now, the real tile once it has been rendered
+        _, path, _, top, height = sig
+        photo = self.tiles.get(key)  # referenced from _shown too, so LRU eviction can't blank a visible tile
+        if photo is not None:
+            return [self.canvas.create_image(0, top, image=photo, anchor="nw")], key, photo
+        ids = [self.canvas.create_rectangle(0, top, self._view_w - 1, top + height, fill=PLACEHOLDER_FILL, outline="white")]
+        if height >= 14:
+            ids.append(self.canvas.create_text(4, top + 2, text=os.path.basename(path), anchor="nw", fill="#606060"))
+        return ids, key, None
+
+    def _collect_tiles(self):  # PhotoImages must be created on the Tk thread
+        self._poll_job = None
+        landed = set()
+        while True:
+            try:
+                key, img = self.renderer.results.get_nowait()
+            except queue.Empty:
+                break
+            self.tiles.put(key, ImageTk.PhotoImage(img), img.width * img.height * 4)
+            landed.add(key)
+        for sig, (ids, key, _) in list(self._shown.items()):
+            if key in landed:
+                self.canvas.delete(*ids)
+                self._shown[sig] = self._draw_tile(sig, key)
+        if self.renderer.busy() or not self.renderer.results.empty():
+            self._poll_job = self.window.after(30, self._collect_tiles)
+
+    def _on_click(self, event):  # select the clicked image in the main list
+        if not self._tops: return
+        idx = bisect.bisect_right(self._tops, self.canvas.canvasy(event.y)) - 1
+        if 0 <= idx < len(self._layout): self.app.select_index(idx)
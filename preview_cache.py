@@ -0,0 +1,86 @@
+from collections import OrderedDict  # LRU order
+import logging  # event levels
+import queue  # finished renders handed back to the Tk thread
+import threading  # prefetch worker
+from instrumentation import get_logger, log_event  # structured diagnostics
+
+log = get_logger("preview")
+
+
+class PreviewCache:  # bounded LRU of rendered previews; keys are tuples whose first item is the image path
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries = OrderedDict()  # key -> (value, cost), oldest first
+        self._keys_by_path = {}  # path -> set of keys, for per-image invalidation
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):  # membership test that doesn't touch LRU order
+        return key in self._entries
+
+    def get(self, key):  # value or None; a hit becomes most recently used
+        entry = self._entries.get(key)
+        if entry is None: return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key, value, cost):  # cost in bytes; entries larger than the whole budget are not kept
+        self._drop(key)
+        if cost > self.max_bytes: return
+        self._entries[key] = (value, cost)
+        self._keys_by_path.setdefault(key[0], set()).add(key)
+        self.total_bytes += cost
+        while self.total_bytes > self.max_bytes:
+            self._drop(next(iter(self._entries)))  # evict least recently used
+
+    def discard_path(self, path):  # forget every rendering of one image (rotation, deletion, ...)
+        for key in list(self._keys_by_path.get(path, ())):
+            self._drop(key)
+
+    def clear(self):
+        self._entries.clear(); self._keys_by_path.clear(); self.total_bytes = 0
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None: return
+        self.total_bytes -= entry[1]
+        keys = self._keys_by_path.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys: del self._keys_by_path[key[0]]
+
+
+class PreviewPrefetcher:  # renders upcoming previews on a daemon thread; Tk objects are built by the caller
+    def __init__(self, render):  # render(*args) -> PIL image, called off the Tk thread
+        self._render = render
+        self._plan = []  # (key, args) still to render, most urgent first; replaced on every navigation
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._working = False
+        self.results = queue.Queue()  # (key, PIL image) for the Tk thread to collect
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def schedule(self, plan):  # drop whatever is left of the old plan
+        with self._lock:
+            self._plan = list(plan)
+            if self._plan: self._wakeup.set()
+
+    def busy(self):
+        with self._lock:
+            return self._working or bool(self._plan)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            with self._lock:
+                if not self._plan:
+                    self._wakeup.clear(); continue
+                key, args = self._plan.pop(0); self._working = True
+            try:
+                self.results.put((key, self._render(*args)))
+            except Exception as e:  # the on-demand path reports errors; prefetch just skips
+                log_event(log, logging.DEBUG, "prefetch_failed", path=key[0], error=e)
+            finally:
+                with self._lock: self._working = False
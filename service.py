@@ -0,0 +1,376 @@
+import argparse  # command line parsing
+import io  # upload sniffing
+import json  # request / response bodies
+import logging  # event levels
+import os  # filesystem helpers
+import queue  # pending job ids
+import re  # upload id validation
+import shutil  # finished job cleanup
+import sys  # exit codes
+import tempfile  # default work directory
+import threading  # job workers, state lock
+import time  # queue / run latency
+import uuid  # job and upload ids
+from collections import deque  # recent latency samples
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer  # stdlib only: nothing to install for a local service
+from urllib.parse import urlsplit, parse_qs  # routes and ?part=
+from PIL import Image  # upload sniffing
+from cli import parse_job, run_job  # same job format and pipeline as `cli.py batch`
+from stitch_engine import default_workers, FORMAT_EXTENSIONS
+from stream_encoders import ENCODER_PRESETS  # accepted job presets
+from memory_budget import STITCH_MEMORY_BUDGET_BYTES  # default budget, split across job workers
+from instrumentation import configure_logging, get_logger, log_event  # structured diagnostics
+
+log = get_logger("service")
+
+MAX_UPLOAD_BYTES = 200 * 1024 * 1024  # per uploaded image
+MAX_JSON_BYTES = 1024 * 1024  # job descriptions
+UPLOAD_FORMATS = {"JPEG": ".jpg", "PNG": ".png"}  # what the stitcher imports
+UPLOAD_MAX_AGE_SECONDS = 24 * 3600  # older uploads are removed when new ones arrive
+LATENCY_SAMPLES = 1000  # recent jobs the latency percentiles are computed over
+CONTENT_TYPES = {"JPEG": "image/jpeg", "PNG": "image/png", "WEBP": "image/webp", "WEBP_LOSSLESS": "image/webp"}
+
+
+class QueueFull(Exception):  # more jobs waiting than max_queue; the client should retry later
+    pass
+
+
+class JobRejected(ValueError):  # the job description can't be run (bad field, unknown upload, path outside the roots)
+    pass
+
+
+class StitchService:  # bounded FIFO of stitch jobs run by a fixed set of worker threads
+    # Each job is a cli.py batch job; its output goes to its own directory under work_dir, and only `keep` finished
+    # jobs are retained. The memory budget is split across the job workers, and a job may ask for less, never more
+    def __init__(self, work_dir, workers=1, memory_budget=STITCH_MEMORY_BUDGET_BYTES, max_queue=64, keep=100,
+                 render_workers=None, roots=()):
+        self.work_dir = work_dir
+        self.workers = max(1, workers)
+        self.job_memory = memory_budget // self.workers if memory_budget else 0  # 0: no limit, as --memory-mb 0
+        self.render_workers = render_workers or max(1, default_workers() // self.workers)  # per job, so workers don't oversubscribe
+        self.max_queue = max_queue; self.keep = keep
+        self.roots = [os.path.realpath(root) for root in roots]  # server-side paths must be under one of these
+        self.upload_dir = os.path.join(work_dir, "uploads")
+        os.makedirs(self.upload_dir, exist_ok=True)
+        self._jobs = {}  # id -> record dict, in submission order
+        self._pending = queue.Queue()
+        self._lock = threading.Lock()
+        self._waits = deque(maxlen=LATENCY_SAMPLES); self._runs = deque(maxlen=LATENCY_SAMPLES)  # seconds
+        self._counts = {"submitted": 0, "ok": 0, "error": 0, "cancelled": 0, "queue_full": 0}
+        self._running = 0
+        self._threads = [threading.Thread(target=self._worker, name=f"stitch-job-{i}", daemon=True) for i in range(self.workers)]
+        for thread in self._threads: thread.start()
+
+    # --- uploads ---
+    def add_upload(self, data):  # raw image bytes -> upload id usable as {"upload": id} in a job
+        try:
+            with Image.open(io.BytesIO(data)) as img:
+                fmt = img.format
+        except Exception:
+            raise JobRejected("upload is not a readable image")
+        if fmt not in UPLOAD_FORMATS: raise JobRejected(f"{fmt} uploads are not supported (JPEG / PNG only)")
+        self._expire_uploads()
+        upload_id = uuid.uuid4().hex
+        with open(os.path.join(self.upload_dir, upload_id + UPLOAD_FORMATS[fmt]), "wb") as f:
+            f.write(data)
+        log_event(log, logging.DEBUG, "upload", id=upload_id, format=fmt, bytes=len(data))
+        return upload_id
+
+    def _upload_path(self, upload_id):
+        if re.fullmatch(r"[0-9a-f]{32}", upload_id):
+            for ext in UPLOAD_FORMATS.values():
+                path = os.path.join(self.upload_dir, upload_id + ext)
+                if os.path.exists(path): return path
+        raise JobRejected(f"unknown upload: {upload_id}")
+
+    def _expire_uploads(self):  # old uploads go, unless a queued / running job still reads them
+        cutoff = time.time() - UPLOAD_MAX_AGE_SECONDS
+        with self._lock:
+            pinned = {os.path.abspath(path) for r in self._jobs.values() if r["status"] in ("queued", "running")
+                      for path, _ in r["job"]["images"]}
+        for entry in os.scandir(self.upload_dir):
+            try:
+                if entry.stat().st_mtime < cutoff and os.path.abspath(entry.path) not in pinned: os.remove(entry.path)
+            except OSError:
+                pass
+
+    def _server_path(self, path):
+        real = os.path.realpath(path)
+        if not os.path.isabs(path) or not any(os.path.commonpath([real, root]) == root for root in self.roots):
+            raise JobRejected(f"path not under an allowed root: {path}" if self.roots else "server-side paths are disabled (start with --root)")
+        return real
+
+    # --- jobs ---
+    def submit(self, data):  # job description (cli.py batch format; images may be {"upload": id}) -> status record
+        if not isinstance(data, dict) or not isinstance(data.get("images"), list) or not data["images"]:
+            raise JobRejected('expected {"images": [...], ...}')
+        images = []
+        for entry in data["images"]:
+            if isinstance(entry, str): entry = {"path": entry}
+            elif isinstance(entry, dict): entry = dict(entry)
+            else: raise JobRejected(f"bad image entry: {entry!r}")
+            source = "upload" if "upload" in entry else "path" if "path" in entry else None
+            if source is None: raise JobRejected(f"image entry needs a path or an upload: {entry!r}")
+            if not isinstance(entry[source], str): raise JobRejected(f"{source} must be a string: {entry!r}")
+            entry["path"] = self._upload_path(entry.pop("upload")) if source == "upload" else self._server_path(entry["path"])
+            images.append(entry)
+        fmt = (data.get("format") or "JPEG").upper()
+        if fmt not in FORMAT_EXTENSIONS: raise JobRejected(f"unknown format: {fmt}")
+        job_id = uuid.uuid4().hex[:12]
+        job_dir = os.path.join(self.work_dir, job_id)
+        described = {k: v for k, v in data.items() if k not in ("output", "trace", "workers")}  # outputs stay inside job_dir
+        try:
+            job = parse_job(dict(described, images=images, format=fmt, output=f"stitch{FORMAT_EXTENSIONS[fmt]}"), job_dir)
+            job["workers"] = max(1, min(int(data.get("workers", self.render_workers)), self.render_workers))
+        except (TypeError, ValueError) as e:
+            raise JobRejected(f"bad job field: {e}")
+        if job["width"] <= 0: raise JobRejected("width must be a positive integer")
+        if job["preset"] not in ENCODER_PRESETS: raise JobRejected(f"unknown preset: {job['preset']!r} ({', '.join(ENCODER_PRESETS)})")
+        job["name"] = data.get("name") or job_id
+        if self.job_memory:  # per-job limit: the job's share of the service budget
+            job["memory_budget"] = min(job["memory_budget"] or self.job_memory, self.job_memory)
+        else:
+            job["memory_budget"] = job["memory_budget"] or 0
+        job["enforce_budget"] = True  # a job that can't fit its share fails instead of crowding the other workers
+        with self._lock:
+            if sum(1 for r in self._jobs.values() if r["status"] == "queued") >= self.max_queue:
+                self._counts["queue_full"] += 1
+                raise QueueFull(f"{self.max_queue} jobs already queued")
+            record = {"id": job_id, "name": job["name"], "status": "queued", "submitted": time.time(), "started": None,
+                      "finished": None, "dir": job_dir, "job": job, "summary": None}
+            self._jobs[job_id] = record; self._counts["submitted"] += 1
+            os.makedirs(job_dir)
+            self._pending.put(job_id)
+        log_event(log, logging.INFO, "job_queued", id=job_id, images=len(images), width=job["width"], format=fmt)
+        return self.status(job_id)
+
+    def cancel(self, job_id):  # only queued jobs; True if it was still waiting
+        with self._lock:
+            record = self._jobs.get(job_id)
+            if record is None or record["status"] != "queued": return False
+            record.update(status="cancelled", finished=time.time()); self._counts["cancelled"] += 1
+        return True
+
+    def status(self, job_id):  # public view of one job, or None
+        with self._lock:
+            record = self._jobs.get(job_id)
+            if record is None: return None
+            view = {k: record[k] for k in ("id", "name", "status", "submitted", "started", "finished")}
+            if record["status"] == "queued":
+                view["position"] = sum(1 for r in self._jobs.values() if r["status"] == "queued" and r["submitted"] <= record["submitted"])
+            summary = record["summary"]
+        if summary is not None:
+            view.update({k: summary[k] for k in ("stitched", "height", "bytes", "seconds", "breakdown", "error", "missing") if k in summary})
+            if summary["status"] == "ok": view["results"] = [f"/jobs/{job_id}/result?part={i}" for i in range(len(summary["parts"]))]
+        return view
+
+    def jobs(self):
+        with self._lock:
+            ids = list(self._jobs)
+        return [self.status(job_id) for job_id in ids]
+
+    def result_path(self, job_id, part=0):  # (path, format) of a finished part; KeyError if unknown, LookupError if not ready
+        with self._lock:
+            record = self._jobs[job_id]
+            summary = record["summary"]
+        if summary is None or summary["status"] != "ok": raise LookupError(record["status"])
+        if part < 0: raise IndexError(part)  # not counted from the end
+        return summary["parts"][part], record["job"]["format"]
+
+    def metrics(self):  # queue depth, throughput and queue-wait / run latency over recent jobs
+        with self._lock:
+            waits = sorted(self._waits); runs = sorted(self._runs)
+            counts = dict(self._counts); running = self._running
+            queued = sum(1 for r in self._jobs.values() if r["status"] == "queued")
+        return {"queue_depth": queued, "running": running, "workers": self.workers, "max_queue": self.max_queue,
+                "render_workers_per_job": self.render_workers, "job_memory_mb": self.job_memory // (1024 * 1024),
+                "jobs": counts, "queue_seconds": _latency(waits), "run_seconds": _latency(runs)}
+
+    def shutdown(self, wait=True):  # running jobs finish; queued ones are cancelled
+        with self._lock:  # before the sentinels, which queue up behind every pending job id
+            for record in self._jobs.values():
+                if record["status"] == "queued":
+                    record.update(status="cancelled", finished=time.time()); self._counts["cancelled"] += 1
+        for _ in self._threads: self._pending.put(None)
+        if wait:
+            for thread in self._threads: thread.join()
+
+    def _worker(self):
+        while True:
+            job_id = self._pending.get()
+            if job_id is None: return
+            with self._lock:
+                record = self._jobs.get(job_id)
+                if record is None or record["status"] != "queued": continue  # cancelled while waiting
+                record.update(status="running", started=time.time()); self._running += 1
+                self._waits.append(record["started"] - record["submitted"])
+            summary = run_job(record["job"])  # never raises; errors land in the summary
+            with self._lock:
+                record.update(status=summary["status"], finished=time.time(), summary=summary); self._running -= 1
+                self._runs.append(record["finished"] - record["started"]); self._counts[summary["status"]] += 1
+            log_event(log, logging.INFO if summary["status"] == "ok" else logging.WARNING, "job_done", id=job_id,
+                      status=summary["status"], seconds=summary["seconds"], error=summary.get("error"))
+            self._expire()
+
+    def _expire(self):  # drop the oldest finished jobs beyond `keep`, outputs included
+        with self._lock:
+            done = [r for r in self._jobs.values() if r["finished"] is not None]
+            expired = done[:max(0, len(done) - self.keep)]
+            for record in expired: del self._jobs[record["id"]]
+        for record in expired:
+            shutil.rmtree(record["dir"], ignore_errors=True)
+
+
+def _latency(samples):  # sorted seconds -> summary
+    if not samples: return {"count": 0}
+    pick = lambda q: round(samples[min(len(samples) - 1, int(q * len(samples)))], 3)
+    return {"count": len(samples), "mean": round(sum(samples) / len(samples), 3), "p50": pick(0.5), "p95": pick(0.95),
+            "max": round(samples[-1], 3)}
+
+
+class ServiceHandler(BaseHTTPRequestHandler):  # JSON API over StitchService; self.server.service is the instance
+    # POST /uploads            raw JPEG / PNG body -> {"upload": id}
+    # POST /jobs               cli.py batch job JSON (images: paths under --root, or {"upload": id}) -> 202 + status
+    # GET  /jobs[/<id>]        status; GET /jobs/<id>/result?part=N -> the output file; DELETE /jobs/<id> cancels a queued job
+    # GET  /metrics, /health
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, fmt, *args):  # access log through the app's logging tree
+        log_event(log, logging.DEBUG, "http", client=self.client_address[0], request=fmt % args)
+
+    def _send_json(self, status, body):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers(); self.wfile.write(data)
+
+    def _error(self, status, message): self._send_json(status, {"error": message})
+
+    def _body(self, limit):
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = -1
+        if length < 0:  # how much to read is unknown, and rfile.read(-1) would wait for the client to close
+            self.close_connection = True
+            raise JobRejected("bad Content-Length")
+        if length > limit:
+            self.close_connection = True  # the body is not read
+            raise JobRejected(f"body larger than {limit} bytes")
+        return self.rfile.read(length)
+
+    def _route(self):
+        url = urlsplit(self.path)
+        return [p for p in url.path.split("/") if p], parse_qs(url.query)
+
+    def do_GET(self):
+        service = self.server.service
+        parts, query = self._route()
+        if parts == ["health"]: return self._send_json(200, {"ok": True})
+        if parts == ["metrics"]: return self._send_json(200, service.metrics())
+        if parts == ["jobs"]: return self._send_json(200, {"jobs": service.jobs()})
+        if len(parts) == 2 and parts[0] == "jobs":
+            view = service.status(parts[1])
+            return self._send_json(200, view) if view else self._error(404, "unknown job")
+        if len(parts) == 3 and parts[0] == "jobs" and parts[2] == "result":
+            try:
+                path, fmt = service.result_path(parts[1], int(query.get("part", ["0"])[0]))
+            except KeyError:
+                return self._error(404, "unknown job")
+            except (IndexError, ValueError):
+                return self._error(404, "unknown part")
+            except LookupError as e:
+                return self._error(409, f"job is {e.args[0]}")
+            return self._send_file(path, CONTENT_TYPES.get(fmt, "application/octet-stream"))
+        self._error(404, "not found")
+
+    def _send_file(self, path, content_type):
+        try:
+            f = open(path, "rb")
+        except OSError:
+            return self._error(410, "result expired")
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(size))
+            self.send_header("Content-Disposition", f'attachment; filename="{os.path.basename(path)}"')
+            self.end_headers()
+            shutil.copyfileobj(f, self.wfile, 1024 * 1024)
+
+    def do_POST(self):
+        service = self.server.service
+        parts, _ = self._route()
+        try:
+            if parts == ["uploads"]:
+                return self._send_json(201, {"upload": service.add_upload(self._body(MAX_UPLOAD_BYTES))})
+            if parts == ["jobs"]:
+                body = self._body(MAX_JSON_BYTES)
+                try:
+                    data = json.loads(body or b"null")
+                except ValueError:
+                    return self._error(400, "body is not JSON")
+                view = service.submit(data)
+                return self._send_json(202, view)
+        except JobRejected as e:
+            return self._error(400, str(e))
+        except QueueFull as e:
+            return self._error(503, str(e))
+        self._error(404, "not found")
+
+    def do_DELETE(self):
+        parts, _ = self._route()
+        if len(parts) == 2 and parts[0] == "jobs":
+            service = self.server.service
+            if service.cancel(parts[1]): return self._send_json(200, service.status(parts[1]))
+            if service.status(parts[1]) is None: return self._error(404, "unknown job")
+            return self._error(409, "job is not queued")
+        self._error(404, "not found")
+
+
+def make_server(service, host="127.0.0.1", port=8765):  # port 0 picks a free one (server.server_address)
+    server = ThreadingHTTPServer((host, port), ServiceHandler)
+    server.daemon_threads = True
+    server.service = service
+    return server
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Local HTTP stitching service (same pipeline as cli.py)")
+    parser.add_argument("--host", default="127.0.0.1", help="bind address (default: localhost only)")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=1, help="jobs stitched at once (default 1)")
+    parser.add_argument("--render-workers", type=int, help="render processes per job (default: CPU count / workers)")
+    parser.add_argument("--memory-mb", type=int, default=STITCH_MEMORY_BUDGET_BYTES // (1024 * 1024),
+                        help="peak-memory budget split across the job workers; a job's memory_mb may only lower its share")
+    parser.add_argument("--max-queue", type=int, default=64, help="queued jobs before new ones get 503 (default 64)")
+    parser.add_argument("--keep", type=int, default=100, help="finished jobs (and outputs) kept (default 100)")
+    parser.add_argument("--root", action="append", default=[], help="allow jobs to read server-side images under this folder")
+    parser.add_argument("--work-dir", help="job outputs and uploads (default: a temporary folder removed on exit)")
+    parser.add_argument("--log-level", help="DEBUG, INFO, WARNING, ... (default: $PHOTO_STITCHER_LOG_LEVEL or INFO)")
+    parser.add_argument("--log-json", action="store_true", help="log one JSON object per line")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    configure_logging(args.log_level, args.log_json)
+    work_dir = os.path.abspath(args.work_dir) if args.work_dir else tempfile.mkdtemp(prefix="photo_stitcher_service_")
+    service = StitchService(work_dir, args.workers, args.memory_mb * 1024 * 1024, args.max_queue, args.keep,
+                            args.render_workers, [os.path.abspath(os.path.expanduser(r)) for r in args.root])
+    server = make_server(service, args.host, args.port)
+    log_event(log, logging.INFO, "listening", url=f"http://{server.server_address[0]}:{server.server_address[1]}",
+              workers=service.workers, work_dir=work_dir)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close(); service.shutdown(wait=False)
+        if not args.work_dir: shutil.rmtree(work_dir, ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':  # python service.py --port 8765
+    sys.exit(main())
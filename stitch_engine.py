@@ -0,0 +1,351 @@
+import logging  # event levels
+import os  # filesystem helpers
+from collections import deque  # in-flight window for the worker pool
+import threading  # multi-part output runs parts side by side
+import time  # per-stage timing
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor  # parallel decode/resize, concurrent parts
+from PIL import Image  # Pillow image utilities
+from stream_encoders import open_stream_writer, streams_output, JPEG_MAX_DIMENSION, WEBP_MAX_DIMENSION  # output encoders
+from memory_budget import STITCH_MEMORY_BUDGET_BYTES, plan_memory  # peak-memory governor
+from overlap import trim_overlaps  # screenshot overlap removal
+from instrumentation import get_logger, log_event  # structured diagnostics
+from strip_cache import strip_key  # resized strips reused across stitches
+from transform_plan import TransformPlan, read_orientation, oriented_size  # EXIF orientation + rotation as one transpose
+from geometry import rotated_size, scaled_height, fit_size  # size arithmetic, shared with the UI models
+
+log = get_logger("stitch")
+
+FORMAT_MAX_HEIGHT = {"JPEG": JPEG_MAX_DIMENSION, "PNG": 2 ** 31 - 1,  # tallest single output per format
+                     "WEBP": WEBP_MAX_DIMENSION, "WEBP_LOSSLESS": WEBP_MAX_DIMENSION}
+FORMAT_EXTENSIONS = {"JPEG": ".jpg", "PNG": ".png", "WEBP": ".webp", "WEBP_LOSSLESS": ".webp"}
+
+
+class StitchError(Exception):  # a source image failed in a way that aborts the whole stitch
+    def __init__(self, path, error):
+        super().__init__(f"{os.path.basename(path)}: {error}")
+        self.path = path; self.error = error
+
+
+class StitchCancelled(Exception):  # cancel_event was set; partial output has been removed
+    pass
+
+
+class StitchResult:  # summary of a finished stitch
+    def __init__(self, path, width, height, count, nbytes=0, encode_seconds=0.0):
+        self.path = path; self.width = width; self.height = height; self.count = count
+        self.nbytes = nbytes; self.encode_seconds = encode_seconds  # output size, time spent inside the encoder
+
+
+DRAFT_REDUCING_GAP = 2.0  # decode at >= 2x the target so LANCZOS still has detail to filter (as Image.thumbnail)
+
+
+def probe_metadata(path):  # ((w, h) as stored, EXIF orientation) from the file header, without decoding pixels
+    with Image.open(path) as img:
+        return img.size, read_orientation(img)
+
+
+def display_size(size, orientation, rotation):  # stored size -> size as shown and stitched
+    return rotated_size(oriented_size(size, orientation), rotation)
+
+
+def apply_draft(img, orientation, rotation, target_size):  # let the JPEG decoder skip DCT detail we would throw away
+    w, h = display_size(target_size, orientation, rotation)  # axis swaps undo themselves: target in the file's orientation
+    img.draft("RGB", (max(1, int(w * DRAFT_REDUCING_GAP)), max(1, int(h * DRAFT_REDUCING_GAP))))  # no-op for non-JPEG
+
+
+def render_strip(path, rotation, target_w, draft=True, timings=None):  # decode, orient, resize one source to the output width
+    # timings: optional dict, filled with seconds spent per stage
+    t0 = time.perf_counter()
+    with Image.open(path) as src:
+        orientation = read_orientation(src)
+        # header size: the height never depends on the draft scale
+        nh = scaled_height(oriented_size(src.size, orientation), rotation, target_w)
+        if not nh:
+            return None
+        if draft: apply_draft(src, orientation, rotation, (target_w, nh))
+        src.load()
+        if timings is not None: timings["decode"] = time.perf_counter() - t0
+        return TransformPlan(src.size, src.mode, orientation, rotation, (target_w, nh), exact=not draft).execute(src, timings)
+
+
+def _render_timed(path, rotation, target_w, draft):  # pool entry point: timings travel back with the strip
+    timings = {}
+    return render_strip(path, rotation, target_w, draft, timings), timings
+
+
+def _cached_strip(strip_cache, key, trace, path):  # strip from an earlier stitch, or None
+    if strip_cache is None or key is None: return None
+    started = time.perf_counter()
+    strip = strip_cache.get(key)
+    if strip is not None and trace is not None: trace.record("cache", time.perf_counter() - started, path)
+    return strip
+
+
+def _render_cached(path, rotation, target_w, draft, trace=None, strip_cache=None):  # serial render through the strip cache
+    key = strip_key(path, rotation, target_w, draft) if strip_cache is not None else None
+    strip = _cached_strip(strip_cache, key, trace, path)
+    if strip is not None: return strip
+    timings = {}
+    strip = render_strip(path, rotation, target_w, draft, timings)
+    _record_render(trace, path, timings)
+    if strip_cache is not None: strip_cache.put(key, strip)
+    return strip
+
+
+def _record_render(trace, path, timings):
+    if trace is None or not timings: return
+    try:
+        nbytes = os.path.getsize(path)  # source bytes, attributed to decode
+    except OSError:
+        nbytes = 0
+    trace.record_many(timings, path, {"decode": nbytes})
+
+
+def render_preview(path, rotation, box_size, draft=True):  # fit one source inside box_size, keeping aspect ratio
+    with Image.open(path) as src:
+        orientation = read_orientation(src)
+        shown, _ = fit_size(oriented_size(src.size, orientation), rotation, box_size)  # header size; decoding happens below
+        if draft: apply_draft(src, orientation, rotation, shown)  # reduced-resolution JPEG decode
+        return TransformPlan(src.size, src.mode, orientation, rotation, shown, exact=not draft).execute(src)
+
+
+def render_thumbnail(path, max_side):  # draft-decoded thumbnail in the file's own orientation, for the persistent store
+    with Image.open(path) as src:
+        src.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+        return src.convert("RGB")
+
+
+def default_workers():  # one render process per core
+    return os.cpu_count() or 1
+
+
+def iter_rendered(paths, rotations, target_w, workers=1, draft=True, trace=None, strip_cache=None):
+    # yields (path, strip, error) in input order; strip_cache (strip_cache.StripCache) skips sources rendered before
+    if workers <= 1 or len(paths) < 2:
+        for i_path in paths:
+            try:
+                strip = _render_cached(i_path, rotations.get(i_path, 0), target_w, draft, trace, strip_cache)
+            except Exception as e:
+                yield i_path, None, e; continue
+            yield i_path, strip, None
+        return
+    # Bounded window keeps at most ~2 strips per worker in flight, so memory stays flat
+    pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        window = deque(); queued = iter(paths)
+        def submit_next():  # cache hits take a window slot too, so output order is kept
+            for i_path in queued:
+                rotation = rotations.get(i_path, 0)
+                key = strip_key(i_path, rotation, target_w, draft) if strip_cache is not None else None
+                strip = _cached_strip(strip_cache, key, trace, i_path)
+                if strip is not None:
+                    future = Future(); future.set_result((strip, None))
+                else:
+                    future = pool.submit(_render_timed, i_path, rotation, target_w, draft)
+                window.append((i_path, key, future))
+                return
+        for _ in range(workers * 2): submit_next()
+        while window:
+            i_path, key, future = window.popleft()
+            submit_next()
+            try:
+                started = time.perf_counter()
+                strip, timings = future.result()
+            except Exception as e:
+                yield i_path, None, e; continue
+            if timings is not None:  # freshly rendered, not a cache hit
+                if trace is not None: trace.record("wait", time.perf_counter() - started, i_path)  # stalled on workers
+                _record_render(trace, i_path, timings)
+                if strip_cache is not None: strip_cache.put(key, strip)
+            yield i_path, strip, None
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)  # abort path: drop queued work
+
+
+def stitch_images(paths, rotations, target_w, out_path, out_fmt="JPEG", quality=95, on_missing=None, workers=1,
+                  progress=None, cancel_event=None, draft=True, preset="balanced", subsampling=None, height_hint=None,
+                  trace=None, strip_cache=None, scratch_dir=None, trim_overlap=False):
+    # Streams one image at a time into the encoder: peak memory ~ the largest single source (per worker)
+    # progress(done, total, bytes_written) is called after every source; cancel_event is checked between sources
+    # draft=False forces full-resolution JPEG decoding for pixel-exact output
+    # preset / subsampling pick encoder settings (see open_stream_writer); height_hint pre-sizes canvas encoders
+    # trace: optional instrumentation.StitchTrace collecting per-image, per-stage timings
+    # strip_cache: optional strip_cache.StripCache; a re-stitch then only assembles and encodes
+    # scratch_dir: canvas encoders assemble in a memory-mapped file there instead of RAM
+    # trim_overlap: crop rows that repeat the previous image's bottom (consecutive screenshots), see overlap.py
+    done = [0]
+    def on_item(nbytes):
+        done[0] += 1
+        if progress: progress(done[0], len(paths), nbytes)
+    cancelled = cancel_event.is_set if cancel_event is not None else None
+    encoder = dict(quality=quality, preset=preset, subsampling=subsampling, height_hint=height_hint, scratch_dir=scratch_dir)
+    rendered = iter_rendered(paths, rotations, target_w, workers, draft, trace, strip_cache)
+    if trim_overlap: rendered = trim_overlaps(rendered, trace)
+    return _write_stream(rendered, target_w, out_path, out_fmt, encoder, on_missing, on_item, cancelled, trace)
+
+
+def _write_stream(rendered, target_w, out_path, out_fmt, encoder, on_missing, on_item, cancelled, trace=None):
+    # rendered yields (path, strip, error); missing files are skipped, any other error aborts
+    count = 0; encode_seconds = 0.0
+    with open(out_path, "wb") as fp:
+        try:
+            writer = open_stream_writer(fp, out_fmt, target_w, **encoder)
+            for i_path, strip, error in rendered:
+                if cancelled and cancelled():
+                    raise StitchCancelled()
+                if isinstance(error, FileNotFoundError):
+                    log_event(log, logging.WARNING, "source_missing", path=i_path)
+                    if on_missing: on_missing(i_path)
+                elif error is not None:
+                    raise StitchError(i_path, error)
+                elif strip is None:
+                    log_event(log, logging.WARNING, "source_empty", path=i_path)
+                else:
+                    started = time.perf_counter(); before = fp.tell()
+                    writer.write_strip(strip); count += 1
+                    seconds = time.perf_counter() - started; encode_seconds += seconds
+                    if trace is not None: trace.record("encode", seconds, i_path, fp.tell() - before)
+                if on_item: on_item(fp.tell())
+            if cancelled and cancelled():
+                raise StitchCancelled()
+            if count:
+                started = time.perf_counter(); before = fp.tell()
+                writer.close()
+                seconds = time.perf_counter() - started; encode_seconds += seconds
+                if trace is not None: trace.record("finish", seconds, out_path, fp.tell() - before)
+            nbytes = fp.tell()
+        except BaseException:
+            rendered.close()
+            fp.close(); _remove_quietly(out_path)  # never leave a truncated file behind
+            raise
+    if not count:
+        _remove_quietly(out_path)
+        return StitchResult(None, target_w, 0, 0)
+    return StitchResult(out_path, target_w, writer.height, count, nbytes, encode_seconds)
+
+
+def source_heights(paths, rotations, target_w, known_sizes=None):  # per-image stitched heights, probing unknown sizes
+    # known_sizes: {path: (w, h)} with EXIF orientation already applied
+    heights = []
+    for path in paths:
+        size = (known_sizes or {}).get(path)
+        if size is None:
+            try:
+                size = oriented_size(*probe_metadata(path))
+            except Exception:
+                size = (0, 0)  # still rendered, so a missing file is reported / a broken one aborts as usual
+        heights.append(scaled_height(size, rotations.get(path, 0), target_w))
+    return heights
+
+
+def plan_parts(heights, max_height, at_boundaries=True):  # split the stitch into parts no taller than max_height
+    # -> parts, each a list of (image index, first row, end row); zero-height images ride along untouched
+    parts = []; current = []; used = 0
+    for idx, h in enumerate(heights):
+        if at_boundaries and used and used + h > max_height:  # start a fresh part at this image boundary
+            parts.append(current); current = []; used = 0
+        if not h:
+            current.append((idx, 0, 0)); continue
+        row = 0
+        while row < h:  # an image taller than the room left is cut across parts
+            take = min(h - row, max_height - used)
+            current.append((idx, row, row + take)); row += take; used += take
+            if used == max_height:
+                parts.append(current); current = []; used = 0
+    if current: parts.append(current)
+    return parts
+
+
+def part_paths(out_path, count):  # out.jpg -> out_part01.jpg, out_part02.jpg, ...
+    if count <= 1: return [out_path]
+    root, ext = os.path.splitext(out_path)
+    digits = max(2, len(str(count)))
+    return [f"{root}_part{i:0{digits}d}{ext}" for i in range(1, count + 1)]
+
+
+def _iter_segments(segments, paths, rotations, target_w, draft, trace=None, strip_cache=None):  # serial render + row crop for one part
+    for idx, row_start, row_end in segments:
+        i_path = paths[idx]
+        try:
+            strip = _render_cached(i_path, rotations.get(i_path, 0), target_w, draft, trace, strip_cache)
+        except Exception as e:
+            yield i_path, None, e; continue
+        if strip is not None:
+            row_end = min(row_end, strip.height)
+            if row_end <= row_start: strip = None
+            elif (row_start, row_end) != (0, strip.height): strip = strip.crop((0, row_start, target_w, row_end))
+        yield i_path, strip, None
+
+
+def stitch_parts(paths, rotations, target_w, out_path, out_fmt="JPEG", quality=95, heights=None, max_height=None,
+                 at_boundaries=True, on_missing=None, workers=1, progress=None, cancel_event=None, draft=True,
+                 preset="balanced", subsampling=None, trace=None, strip_cache=None,
+                 memory_budget=STITCH_MEMORY_BUDGET_BYTES, source_pixels=0, trim_overlap=False, enforce_budget=False):
+    # Like stitch_images, but splits outputs taller than max_height (default: the format's limit) into numbered
+    # parts that are encoded concurrently. Returns a list of StitchResult, one per part.
+    # memory_budget: peak bytes to plan for (None / 0: no limit); render workers, parts side by side and where
+    # canvas encoders assemble are chosen to stay under it. source_pixels: w * h of the largest source, if known
+    # trim_overlap: parts are planned on untrimmed heights (so they can only come out shorter); overlaps are
+    # removed within each part
+    # enforce_budget: refuse (ValueError) instead of running slowly when even the leanest plan exceeds memory_budget.
+    # The check is on the plan's estimate, not an OS limit on the process
+    if heights is None: heights = source_heights(paths, rotations, target_w)
+    limit = FORMAT_MAX_HEIGHT.get(out_fmt, JPEG_MAX_DIMENSION)
+    plan = plan_parts(heights, min(max_height or limit, limit), at_boundaries)
+    part_workers = max(1, min(workers, len(plan))); scratch_dir = None
+    if memory_budget:
+        memory = plan_memory(target_w, [sum(row_end - row_start for _, row_start, row_end in part) for part in plan],
+                             max(heights, default=0), out_fmt, streams_output(out_fmt, preset), workers, memory_budget, source_pixels)
+        log_event(log, logging.WARNING if memory.over_budget else logging.INFO, "memory_plan", parts=len(plan), **memory.as_fields())
+        if memory.over_budget and enforce_budget:
+            raise ValueError(f"estimated peak memory {memory.estimate / 1024 / 1024:.0f} MB exceeds the "
+                             f"{memory_budget / 1024 / 1024:.0f} MB budget; lower the width or max_height")
+        workers = memory.workers; part_workers = memory.part_workers
+        if memory.strategy == "mmap": scratch_dir = os.path.dirname(os.path.abspath(out_path))  # same disk as the output
+    if len(plan) <= 1:
+        return [stitch_images(paths, rotations, target_w, out_path, out_fmt, quality, on_missing, workers,
+                              progress, cancel_event, draft, preset, subsampling, sum(heights), trace, strip_cache, scratch_dir,
+                              trim_overlap)]
+
+    out_paths = part_paths(out_path, len(plan))
+    total = sum(len(part) for part in plan)
+    lock = threading.Lock(); stop = threading.Event()
+    state = {"done": 0, "bytes": [0] * len(plan), "missing": set()}
+    def cancelled():
+        return stop.is_set() or (cancel_event is not None and cancel_event.is_set())
+    def run_part(i):
+        def on_item(nbytes):
+            with lock:
+                state["done"] += 1; state["bytes"][i] = nbytes
+                done, written = state["done"], sum(state["bytes"])
+            if progress: progress(done, total, written)
+        def part_missing(i_path):  # an image cut across parts is reported once
+            with lock:
+                first = i_path not in state["missing"]; state["missing"].add(i_path)
+            if first and on_missing: on_missing(i_path)
+        try:
+            encoder = dict(quality=quality, preset=preset, subsampling=subsampling,
+                           height_hint=sum(row_end - row_start for _, row_start, row_end in plan[i]), scratch_dir=scratch_dir)
+            rendered = _iter_segments(plan[i], paths, rotations, target_w, draft, trace, strip_cache)
+            if trim_overlap: rendered = trim_overlaps(rendered, trace)
+            return _write_stream(rendered, target_w, out_paths[i], out_fmt, encoder, part_missing, on_item, cancelled, trace)
+        except BaseException:
+            stop.set()  # one failed part stops the others
+            raise
+
+    # Pillow releases the GIL while decoding, resizing and encoding, so threads run the parts in parallel
+    with ThreadPoolExecutor(max_workers=part_workers) as pool:
+        futures = [pool.submit(run_part, i) for i in range(len(plan))]
+    errors = [f.exception() for f in futures if f.exception() is not None]
+    if errors:
+        for path in out_paths: _remove_quietly(path)
+        if cancel_event is not None and cancel_event.is_set(): raise StitchCancelled()
+        raise next((e for e in errors if not isinstance(e, StitchCancelled)), errors[0])
+    return [r for r in (f.result() for f in futures) if r.count]
+
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
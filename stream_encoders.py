@@ -0,0 +1,266 @@
+import io  # in-memory buffers for per-strip encodes
+import mmap  # scratch canvas backed by a file
+import struct  # PNG/JPEG header fields
+import tempfile  # unnamed scratch file for the mapped canvas
+import zlib  # PNG deflate stream
+from PIL import Image  # Pillow does the per-strip filtering / DCT work
+
+ENCODER_PRESETS = ("fast", "balanced", "smallest")  # speed / size trade-off, see open_stream_writer
+PNG_COMPRESS_LEVEL = {"fast": 1, "balanced": 6, "smallest": 9}
+WEBP_METHOD = {"fast": 0, "balanced": 4, "smallest": 6}  # libwebp effort, 0-6
+WEBP_LOSSLESS_EFFORT = {"fast": 0, "balanced": 70, "smallest": 90}  # "quality" means effort in lossless mode
+
+JPEG_MAX_DIMENSION = 65500  # libjpeg refuses anything larger
+WEBP_MAX_DIMENSION = 16383  # libwebp limit per side
+JPEG_CHUNK_ROWS = 128  # 8 MCU rows at 4:2:0 (16 at 4:4:4), keeps RST numbering aligned per chunk
+
+
+def _png_chunk(tag, data):  # length + tag + data + crc
+    return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xffffffff)
+
+
+def _png_idat_payload(png_bytes):  # concatenated IDAT data of an encoded PNG
+    pos = 8; parts = []
+    while pos < len(png_bytes):
+        length, tag = struct.unpack(">I4s", png_bytes[pos:pos + 8])
+        if tag == b"IDAT": parts.append(png_bytes[pos + 8:pos + 8 + length])
+        pos += 12 + length
+    return b"".join(parts)
+
+
+class PngStreamWriter:  # incremental RGB PNG encoder: strips in, IDAT chunks out
+    # The zlib wrapper is written by hand around a raw deflate stream that close() ends with a sync flush, an empty
+    # final block and the Adler-32 in a separate IDAT chunk: resume= (a checkpoint()) cuts that tail off and continues
+    def __init__(self, fp, width, compress_level=9, resume=None):
+        self.fp = fp; self.width = width; self.height = 0
+        self._row_bytes = width * 3 + 1  # filter byte + RGB
+        self._prev_row = None  # last row of the previous strip, needed by Up/Avg/Paeth filters
+        # Filtered scanlines compress best with Z_FILTERED and the largest memLevel, as Pillow's own PNG encoder sets
+        # them; zlib's defaults leave the stream ~6% larger than img.save()
+        self._z = zlib.compressobj(compress_level, zlib.DEFLATED, -15, 9, zlib.Z_FILTERED)
+        self._adler = 1  # Adler-32 of the filtered rows so far
+        self._pending = []; self._pending_len = 0  # compressed bytes waiting for an IDAT chunk
+        self._checkpoint = None; self._flushed_height = 0  # rows already behind a sync flush
+        if resume is not None:
+            self._ihdr_pos = resume["ihdr_pos"]; self.height = self._flushed_height = resume["height"]
+            self._adler = resume["adler"]; self._prev_row = resume["prev_row"]
+            fp.seek(resume["offset"]); fp.truncate()
+            return
+        self._ihdr_pos = fp.tell() + 12  # IHDR tag, after signature + length
+        fp.write(b"\x89PNG\r\n\x1a\n")
+        fp.write(_png_chunk(b"IHDR", self._ihdr(0)))  # height patched on close
+        self._emit(b"\x78\x9c")  # zlib header: deflate, 32K window
+
+    def _ihdr(self, height):
+        return struct.pack(">IIBBBBB", self.width, height, 8, 2, 0, 0, 0)
+
+    def _filtered_rows(self, img):  # let Pillow pick per-row filters, then unwrap its stored stream
+        if self._prev_row is not None:  # prepend the previous row so the first filtered row references it
+            src = Image.new("RGB", (self.width, img.height + 1))
+            src.paste(Image.frombytes("RGB", (self.width, 1), self._prev_row), (0, 0))
+            src.paste(img, (0, 1))
+        else:
+            src = img
+        buf = io.BytesIO(); src.save(buf, "PNG", compress_level=0)
+        raw = zlib.decompress(_png_idat_payload(buf.getvalue()))
+        return raw[self._row_bytes:] if src is not img else raw
+
+    def _emit(self, data, force=False):
+        if data: self._pending.append(data); self._pending_len += len(data)
+        if self._pending_len and (force or self._pending_len >= 1 << 18):
+            self.fp.write(_png_chunk(b"IDAT", b"".join(self._pending)))
+            self._pending = []; self._pending_len = 0
+
+    def write_strip(self, img):  # img: RGB, width == self.width
+        if img.mode != "RGB": img = img.convert("RGB")
+        rows = self._filtered_rows(img)
+        self._adler = zlib.adler32(rows, self._adler)
+        self._emit(self._z.compress(rows))
+        self._prev_row = img.crop((0, img.height - 1, self.width, img.height)).tobytes()
+        self.height += img.height
+
+    def close(self):
+        if not self.height: raise ValueError("cannot write empty image as PNG")
+        if self.height != self._flushed_height:  # a resume closed with no new rows rewrites the identical tail
+            self._emit(self._z.flush(zlib.Z_SYNC_FLUSH), force=True)  # byte-aligned: a later resume starts a fresh deflate block here
+        self._checkpoint = {"offset": self.fp.tell(), "ihdr_pos": self._ihdr_pos, "height": self.height,
+                            "adler": self._adler, "prev_row": self._prev_row}
+        self.fp.write(_png_chunk(b"IDAT", b"\x03\x00" + struct.pack(">I", self._adler)))  # empty final block + Adler-32
+        self.fp.write(_png_chunk(b"IEND", b""))
+        end = self.fp.tell()
+        self.fp.seek(self._ihdr_pos); self.fp.write(_png_chunk(b"IHDR", self._ihdr(self.height))[4:])
+        self.fp.seek(end)
+
+    def checkpoint(self):  # after close(): what resume= needs to reopen the file and keep appending rows
+        return dict(self._checkpoint)
+
+
+class JpegStreamWriter:  # incremental baseline JPEG: fixed-height chunks spliced at restart markers
+    # resume= (a checkpoint()) drops the short last chunk and EOI and re-encodes those rows with the next ones
+    def __init__(self, fp, width, quality=95, resume=None, **save_options):
+        self.fp = fp; self.width = width; self.height = 0
+        self.quality = quality; self.save_options = save_options
+        self._pending = None  # rows waiting for a full chunk
+        self._sof_pos = None  # absolute offset of the SOF height field
+        self._checkpoint = None
+        if resume is not None:
+            self._sof_pos = resume["sof_pos"]; self.height = resume["height"]
+            if resume["pending"] is not None:
+                self._pending = Image.frombytes("RGB", (width, resume["pending_height"]), resume["pending"])
+            fp.seek(resume["offset"]); fp.truncate()
+
+    def _encode_chunk(self, img):
+        buf = io.BytesIO()
+        # One restart per MCU row: each chunk's entropy data then starts like a restart interval
+        img.save(buf, "JPEG", quality=self.quality, restart_marker_rows=1, **self.save_options)
+        data = buf.getvalue(); pos = 2; sof = None; has_dri = False
+        while True:  # walk marker segments up to and including SOS
+            marker = data[pos + 1]; length = struct.unpack(">H", data[pos + 2:pos + 4])[0]
+            if marker in (0xC0, 0xC1): sof = pos + 5
+            has_dri = has_dri or marker == 0xDD
+            pos += 2 + length
+            if marker == 0xDA: break
+        if not has_dri:  # older Pillow silently ignores restart_marker_rows
+            raise RuntimeError("streaming JPEG output needs a Pillow version with restart marker support")
+        if self._sof_pos is None:
+            self._sof_pos = self.fp.tell() + sof
+            self.fp.write(data[:pos])
+        else:
+            self.fp.write(b"\xff\xd7")  # chunks hold 8k restart intervals, so the joining marker is always RST7
+        self.fp.write(data[pos:-2])  # entropy data without EOI
+
+    def write_strip(self, img):  # img: RGB, width == self.width
+        if img.mode != "RGB": img = img.convert("RGB")
+        if self.height + img.height > JPEG_MAX_DIMENSION:
+            raise ValueError(f"Maximum supported image dimension is {JPEG_MAX_DIMENSION} pixels")
+        self.height += img.height
+        y = 0; h = img.height
+        if self._pending is not None:  # top up the carried rows first
+            take = min(JPEG_CHUNK_ROWS - self._pending.height, h)
+            merged = Image.new("RGB", (self.width, self._pending.height + take))
+            merged.paste(self._pending, (0, 0)); merged.paste(img.crop((0, 0, self.width, take)), (0, self._pending.height))
+            self._pending = None; y = take
+            if merged.height < JPEG_CHUNK_ROWS:
+                self._pending = merged; return
+            self._encode_chunk(merged)
+        while h - y >= JPEG_CHUNK_ROWS:
+            self._encode_chunk(img.crop((0, y, self.width, y + JPEG_CHUNK_ROWS))); y += JPEG_CHUNK_ROWS
+        if y < h: self._pending = img.crop((0, y, self.width, h))
+
+    def close(self):
+        if not self.height: raise ValueError("cannot write empty image as JPEG")
+        pending = self._pending
+        self._checkpoint = {"offset": self.fp.tell(), "sof_pos": self._sof_pos, "height": self.height,
+                            "pending_height": pending.height if pending is not None else 0,
+                            "pending": pending.tobytes() if pending is not None else None}
+        if pending is not None:
+            self._encode_chunk(pending); self._pending = None
+        self.fp.write(b"\xff\xd9")
+        end = self.fp.tell()
+        self.fp.seek(self._sof_pos); self.fp.write(struct.pack(">H", self.height))
+        self.fp.seek(end)
+
+    def checkpoint(self):  # after close(): what resume= needs to reopen the file and keep appending rows
+        return dict(self._checkpoint)
+
+
+class CanvasWriter:  # formats/options with no streaming encoder: paste into one canvas, encode on close
+    def __init__(self, fp, width, pil_format, save_options, max_height, height_hint=None, scratch_dir=None):
+        self.fp = fp; self.width = width; self.height = 0
+        self.pil_format = pil_format; self.save_options = save_options; self.max_height = max_height
+        # With a height hint the canvas is allocated once; otherwise strips are kept and pasted on close
+        self._scratch = None  # (file, mmap) when the canvas lives in a scratch file
+        if height_hint and scratch_dir is not None:
+            self._canvas = self._mapped_canvas(height_hint, scratch_dir)
+        else:
+            self._canvas = Image.new("RGB", (width, height_hint), (255, 255, 255)) if height_hint else None
+        self._strips = []
+
+    def _mapped_canvas(self, height, scratch_dir):  # RGBX over a shared file mapping: clean pages can be evicted
+        # Rows are only ever read back up to self.height, all of which were pasted, so the zero fill never shows
+        file = tempfile.TemporaryFile(dir=scratch_dir or None, prefix="photo-stitcher-canvas-")
+        try:
+            file.truncate(self.width * height * 4)
+            mapping = mmap.mmap(file.fileno(), self.width * height * 4)
+        except BaseException:
+            file.close(); raise
+        self._scratch = (file, mapping)
+        canvas = Image.frombuffer("RGBX", (self.width, height), mapping, "raw", "RGBX", 0, 1)
+        canvas.readonly = 0  # frombuffer marks shared buffers read-only; pastes must write through, not copy
+        return canvas
+
+    def _release_scratch(self):
+        if self._scratch is None: return
+        file, mapping = self._scratch; self._scratch = None
+        try:
+            mapping.close()
+        except BufferError:  # an image still exports the buffer; the GC unmaps it with the image
+            pass
+        file.close()
+
+    def write_strip(self, img):
+        if self.height + img.height > self.max_height:
+            raise ValueError(f"Maximum supported image dimension is {self.max_height} pixels")
+        if self._canvas is not None and self.height + img.height > self._canvas.height:  # hint was short
+            self._strips.append(self._canvas.crop((0, 0, self.width, self.height)).convert("RGB")); self._canvas = None
+            self._release_scratch()
+        if self._canvas is not None: self._canvas.paste(img, (0, self.height))
+        else: self._strips.append(img)
+        self.height += img.height
+
+    def close(self):
+        if not self.height: raise ValueError(f"cannot write empty image as {self.pil_format}")
+        canvas = self._canvas
+        if canvas is None:
+            canvas = Image.new("RGB", (self.width, self.height), (255, 255, 255)); y = 0
+            while self._strips:  # release strips as they are pasted
+                strip = self._strips.pop(0); canvas.paste(strip, (0, y)); y += strip.height
+        elif canvas.height != self.height and self._scratch is not None:  # rows are contiguous: a shorter view, no copy
+            canvas = Image.frombuffer("RGBX", (self.width, self.height), self._scratch[1], "raw", "RGBX", 0, 1)
+        elif canvas.height != self.height:
+            canvas = canvas.crop((0, 0, self.width, self.height))
+        self._canvas = None
+        try:
+            canvas.save(self.fp, self.pil_format, **self.save_options)  # JPEG / WebP read RGBX directly, no copy
+        finally:
+            del canvas
+            self._release_scratch()
+
+
+def format_presets(out_fmt):  # the presets that actually differ for out_fmt
+    # A baseline JPEG streamed in chunks has no speed / size knob left: optimized Huffman tables and progressive scans
+    # need the whole image (that is "smallest"), and quality and subsampling are settings of their own. So JPEG "fast"
+    # and "balanced" are one encoder writing the same bytes, offered as "balanced"
+    return ("balanced", "smallest") if out_fmt == "JPEG" else ENCODER_PRESETS
+
+
+def normalize_preset(out_fmt, preset):  # the preset format_presets() lists for the same encoder settings
+    return preset if preset in format_presets(out_fmt) else "balanced"
+
+
+def streams_output(out_fmt, preset="balanced"):  # False when open_stream_writer needs the whole image in a canvas
+    return out_fmt == "PNG" or (out_fmt == "JPEG" and preset != "smallest")
+
+
+def open_stream_writer(fp, out_fmt, width, quality=95, preset="balanced", subsampling=None, height_hint=None,
+                       scratch_dir=None, resume=None):
+    # fast / balanced stream PNG and baseline JPEG; "smallest" JPEG (progressive + optimized Huffman tables)
+    # and WebP need the whole image, so they go through a canvas
+    # scratch_dir: put that canvas in a memory-mapped scratch file there ("" = system temp dir) instead of RAM
+    # resume: a writer's checkpoint() from an earlier close(); fp (opened "r+b") is then appended to
+    if resume is not None and not streams_output(out_fmt, preset):
+        raise ValueError(f"{out_fmt} ({preset}) output is encoded as a whole and can't be appended to")
+    if out_fmt == "PNG":
+        return PngStreamWriter(fp, width, PNG_COMPRESS_LEVEL[preset], resume)
+    if out_fmt == "JPEG":
+        options = {"subsampling": subsampling} if subsampling else {}
+        if preset == "smallest":
+            return CanvasWriter(fp, width, "JPEG", dict(quality=quality, optimize=True, progressive=True, **options),
+                                JPEG_MAX_DIMENSION, height_hint, scratch_dir)
+        return JpegStreamWriter(fp, width, quality, resume, **options)
+    if out_fmt in ("WEBP", "WEBP_LOSSLESS"):
+        lossless = out_fmt == "WEBP_LOSSLESS"
+        options = dict(lossless=lossless, method=WEBP_METHOD[preset],
+                       quality=WEBP_LOSSLESS_EFFORT[preset] if lossless else quality)
+        return CanvasWriter(fp, width, "WEBP", options, WEBP_MAX_DIMENSION, height_hint, scratch_dir)
+    raise ValueError(f"unsupported output format: {out_fmt}")
@@ -0,0 +1,122 @@
+from collections import OrderedDict  # LRU order
+import os  # spill files
+import shutil  # spill directory cleanup
+import tempfile  # per-session spill directory
+import threading  # parts of a multi-part stitch render concurrently
+
+# Budgets for resized strips kept between stitches; override with PHOTO_STITCHER_STRIP_CACHE_MB / _STRIP_SPILL_MB
+STRIP_CACHE_MAX_BYTES = int(os.environ.get("PHOTO_STITCHER_STRIP_CACHE_MB", "256")) * 1024 * 1024
+STRIP_SPILL_MAX_BYTES = int(os.environ.get("PHOTO_STITCHER_STRIP_SPILL_MB", "2048")) * 1024 * 1024
+
+
+def strip_key(path, rotation, target_w, draft):  # None if the file can't be stat'ed; any edit changes the key
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (path, st.st_mtime_ns, st.st_size, rotation % 360, target_w, bool(draft))
+
+
+class StripCache:  # resized RGB strips from earlier stitches: LRU in memory, then raw files on disk, each under a budget
+    def __init__(self, max_bytes=STRIP_CACHE_MAX_BYTES, spill_bytes=STRIP_SPILL_MAX_BYTES):
+        self.max_bytes = max_bytes; self.spill_bytes = spill_bytes
+        self.memory_bytes = 0; self.disk_bytes = 0
+        self.hits = 0; self.misses = 0
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()  # key -> strip, oldest first
+        self._disk = OrderedDict()  # key -> (file, size), oldest first
+        self._spill_dir = None  # created on first spill, removed by close()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._memory) + len(self._disk)
+
+    def get(self, key):  # strip or None; callers must treat strips as read-only, they are shared
+        with self._lock:
+            strip = self._memory.get(key)
+            if strip is not None:
+                self._memory.move_to_end(key); self.hits += 1
+                return strip
+            entry = self._disk.pop(key, None)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.disk_bytes -= _cost(entry[1])
+        file, size = entry
+        from PIL import Image  # on first use: the app creates its cache before Pillow is loaded
+        try:
+            with open(file, "rb") as f:
+                strip = Image.frombytes("RGB", size, f.read())
+        except (OSError, ValueError):
+            with self._lock: self.misses += 1
+            return None
+        finally:
+            _remove_quietly(file)
+        with self._lock: self.hits += 1
+        self.put(key, strip)  # back to memory; it is likely to be used again soon
+        return strip
+
+    def put(self, key, strip):
+        if key is None or strip is None or strip.mode != "RGB": return
+        cost = _cost(strip.size)
+        with self._lock:
+            self._drop(key)
+            self._memory[key] = strip; self.memory_bytes += cost
+            victims = []
+            while self.memory_bytes > self.max_bytes and self._memory:
+                old_key, old = self._memory.popitem(last=False)
+                self.memory_bytes -= _cost(old.size); victims.append((old_key, old))
+        for old_key, old in victims:
+            self._spill(old_key, old)
+
+    def discard_path(self, path):  # forget every strip of one image (deleted from the list)
+        with self._lock:
+            for key in [k for k in list(self._memory) + list(self._disk) if k[0] == path]:
+                self._drop(key)
+
+    def close(self):  # drop everything, including the spill directory
+        with self._lock:
+            self._memory.clear(); self._disk.clear()
+            self.memory_bytes = 0; self.disk_bytes = 0
+            spill_dir, self._spill_dir = self._spill_dir, None
+        if spill_dir: shutil.rmtree(spill_dir, ignore_errors=True)
+
+    def _spill(self, key, strip):  # raw RGB: writing / reading it back is far cheaper than decode + resize
+        cost = _cost(strip.size)
+        if cost > self.spill_bytes: return
+        file = None
+        try:
+            with self._lock:
+                if self._spill_dir is None: self._spill_dir = tempfile.mkdtemp(prefix="photo-stitcher-strips-")
+                spill_dir = self._spill_dir
+            fd, file = tempfile.mkstemp(suffix=".rgb", dir=spill_dir)
+            with os.fdopen(fd, "wb") as f:
+                f.write(strip.tobytes())
+        except OSError:
+            if file: _remove_quietly(file)
+            return  # disk full / unwritable: the strip is simply re-rendered next time
+        with self._lock:
+            if key in self._memory or key in self._disk or self._spill_dir != spill_dir:  # re-added or closed meanwhile
+                _remove_quietly(file); return
+            self._disk[key] = (file, strip.size); self.disk_bytes += cost
+            while self.disk_bytes > self.spill_bytes and self._disk:
+                old_file, old_size = self._disk.popitem(last=False)[1]
+                self.disk_bytes -= _cost(old_size); _remove_quietly(old_file)
+
+    def _drop(self, key):  # caller holds the lock
+        strip = self._memory.pop(key, None)
+        if strip is not None: self.memory_bytes -= _cost(strip.size)
+        entry = self._disk.pop(key, None)
+        if entry is not None:
+            self.disk_bytes -= _cost(entry[1]); _remove_quietly(entry[0])
+
+
+def _cost(size):
+    return size[0] * size[1] * 3
+
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -0,0 +1,56 @@
+import random
+from PIL import Image
+from duplicates import DuplicateIndex, SIMILAR_BITS, content_hash, perceptual_hash
+
+PHASH = 0x0123456789ABCDEF
+
+
+def flip(phash, bits):  # phash with `bits` bits flipped, spread over different bytes
+    for i in range(bits): phash ^= 1 << (i * 9 % 64)
+    return phash
+
+
+def test_exact_match_by_digest():
+    index = DuplicateIndex(); index.add("a.jpg", "d1", PHASH)
+    assert index.match("d1") == ("exact", "a.jpg")
+    assert index.match("d1", flip(PHASH, 40)) == ("exact", "a.jpg")
+    assert index.match("d2") is None
+
+
+def test_near_match_within_similar_bits():
+    index = DuplicateIndex(); index.add("a.jpg", "d1", PHASH)
+    assert index.match("d2", flip(PHASH, SIMILAR_BITS)) == ("similar", "a.jpg")
+    assert index.match("d2", flip(PHASH, SIMILAR_BITS + 1)) is None
+    assert index.match("d2") is None  # exact-only lookups never report near matches
+
+
+def test_closest_near_match_wins():
+    index = DuplicateIndex(); index.add("far.jpg", "d1", flip(PHASH, 5)); index.add("near.jpg", "d2", flip(PHASH, 1))
+    assert index.match("d3", PHASH) == ("similar", "near.jpg")
+
+
+def test_digest_owner_hands_over_on_discard():
+    index = DuplicateIndex()
+    for name in ("a.jpg", "b.jpg", "c.jpg"): index.add(name, "same", PHASH)
+    assert index.match("same") == ("exact", "a.jpg")
+    index.discard("a.jpg")
+    assert "a.jpg" not in index and index.match("same") == ("exact", "b.jpg")
+    index.discard("c.jpg"); index.discard("c.jpg")  # discarding twice is harmless
+    assert index.match("same") == ("exact", "b.jpg")
+    index.discard("b.jpg")
+    assert index.match("same", PHASH) is None
+
+
+def test_re_adding_a_path_replaces_its_hashes():
+    index = DuplicateIndex(); index.add("a.jpg", "d1", PHASH); index.add("a.jpg", "d2", flip(PHASH, 30))
+    assert index.match("d1", PHASH) is None and index.match("d2") == ("exact", "a.jpg")
+
+
+def test_hashes_of_real_files(tmp_path):
+    rnd = random.Random(2)
+    img = Image.frombytes("RGB", (16, 12), rnd.randbytes(16 * 12 * 3)).resize((320, 240), Image.BICUBIC)
+    img.save(tmp_path / "a.png"); img.save(tmp_path / "b.png"); img.resize((200, 150)).save(tmp_path / "c.jpg", quality=80)
+    assert content_hash(str(tmp_path / "a.png")) == content_hash(str(tmp_path / "b.png"))
+    assert content_hash(str(tmp_path / "a.png")) != content_hash(str(tmp_path / "c.jpg"))
+    distance = bin(perceptual_hash(str(tmp_path / "a.png")) ^ perceptual_hash(str(tmp_path / "c.jpg"))).count("1")
+    assert distance <= SIMILAR_BITS  # resized and re-encoded: still the same picture
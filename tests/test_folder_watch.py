@@ -0,0 +1,47 @@
+import os
+from folder_watch import FolderWatcher
+
+
+def write(path, data, mtime):
+    with open(path, "wb") as f: f.write(data)
+    os.utime(path, ns=(mtime, mtime))
+
+
+def make_watcher(folder, **kwargs):
+    return FolderWatcher(str(folder), lambda p: p.endswith(".jpg"), settle=3.0, max_delay=15.0, **kwargs)
+
+
+def test_burst_released_together_oldest_first(tmp_path):
+    watcher = make_watcher(tmp_path)
+    write(tmp_path / "b.jpg", b"b", 2_000); write(tmp_path / "a.jpg", b"a", 3_000); write(tmp_path / "x.txt", b"x", 1_000)
+    assert watcher.poll(now=0) == []
+    assert watcher.poll(now=2) == []
+    assert watcher.poll(now=3) == [str(tmp_path / "b.jpg"), str(tmp_path / "a.jpg")]
+    assert watcher.poll(now=10) == []  # handed over once
+
+
+def test_changing_file_holds_the_burst_back(tmp_path):
+    watcher = make_watcher(tmp_path)
+    write(tmp_path / "a.jpg", b"a", 1_000); write(tmp_path / "b.jpg", b"b", 2_000)
+    watcher.poll(now=0)
+    write(tmp_path / "b.jpg", b"bb", 3_000)
+    assert watcher.poll(now=2) == [] and watcher.poll(now=4) == []  # a settled, b still being written
+    assert watcher.poll(now=5) == [str(tmp_path / "a.jpg"), str(tmp_path / "b.jpg")]
+
+
+def test_settled_files_released_after_max_delay(tmp_path):
+    # a file rewritten every second never settles; the finished ones must not wait for it
+    watcher = make_watcher(tmp_path)
+    write(tmp_path / "done.jpg", b"d", 1_000)
+    released = []
+    for now in range(30):
+        write(tmp_path / "busy.jpg", b"x" * (now + 1), 10_000 + now)
+        released += watcher.poll(now=now)
+        if now < 15: assert released == []
+    assert released == [str(tmp_path / "done.jpg")]
+
+
+def test_known_files_ignored(tmp_path):
+    write(tmp_path / "old.jpg", b"o", 1_000)
+    watcher = make_watcher(tmp_path, known=[str(tmp_path / "old.jpg")])
+    assert watcher.poll(now=0) == [] and watcher.poll(now=100) == []
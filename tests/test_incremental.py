@@ -0,0 +1,81 @@
+import os
+import random
+import pytest
+from PIL import Image
+import cli
+from incremental import IncrementalStitch
+from stitch_engine import StitchError
+
+WIDTH = 60
+
+
+def make_images(folder, count, seed=1, height=50):
+    rnd = random.Random(seed); paths = []
+    for i in range(count):
+        path = os.path.join(folder, f"img{seed}_{i}.png")
+        Image.frombytes("RGB", (6, 5), rnd.randbytes(90)).resize((WIDTH, height), Image.BICUBIC).save(path)
+        paths.append(path)
+    return paths
+
+
+def stacked(paths):  # what stitching the sources at their own width gives
+    images = [Image.open(p).convert("RGB") for p in paths]
+    out = Image.new("RGB", (WIDTH, sum(img.height for img in images))); y = 0
+    for img in images: out.paste(img, (0, y)); y += img.height
+    return out
+
+
+def read(path):
+    with open(path, "rb") as f: return f.read()
+
+
+@pytest.mark.parametrize("fmt, ext", [("PNG", ".png"), ("JPEG", ".jpg")])
+def test_append_then_reload(tmp_path, fmt, ext):
+    out = str(tmp_path / f"out{ext}"); params = dict(out_fmt=fmt, target_w=WIDTH)
+    first, second = make_images(str(tmp_path), 3, 1), make_images(str(tmp_path), 2, 2)
+    stitch = IncrementalStitch(out, **params); stitch.append(first, {})
+    stitch = IncrementalStitch.load(out, **params)
+    assert stitch is not None and len(stitch) == 3
+    stitch.append(second + first, {})  # images already in the output are skipped
+    assert len(stitch) == 5 and stitch.height == 250
+    with Image.open(out) as img:
+        assert img.size == (WIDTH, 250)
+        if fmt == "PNG": assert img.convert("RGB").tobytes() == stacked(first + second).tobytes()
+
+
+@pytest.mark.parametrize("fmt, ext", [("PNG", ".png"), ("JPEG", ".jpg")])
+def test_failed_append_rolls_back_exactly(tmp_path, fmt, ext):
+    out = str(tmp_path / f"out{ext}"); params = dict(out_fmt=fmt, target_w=WIDTH, max_height=200)
+    stitch = IncrementalStitch(out, **params); stitch.append(make_images(str(tmp_path), 3, 1), {})
+    before = read(out); state = read(stitch.state_path)
+    broken = str(tmp_path / "broken.png")
+    with open(broken, "wb") as f: f.write(b"\x89PNG\r\n\x1a\nnot really")
+    # the first two fill part one up to max_height and start part two before the broken file fails
+    with pytest.raises(StitchError):
+        stitch.append(make_images(str(tmp_path), 2, 2) + [broken], {})
+    assert read(out) == before and read(stitch.state_path) == state
+    assert not os.path.exists(stitch.part_path(1))  # the part this append created is gone
+    assert len(stitch) == 3 and stitch.height == 150
+    reloaded = IncrementalStitch.load(out, **params)
+    assert reloaded is not None
+    reloaded.append(make_images(str(tmp_path), 1, 3), {})  # the restored checkpoint still resumes
+    with Image.open(out) as img: assert img.size == (WIDTH, 200)
+
+
+def test_changed_output_is_not_resumed(tmp_path):
+    out = str(tmp_path / "out.png")
+    IncrementalStitch(out, "PNG", WIDTH).append(make_images(str(tmp_path), 1), {})
+    with open(out, "ab") as f: f.write(b"edited")
+    assert IncrementalStitch.load(out, out_fmt="PNG", target_w=WIDTH) is None
+    assert IncrementalStitch.load(out + ".other", out_fmt="PNG", target_w=WIDTH) is None
+
+
+def test_watch_skips_its_own_output_in_the_watched_folder(tmp_path):
+    folder = tmp_path / "in"; folder.mkdir()
+    make_images(str(folder), 4); out = str(folder / "out.png")
+    argv = ["watch", str(folder), "-o", out, "-w", str(WIDTH), "--max-height", "120", "--workers", "1", "--once"]
+    for _ in range(2):  # the second scan sees out.png, out_part02.png and the state file next to the inputs
+        assert cli.main(argv) == 0
+    stitch = IncrementalStitch.load(out, out_fmt="PNG", target_w=WIDTH, max_height=120)
+    assert len(stitch) == 4 and stitch.height == 200 and os.path.exists(stitch.part_path(1))
+    assert stitch.owns(stitch.part_path(7)) and stitch.owns(stitch.state_path) and not stitch.owns(str(folder / "out_partial.png"))
@@ -0,0 +1,76 @@
+import random
+from item_model import ItemStore
+from geometry import rotated_size
+
+
+def check(store):
+    assert [store.index(p) for p in store.paths] == list(range(len(store)))
+
+
+def test_positions_follow_every_edit():
+    rnd = random.Random(5); store = ItemStore(); counter = 0
+    for _ in range(300):
+        op = rnd.random()
+        if op < 0.4:
+            new = [f"/img/{counter + i}.jpg" for i in range(rnd.randint(1, 5))]; counter += len(new)
+            assert store.add_many(new + new[:1]) == new  # repeats within the batch are dropped
+        elif op < 0.7 and store.paths:
+            doomed = rnd.sample(store.paths, rnd.randint(1, min(4, len(store))))
+            assert {item.path for item in store.remove_many(doomed + ["/not/listed.jpg"])} == set(doomed)
+            assert all(store.index(p) is None and p not in store for p in doomed)
+        elif store.paths:
+            indices = sorted(rnd.sample(range(len(store)), rnd.randint(1, min(3, len(store)))))
+            moved = [store.paths[i] for i in indices]
+            new = store.move_block(indices, rnd.choice((-1, 1)))
+            assert all(store.paths[i] in moved for i in new)
+        check(store)
+
+
+def test_move_block_pinned_at_edge():
+    store = ItemStore(); store.add_many(["a", "b", "c", "d"])
+    assert store.move_block([0, 2], -1) == [1]  # "a" can't move up; "c" moves above "b"
+    assert store.paths == ["a", "c", "b", "d"]
+    check(store)
+
+
+def full_trim(store, target_w):  # the trimmed-row sum rebuilt from scratch over the current neighbours
+    items = list(store); rows = 0.0
+    for upper, lower in zip(items, items[1:]):
+        found = store.trims.overlaps.get((upper.path, upper.rotation, lower.path, lower.rotation))
+        if found and upper.size and lower.size:
+            rows += found[0] * target_w * rotated_size(upper.size, upper.rotation)[1] / rotated_size(upper.size, upper.rotation)[0]
+            rows += found[1] * target_w * rotated_size(lower.size, lower.rotation)[1] / rotated_size(lower.size, lower.rotation)[0]
+    return round(rows)
+
+
+def test_trimmed_rows_follow_every_edit():
+    rnd = random.Random(9); store = ItemStore(); counter = 0
+    for _ in range(400):
+        op = rnd.random()
+        if op < 0.25:
+            new = [f"/img/{counter + i}.png" for i in range(rnd.randint(1, 4))]; counter += len(new)
+            store.add_many(new)
+        elif not store.paths:
+            continue
+        elif op < 0.4:
+            store.remove_many(rnd.sample(store.paths, rnd.randint(1, min(3, len(store)))))
+        elif op < 0.55:
+            store.move_block(sorted(rnd.sample(range(len(store)), rnd.randint(1, min(3, len(store))))), rnd.choice((-1, 1)))
+        elif op < 0.7:
+            store.set_rotation(rnd.choice(store.paths), rnd.choice((0, 90, 180, 270)))
+        elif op < 0.8:
+            store.set_size(rnd.choice(store.paths), (rnd.randint(300, 1200), rnd.randint(300, 3000)))
+        else:  # results land for pairs that are (or were) neighbours
+            for key in store.trims.take_unknown():
+                store.trims.set(key, rnd.choice((None, (rnd.random() / 4, rnd.random() / 4))))
+        assert len(store.trims) == max(0, len(store) - 1)
+        assert abs(store.trimmed_rows(1080) - full_trim(store, 1080)) <= 1  # float sum order only
+    assert store.trimmed_rows(1080) > 0
+
+
+def test_unknown_pairs_are_handed_out_once_in_order():
+    store = ItemStore(); store.add_many(["a", "b", "c"])
+    assert store.trims.take_unknown() == [("a", 0, "b", 0), ("b", 0, "c", 0)]
+    assert store.trims.take_unknown() == []
+    store.set_rotation("c", 90)  # a new key for the b-c pair
+    assert store.trims.take_unknown() == [("b", 0, "c", 90)]
@@ -0,0 +1,35 @@
+from memory_budget import STRIPS_PER_WORKER, WORKER_OVERHEAD_BYTES, plan_memory
+
+MB = 1024 * 1024
+W = 1000  # output width; a 500-row strip is 1.5 MB
+RENDER = WORKER_OVERHEAD_BYTES + STRIPS_PER_WORKER * W * 500 * 3  # one render worker
+
+
+def test_streaming_encoder_streams_and_caps_workers():
+    plan = plan_memory(W, [20000], 500, "PNG", True, 8, 3 * RENDER + MB)
+    assert (plan.strategy, plan.workers, plan.part_workers, plan.over_budget) == ("stream", 3, 1, False)
+    assert plan.estimate == 3 * RENDER
+
+
+def test_canvas_fits_in_memory():
+    plan = plan_memory(W, [2000], 500, "WEBP", False, 4, 1024 * MB)
+    assert (plan.strategy, plan.workers, plan.over_budget) == ("memory", 4, False)
+
+
+def test_canvas_too_big_is_mapped():
+    # canvas 60 MB + JPEG encoder 60 MB don't fit next to a render worker in 110 MB; without the canvas they do
+    plan = plan_memory(W, [20000], 500, "JPEG", False, 4, 110 * MB)
+    assert (plan.strategy, plan.workers, plan.over_budget) == ("mmap", 1, False)
+    assert "scratch file" in plan.reason
+
+
+def test_small_budget_runs_one_worker_over_budget():
+    plan = plan_memory(W, [20000], 500, "PNG", True, 8, 10 * MB)
+    assert (plan.strategy, plan.workers, plan.over_budget) == ("stream", 1, True)
+    assert plan.estimate == RENDER
+
+
+def test_parts_side_by_side_are_capped():
+    plan = plan_memory(W, [1000] * 6, 500, "PNG", True, 8, 2 * RENDER + MB)
+    assert (plan.workers, plan.part_workers) == (1, 2) and "2 of 6 parts side by side" in plan.reason
+    assert plan_memory(W, [1000] * 6, 500, "PNG", True, 8, 0).part_workers == 1  # nothing fits: still one at a time
@@ -0,0 +1,62 @@
+import itertools
+import os
+import types
+import pytest
+from PIL import Image
+import metadata_store
+from metadata_store import MetadataStore
+
+
+@pytest.fixture
+def clock(monkeypatch):  # strictly increasing last_used stamps, so LRU order doesn't depend on timer resolution
+    monkeypatch.setattr(metadata_store, "time", types.SimpleNamespace(time=itertools.count(1).__next__))
+
+
+def make_files(folder, count):
+    paths = []
+    for i in range(count):
+        path = os.path.join(folder, f"img{i}.png"); Image.new("RGB", (80 + i, 60), "gray").save(path)
+        paths.append(path)
+    return paths
+
+
+def touch(path):  # an edit: same size, new mtime
+    st = os.stat(path); os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+
+
+def test_upsert_round_trip(tmp_path, clock):
+    a, b = make_files(str(tmp_path), 2)
+    store = MetadataStore(str(tmp_path / "cache"))
+    store.put_many([(a, (80, 60), 1), (b, (81, 60), 6)])
+    assert store.lookup([a, b, str(tmp_path / "missing.png")]) == {a: ((80, 60), 1), b: ((81, 60), 6)}
+    store.put_many([(a, (60, 80), 8)])  # upsert replaces the row
+    assert store.lookup([a]) == {a: ((60, 80), 8)}
+    touch(b)
+    assert store.lookup([b]) == {}  # changed since: not trusted
+    assert MetadataStore(str(tmp_path / "cache")).lookup([a]) == {a: ((60, 80), 8)}  # survives a restart
+
+
+def test_thumbnails_evicted_least_recently_used_first(tmp_path, clock):
+    paths = make_files(str(tmp_path), 3)
+    store = MetadataStore(str(tmp_path / "cache"))
+    store.put_many([(p, (80, 60), 1) for p in paths])
+    thumb = Image.new("RGB", (64, 48), "white")
+    store.save_thumbnail(paths[0], thumb)
+    nbytes = sum(e.stat().st_size for e in os.scandir(store.thumb_dir))
+    store.max_bytes = int(2.5 * nbytes)  # room for two
+    store.save_thumbnail(paths[1], thumb)
+    store.lookup([paths[0]])  # used again: paths[1] is now the oldest
+    store.save_thumbnail(paths[2], thumb)
+    assert [store.load_thumbnail(p) is not None for p in paths] == [True, False, True]
+    assert len(os.listdir(store.thumb_dir)) == 2
+
+
+def test_edited_file_drops_its_thumbnail(tmp_path, clock):
+    (path,) = make_files(str(tmp_path), 1)
+    store = MetadataStore(str(tmp_path / "cache"))
+    store.put_many([(path, (80, 60), 1)]); store.save_thumbnail(path, Image.new("RGB", (64, 48)))
+    assert store.load_thumbnail(path).size == (64, 48)
+    touch(path)
+    assert store.load_thumbnail(path) is None
+    store.put_many([(path, (80, 60), 1)])  # re-probed: the stale file goes
+    assert os.listdir(store.thumb_dir) == []
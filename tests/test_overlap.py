@@ -0,0 +1,97 @@
+import random
+import pytest
+from PIL import Image, ImageDraw
+from overlap import row_signature, find_overlap, trim_overlaps
+
+W, H, BAR = 400, 800, 50  # phone-like screenshot with a fixed status bar and navigation bar
+
+
+def document(seed, style, height=3000):  # the long page the screenshots scroll over
+    rnd = random.Random(seed)
+    doc = Image.new("RGB", (W, height), (250, 250, 250)); d = ImageDraw.Draw(doc)
+    y = 10
+    while y < height:
+        if style == "text":  # lines of words
+            x = 20
+            while x < W - 40:
+                w = rnd.randint(10, 60); d.rectangle((x, y, x + w, y + 12), fill=(30, 30, 30)); x += w + rnd.randint(6, 14)
+            y += rnd.choice((20, 22, 24, 40))
+        elif style == "chat":  # bubbles of the same shape, only their text widths vary
+            left = rnd.random() < 0.5; bw = rnd.randint(120, 300); bh = rnd.choice((40, 60))
+            x0 = 20 if left else W - 20 - bw
+            d.rounded_rectangle((x0, y, x0 + bw, y + bh), 10, fill=(220, 240, 220) if left else (200, 220, 250))
+            for ly in range(y + 10, y + bh - 10, 20):
+                d.rectangle((x0 + 10, ly, x0 + 10 + rnd.randint(40, bw - 20), ly + 10), fill=(40, 40, 40))
+            y += bh + 16
+        else:  # list: identical 60 px rows, an icon and two labels of random length
+            d.rectangle((20, y + 10, 60, y + 50), fill=(80, 140, 220))
+            d.rectangle((80, y + 15, 80 + rnd.randint(60, 250), y + 27), fill=(30, 30, 30))
+            d.rectangle((80, y + 35, 80 + rnd.randint(40, 150), y + 43), fill=(150, 150, 150))
+            d.line((0, y + 59, W, y + 59), fill=(210, 210, 210)); y += 60
+    return doc
+
+
+def screenshot(doc, offset, minute):  # the page scrolled to `offset`, between a status bar whose clock changes and a fixed footer
+    shot = Image.new("RGB", (W, H))
+    shot.paste(doc.crop((0, offset, W, offset + H - 2 * BAR)), (0, BAR))
+    d = ImageDraw.Draw(shot)
+    d.rectangle((0, 0, W, BAR - 1), fill=(20, 20, 20)); d.text((10, 15), f"12:{minute:02d}", fill=(255, 255, 255))
+    d.rectangle((0, H - BAR, W, H), fill=(240, 240, 240)); d.rectangle((180, H - 35, 220, H - 15), fill=(90, 90, 90))
+    return shot
+
+
+def pair(style, seed, step, scale=1.0):
+    doc = document(seed * 7 + step, style); start = random.Random(seed).randint(0, 500)
+    upper, lower = screenshot(doc, start, 1), screenshot(doc, start + step, 2)
+    if scale != 1.0:
+        size = (round(W * scale), round(H * scale)); upper = upper.resize(size, Image.LANCZOS); lower = lower.resize(size, Image.LANCZOS)
+    return row_signature(upper), row_signature(lower)
+
+
+@pytest.mark.parametrize("style", ["text", "chat"])
+@pytest.mark.parametrize("step", [200, 300, 450, 600])
+@pytest.mark.parametrize("seed", range(3))
+def test_known_scroll_offsets(style, step, seed):
+    # upper loses its footer (and any rows above it that lower shows unchanged), lower its status bar and the rows
+    # upper already shows: together exactly the rows both screenshots share
+    bottom, top = find_overlap(*pair(style, seed, step))
+    assert bottom >= BAR and top >= BAR
+    assert bottom + top == H - step
+
+
+@pytest.mark.parametrize("step", [200, 300, 450, 600])
+@pytest.mark.parametrize("seed", range(6))
+def test_repetitive_list_never_over_trims(step, seed):
+    # several offsets match a list of look-alike rows: repeating one is acceptable, cutting unique rows is not
+    found = find_overlap(*pair("list", seed, step))
+    assert found is not None
+    bottom, top = found
+    assert bottom >= BAR and top >= BAR
+    assert bottom + top <= H - step
+
+
+@pytest.mark.parametrize("style", ["text", "chat", "list"])
+@pytest.mark.parametrize("seed", range(4))
+def test_no_overlap(style, seed):
+    assert find_overlap(*pair(style, seed, 1000)) is None
+
+
+@pytest.mark.parametrize("scale", [0.9, 1.35])
+@pytest.mark.parametrize("step", [200, 450])
+def test_fractional_offsets(scale, step):
+    # resized screenshots scroll by a fraction of an output row: the cut is within a row of the true one
+    bottom, top = find_overlap(*pair("chat", 1, step, scale))
+    assert abs(bottom + top - (H - step) * scale) <= 1
+    assert bottom >= BAR * scale - 2 and top >= BAR * scale - 2
+
+
+def test_trim_overlaps_keeps_every_row_once():
+    doc = document(3, "text"); shots = [screenshot(doc, 100 + i * 300, i) for i in range(4)]
+    def rendered():
+        for i, shot in enumerate(shots): yield f"{i}.png", shot, None
+    strips = [strip for _, strip, _ in trim_overlaps(rendered())]
+    assert len(strips) == 4
+    assert sum(strip.height for strip in strips) == H + 3 * 300  # the scrolled distance plus one screen
+    stitched = Image.new("RGB", (W, sum(strip.height for strip in strips))); y = 0
+    for strip in strips: stitched.paste(strip, (0, y)); y += strip.height
+    assert stitched.crop((0, BAR, W, stitched.height - BAR)).tobytes() == doc.crop((0, 100, W, 100 + 900 + H - 2 * BAR)).tobytes()
@@ -0,0 +1,40 @@
+import pytest
+from stitch_engine import part_paths, plan_parts
+
+
+def test_splits_at_image_boundaries():
+    assert plan_parts([50, 50, 50], 120) == [[(0, 0, 50), (1, 0, 50)], [(2, 0, 50)]]
+    assert plan_parts([50, 50], 100) == [[(0, 0, 50), (1, 0, 50)]]  # exactly full: no empty part
+
+
+def test_splits_exactly_at_max_height():
+    assert plan_parts([50, 50, 50], 120, at_boundaries=False) == [[(0, 0, 50), (1, 0, 50), (2, 0, 20)], [(2, 20, 50)]]
+
+
+@pytest.mark.parametrize("at_boundaries", [True, False])
+def test_single_image_taller_than_the_limit_is_cut(at_boundaries):
+    assert plan_parts([300], 120, at_boundaries) == [[(0, 0, 120)], [(0, 120, 240)], [(0, 240, 300)]]
+
+
+def test_tall_image_starts_a_fresh_part_at_a_boundary():
+    assert plan_parts([50, 300, 30], 120) == [[(0, 0, 50)], [(1, 0, 120)], [(1, 120, 240)], [(1, 240, 300), (2, 0, 30)]]
+
+
+@pytest.mark.parametrize("at_boundaries", [True, False])
+def test_parts_cover_every_row_within_the_limit(at_boundaries):
+    heights = [70, 0, 130, 5, 260, 40, 0]
+    parts = plan_parts(heights, 100, at_boundaries)
+    assert all(sum(end - start for _, start, end in part) <= 100 for part in parts)
+    rows = {}
+    for part in parts:
+        for idx, start, end in part: rows.setdefault(idx, []).append((start, end))
+    assert sorted(rows) == list(range(len(heights)))  # zero-height images ride along
+    for idx, spans in rows.items():
+        assert spans[0][0] == 0 and spans[-1][1] == heights[idx]
+        assert all(a[1] == b[0] for a, b in zip(spans, spans[1:]))
+
+
+def test_part_paths():
+    assert part_paths("/out/a.jpg", 1) == ["/out/a.jpg"]
+    assert part_paths("/out/a.jpg", 3) == ["/out/a_part01.jpg", "/out/a_part02.jpg", "/out/a_part03.jpg"]
+    assert part_paths("a.png", 120)[-1] == "a_part120.png"
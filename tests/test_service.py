@@ -0,0 +1,140 @@
+import http.client
+import io
+import json
+import os
+import threading
+import time
+import pytest
+from PIL import Image
+import service
+from service import StitchService, JobRejected, make_server
+
+
+def png_bytes(color, size=(40, 30)):
+    buf = io.BytesIO(); Image.new("RGB", size, color).save(buf, "PNG"); return buf.getvalue()
+
+
+@pytest.fixture
+def stitch_service(tmp_path):
+    svc = StitchService(str(tmp_path / "work"), workers=1, render_workers=1, roots=[str(tmp_path)])
+    yield svc
+    svc.shutdown(wait=True)
+
+
+def wait_for(svc, job_id, timeout=30):
+    deadline = time.time() + timeout
+    while svc.status(job_id)["status"] in ("queued", "running"):
+        assert time.time() < deadline, "job didn't finish"
+        time.sleep(0.02)
+    return svc.status(job_id)
+
+
+@pytest.mark.parametrize("images", [[{"path": 5}], [{"upload": 5}], [{"upload": ["a"]}], [{"rotation": 90}], [7]])
+def test_bad_image_entries_are_rejected(stitch_service, images):
+    with pytest.raises(JobRejected):
+        stitch_service.submit({"images": images})
+
+
+@pytest.mark.parametrize("field", [{"preset": "turbo"}, {"width": 0}, {"width": -10}, {"width": "wide"}])
+def test_bad_job_fields_are_rejected(stitch_service, field):
+    upload = stitch_service.add_upload(png_bytes("red"))
+    with pytest.raises(JobRejected):
+        stitch_service.submit(dict({"images": [{"upload": upload}]}, **field))
+    assert stitch_service.jobs() == []  # nothing was queued
+
+
+def test_result_parts(stitch_service):
+    uploads = [stitch_service.add_upload(png_bytes(c)) for c in ("red", "blue")]
+    view = stitch_service.submit({"images": [{"upload": u} for u in uploads], "width": 40, "format": "PNG"})
+    done = wait_for(stitch_service, view["id"])
+    assert done["status"] == "ok" and done["height"] == 60
+    path, fmt = stitch_service.result_path(view["id"], 0)
+    assert fmt == "PNG" and Image.open(path).size == (40, 60)
+    for part in (-1, 1):
+        with pytest.raises(IndexError):
+            stitch_service.result_path(view["id"], part)
+
+
+def test_shutdown_cancels_queued_jobs(tmp_path, monkeypatch):
+    release = threading.Event(); started = threading.Event()
+    def slow_job(job):
+        started.set(); release.wait(10)
+        return {"status": "ok", "seconds": 0.0, "parts": []}
+    monkeypatch.setattr(service, "run_job", slow_job)
+    svc = StitchService(str(tmp_path / "work"), workers=1, render_workers=1)
+    upload = svc.add_upload(png_bytes("red"))
+    ids = [svc.submit({"images": [{"upload": upload}]})["id"] for _ in range(4)]
+    assert started.wait(10)
+    svc.shutdown(wait=False); release.set()
+    for thread in svc._threads: thread.join(10)
+    assert [svc.status(i)["status"] for i in ids] == ["ok", "cancelled", "cancelled", "cancelled"]
+    assert svc.metrics()["jobs"]["cancelled"] == 3
+
+
+def test_over_budget_job_fails_instead_of_running(tmp_path):
+    svc = StitchService(str(tmp_path / "work"), workers=1, render_workers=1, memory_budget=10 * 1024 * 1024)
+    try:  # 10 MB can't hold even one render process (WORKER_OVERHEAD_BYTES)
+        upload = svc.add_upload(png_bytes("red"))
+        done = wait_for(svc, svc.submit({"images": [{"upload": upload}], "width": 40, "format": "PNG"})["id"])
+        assert done["status"] == "error" and "budget" in done["error"]
+        assert not os.listdir(os.path.join(svc.work_dir, done["id"]))  # refused before anything was written
+    finally:
+        svc.shutdown(wait=True)
+
+
+def test_expired_uploads_are_kept_while_a_job_uses_them(tmp_path, monkeypatch):
+    release = threading.Event(); started = threading.Event()
+    def slow_job(job):
+        started.set(); release.wait(10)
+        return {"status": "ok", "seconds": 0.0, "parts": []}
+    monkeypatch.setattr(service, "run_job", slow_job)
+    svc = StitchService(str(tmp_path / "work"), workers=1, render_workers=1)
+    try:
+        running, queued, unused = (svc.add_upload(png_bytes(c)) for c in ("red", "blue", "green"))
+        svc.submit({"images": [{"upload": running}]}); assert started.wait(10)
+        svc.submit({"images": [{"upload": queued}]})
+        old = time.time() - service.UPLOAD_MAX_AGE_SECONDS - 60
+        for upload in (running, queued, unused): os.utime(svc._upload_path(upload), (old, old))
+        svc.add_upload(png_bytes("white"))  # expires old uploads
+        svc._upload_path(running); svc._upload_path(queued)  # still there
+        with pytest.raises(JobRejected):
+            svc._upload_path(unused)
+    finally:
+        release.set(); svc.shutdown(wait=True)
+
+
+@pytest.fixture
+def server(stitch_service):
+    srv = make_server(stitch_service, port=0)
+    thread = threading.Thread(target=srv.serve_forever, daemon=True); thread.start()
+    yield srv.server_address
+    srv.shutdown(); srv.server_close()
+
+
+def request(address, method, path, body=None, headers=None):
+    conn = http.client.HTTPConnection(*address, timeout=10)
+    conn.putrequest(method, path)
+    for key, value in (headers or {}).items(): conn.putheader(key, value)
+    conn.endheaders(body)
+    response = conn.getresponse(); data = response.read(); conn.close()
+    return response.status, data
+
+
+@pytest.mark.parametrize("length", ["-5", "ten", "1.5"])
+def test_bad_content_length_is_400(server, length):
+    status, data = request(server, "POST", "/jobs", b"{}", {"Content-Length": length})
+    assert status == 400 and b"Content-Length" in data
+
+
+def test_non_string_path_is_400(server):
+    body = json.dumps({"images": [{"path": 5}]}).encode()
+    status, data = request(server, "POST", "/jobs", body, {"Content-Length": str(len(body))})
+    assert status == 400 and b"path must be a string" in data
+
+
+def test_negative_part_is_404(server, stitch_service):
+    upload = stitch_service.add_upload(png_bytes("red"))
+    job_id = stitch_service.submit({"images": [{"upload": upload}], "width": 40, "format": "PNG"})["id"]
+    assert wait_for(stitch_service, job_id)["status"] == "ok"
+    assert request(server, "GET", f"/jobs/{job_id}/result?part=0")[0] == 200
+    assert request(server, "GET", f"/jobs/{job_id}/result?part=-1")[0] == 404
@@ -0,0 +1,89 @@
+import io
+import random
+import zlib
+import pytest
+from PIL import Image
+from stream_encoders import (ENCODER_PRESETS, JpegStreamWriter, PngStreamWriter, _png_idat_payload, format_presets,
+                             normalize_preset, open_stream_writer)
+
+STRIPS = ((0, 70), (70, 200), (200, 333), (333, 400))  # uneven, not aligned with JPEG chunks or MCU rows
+
+
+def photo(size=(200, 400), seed=3):  # smooth noise: compresses like a photo, every row differs
+    rnd = random.Random(seed); w, h = size
+    return Image.frombytes("RGB", (w // 10, h // 10), rnd.randbytes(w // 10 * (h // 10) * 3)).resize(size, Image.BICUBIC)
+
+
+def write(writer_cls, img, strips, fp=None, **kwargs):
+    fp = fp or io.BytesIO(); writer = writer_cls(fp, img.width, **kwargs)
+    for y0, y1 in strips: writer.write_strip(img.crop((0, y0, img.width, y1)))
+    writer.close()
+    return fp, writer
+
+
+def test_png_stream_decodes_to_the_strips():
+    img = photo()
+    fp, _ = write(PngStreamWriter, img, STRIPS, compress_level=6)
+    data = fp.getvalue()
+    zlib.decompress(_png_idat_payload(data))  # hand-written zlib wrapper: header, deflate stream and Adler-32 all check out
+    out = Image.open(io.BytesIO(data)); out.load()
+    assert out.size == img.size and out.tobytes() == img.tobytes()
+
+
+@pytest.mark.parametrize("level", [1, 6, 9])
+def test_png_stream_size_matches_pillow(level):
+    # one deflate stream across strips, flushed only on close: no bigger than encoding the whole image at once
+    img = photo((400, 1000))
+    fp, _ = write(PngStreamWriter, img, [(y, y + 100) for y in range(0, 1000, 100)], compress_level=level)
+    whole = io.BytesIO(); img.save(whole, "PNG", compress_level=level)
+    assert len(fp.getvalue()) <= len(whole.getvalue()) * 1.01
+
+
+@pytest.mark.parametrize("split", [1, 2, 3])
+def test_png_resume_appends_rows(split):
+    img = photo()
+    fp, writer = write(PngStreamWriter, img, STRIPS[:split])
+    checkpoint = writer.checkpoint()
+    fp, _ = write(PngStreamWriter, img, STRIPS[split:], fp, resume=checkpoint)
+    data = fp.getvalue()
+    zlib.decompress(_png_idat_payload(data))  # the resumed deflate stream and Adler-32 continue the first one
+    out = Image.open(io.BytesIO(data)); out.load()
+    assert out.size == img.size and out.tobytes() == img.tobytes()
+
+
+def test_png_resume_without_rows_is_byte_identical():
+    fp, writer = write(PngStreamWriter, photo(), STRIPS)
+    before = fp.getvalue()
+    fp, _ = write(PngStreamWriter, photo(), (), fp, resume=writer.checkpoint())  # what a rollback does
+    assert fp.getvalue() == before
+
+
+def test_jpeg_splice_matches_one_encode():
+    # chunks encoded separately and joined at restart markers give exactly the bytes of encoding the whole image
+    img = photo()
+    fp, _ = write(JpegStreamWriter, img, STRIPS, quality=90)
+    whole = io.BytesIO(); img.save(whole, "JPEG", quality=90, restart_marker_rows=1)
+    assert fp.getvalue() == whole.getvalue()
+
+
+@pytest.mark.parametrize("split", [1, 2, 3])
+def test_jpeg_resume_matches_one_encode(split):
+    img = photo()
+    fp, writer = write(JpegStreamWriter, img, STRIPS[:split], quality=90)
+    fp, _ = write(JpegStreamWriter, img, STRIPS[split:], fp, quality=90, resume=writer.checkpoint())
+    whole = io.BytesIO(); img.save(whole, "JPEG", quality=90, restart_marker_rows=1)
+    assert fp.getvalue() == whole.getvalue()
+
+
+def test_canvas_outputs_refuse_resume():
+    with pytest.raises(ValueError):
+        open_stream_writer(io.BytesIO(), "JPEG", 10, preset="smallest", resume={})
+
+
+def test_jpeg_fast_and_balanced_are_one_preset():
+    img = photo()
+    outputs = [open_stream_writer(io.BytesIO(), "JPEG", img.width, 90, preset) for preset in ("fast", "balanced")]
+    for writer in outputs: writer.write_strip(img); writer.close()
+    assert outputs[0].fp.getvalue() == outputs[1].fp.getvalue()
+    assert format_presets("JPEG") == ("balanced", "smallest") and normalize_preset("JPEG", "fast") == "balanced"
+    assert format_presets("PNG") == ENCODER_PRESETS and normalize_preset("PNG", "fast") == "fast"
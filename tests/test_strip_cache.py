@@ -0,0 +1,59 @@
+import os
+from PIL import Image
+from strip_cache import StripCache, strip_key
+
+STRIP = (10, 10)  # 300 bytes each
+COST = STRIP[0] * STRIP[1] * 3
+
+
+def strip(color):
+    return Image.new("RGB", STRIP, color)
+
+
+def test_lru_spills_to_disk_and_reads_back():
+    cache = StripCache(max_bytes=2 * COST, spill_bytes=10 * COST)
+    try:
+        for i, color in enumerate(("red", "green", "blue")): cache.put(("k", i), strip(color))
+        assert (cache.memory_bytes, cache.disk_bytes, len(cache)) == (2 * COST, COST, 3)  # the oldest went to disk
+        assert len(os.listdir(cache._spill_dir)) == 1
+        cache.get(("k", 1))  # now most recent: "blue" is the next to spill
+        back = cache.get(("k", 0))
+        assert back.tobytes() == strip("red").tobytes() and cache.hits == 2
+        assert list(cache._disk) == [("k", 2)] and len(os.listdir(cache._spill_dir)) == 1  # the read-back file is gone
+        assert cache.get(("k", 9)) is None and cache.misses == 1
+    finally:
+        spill_dir = cache._spill_dir; cache.close()
+    assert not os.path.exists(spill_dir) and len(cache) == 0
+
+
+def test_spill_budget_drops_the_oldest_files():
+    cache = StripCache(max_bytes=COST, spill_bytes=2 * COST)
+    try:
+        for i in range(5): cache.put(("k", i), strip((i, i, i)))
+        assert list(cache._memory) == [("k", 4)] and list(cache._disk) == [("k", 2), ("k", 3)]
+        assert len(os.listdir(cache._spill_dir)) == 2 and cache.disk_bytes == 2 * COST
+        assert cache.get(("k", 0)) is None
+    finally:
+        cache.close()
+
+
+def test_discard_path_drops_memory_and_disk_entries():
+    cache = StripCache(max_bytes=COST, spill_bytes=10 * COST)
+    try:
+        cache.put(("a.jpg", 0), strip("red")); cache.put(("a.jpg", 1), strip("red")); cache.put(("b.jpg", 0), strip("red"))
+        cache.discard_path("a.jpg")
+        assert len(cache) == 1 and cache.disk_bytes == 0 and not os.listdir(cache._spill_dir)
+    finally:
+        cache.close()
+
+
+def test_key_follows_file_edits_rotation_and_draft(tmp_path):
+    path = str(tmp_path / "a.png"); strip("red").save(path)
+    key = strip_key(path, 0, 100, True)
+    assert strip_key(path, 360, 100, True) == key  # same rotation
+    assert strip_key(path, 90, 100, True) != key
+    assert strip_key(path, 0, 100, False) != key
+    assert strip_key(path, 0, 200, True) != key
+    st = os.stat(path); os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+    assert strip_key(path, 0, 100, True) != key
+    assert strip_key(str(tmp_path / "missing.png"), 0, 100, True) is None
@@ -0,0 +1,40 @@
+import random
+import pytest
+from PIL import Image, ImageChops
+from stitch_engine import render_strip
+from transform_plan import COMPOSED_TRANSPOSE, EXIF_TRANSPOSE, ROTATION_TRANSPOSE, TransformPlan
+
+
+def noise(mode, size, seed=1):  # textured source: where resampling order shows
+    return Image.frombytes(mode, size, random.Random(seed).randbytes(size[0] * size[1] * len(mode)))
+
+
+def test_composed_transpose_matches_sequential():
+    img = noise("RGB", (7, 5))
+    for (orientation, rotation), method in COMPOSED_TRANSPOSE.items():
+        expected = img
+        for step in (EXIF_TRANSPOSE.get(orientation), ROTATION_TRANSPOSE.get(rotation)):
+            if step is not None: expected = expected.transpose(step)
+        got = img.transpose(method) if method is not None else img
+        assert got.tobytes() == expected.tobytes(), (orientation, rotation)
+
+
+@pytest.mark.parametrize("mode", ["RGB", "L"])
+@pytest.mark.parametrize("rotation", [0, 90, 180, 270])
+def test_exact_render_is_convert_rotate_resize(tmp_path, mode, rotation):
+    # with fast decoding off the strip is pixel for pixel what converting, rotating and resizing would give
+    src = noise(mode, (300, 200)); path = tmp_path / "src.png"; src.save(path)
+    expected = src.convert("RGB")
+    if rotation: expected = expected.rotate(rotation, expand=True)
+    expected = expected.resize((120, int(120 * expected.height / expected.width)), Image.Resampling.LANCZOS)
+    assert render_strip(str(path), rotation, 120, draft=False).tobytes() == expected.tobytes()
+
+
+def test_fast_plan_resizes_before_transposing():
+    plan = TransformPlan((3000, 2000), "RGB", 6, 0, (400, 600))
+    assert plan.steps() == ["resize", "rotate_270"] and plan.resize_size == (600, 400)
+    exact = TransformPlan((3000, 2000), "RGB", 6, 0, (400, 600), exact=True)
+    assert exact.steps() == ["rotate_270", "resize"]
+    out = exact.execute(noise("RGB", (3000, 2000)))
+    assert out.size == (400, 600)
+    assert ImageChops.difference(out, plan.execute(noise("RGB", (3000, 2000)))).getbbox() is not None  # why exact exists
@@ -0,0 +1,208 @@
+import os  # row captions
+import queue  # finished thumbnails from the render thread
+import sys  # platform modifier key
+import tkinter as tk  # canvas-backed list
+from preview_cache import PreviewCache, PreviewPrefetcher  # thumbnail LRU + background renderer
+
+ROW_HEIGHT = 44
+THUMB_SIZE = 40  # square box the row thumbnail is fitted into
+LIST_THUMB_CACHE_MAX_BYTES = 32 * 1024 * 1024
+SELECT_FILL = "#cce4ff"
+ACTIVE_OUTLINE = "#3875d7"
+
+
+class ThumbnailList:  # virtualized list of image rows with lazy thumbnails; Listbox-style, index-based API
+    # Rows are the app's path list (items() returns it); selection and the active row are kept by path, so
+    # reorders carry them along and only the ~visible rows ever exist on the canvas. Row positions come from
+    # index_of (the store's position index), so selection queries cost the selected rows, not the list length.
+    def __init__(self, master, items, render, rotation_of, describe=None, fast_decode=lambda: True, index_of=None):
+        self._items = items  # () -> current list of paths, in stitch order
+        self._index_of = index_of  # path -> index in items() or None; a linear search when not given
+        self._rotation_of = rotation_of  # path -> rotation, part of the thumbnail key
+        self._describe = describe  # path -> secondary caption, or None
+        self._fast_decode = fast_decode
+        self.frame = tk.Frame(master)
+        self.canvas = tk.Canvas(self.frame, bg="white", highlightthickness=1, takefocus=1)
+        scrollbar = tk.Scrollbar(self.frame, orient=tk.VERTICAL, command=self.canvas.yview)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.canvas.config(yscrollcommand=lambda first, last: (scrollbar.set(first, last), self._schedule_redraw()))
+        self.canvas.bind("<Configure>", lambda e: self.refresh())
+        self.canvas.bind("<Button-1>", self._on_click)
+        self.canvas.bind("<Shift-Button-1>", lambda e: self._on_click(e, extend=True))
+        toggle = "Command" if sys.platform == "darwin" else "Control"
+        self.canvas.bind(f"<{toggle}-Button-1>", lambda e: self._on_click(e, toggle=True))
+        self.canvas.bind("<Shift-Up>", lambda e: self._extend_by(-1))
+        self.canvas.bind("<Shift-Down>", lambda e: self._extend_by(1))
+        self.canvas.bind("<MouseWheel>", lambda e: self.canvas.yview_scroll(-1 if e.delta > 0 else 1, "units"))
+        self.canvas.bind("<Button-4>", lambda e: self.canvas.yview_scroll(-1, "units"))  # X11 wheel
+        self.canvas.bind("<Button-5>", lambda e: self.canvas.yview_scroll(1, "units"))
+        self.canvas.config(yscrollincrement=ROW_HEIGHT)
+
+        self._selected = set()  # paths
+        self._active = None  # path
+        self._anchor = None  # path where a Shift range starts
+        self.thumbs = PreviewCache(LIST_THUMB_CACHE_MAX_BYTES)  # key (path, rotation, w, h, fast) -> PhotoImage
+        self.renderer = PreviewPrefetcher(render)  # render(path, rotation, box, fast) -> PIL image
+        self._redraw_job = None; self._poll_job = None
+        self._on_canvas = []  # PhotoImages drawn right now; keeps evicted ones alive while visible
+
+    # --- geometry / Tk plumbing ---
+    def pack(self, **kwargs): self.frame.pack(**kwargs)
+
+    def bind(self, sequence, func): return self.canvas.bind(sequence, func)
+
+    def focus_set(self): self.canvas.focus_set()
+
+    def refresh(self):  # rows added / removed / reordered / re-rotated: one relayout, visible rows only
+        n = len(self._items())
+        self.canvas.config(scrollregion=(0, 0, max(1, self.canvas.winfo_width()), max(1, n * ROW_HEIGHT)))
+        self._schedule_redraw()
+
+    def discard(self, paths):  # rows deleted: drop their selection state and thumbnails; O(len(paths))
+        for path in paths:
+            self._selected.discard(path); self.thumbs.discard_path(path)
+            if path == self._active: self._active = None
+            if path == self._anchor: self._anchor = None
+
+    # --- Listbox-style API (indices into items()) ---
+    def size(self): return len(self._items())
+
+    def get(self, idx): return os.path.basename(self._items()[idx])
+
+    def curselection(self):  # O(k log k) for k selected rows
+        positions = (self._position(path) for path in self._selected)
+        return tuple(sorted(i for i in positions if i is not None))
+
+    def selection_includes(self, idx):
+        items = self._items()
+        return 0 <= idx < len(items) and items[idx] in self._selected
+
+    def selection_set(self, first, last=None):
+        self._selected.update(self._slice(first, last)); self._schedule_redraw()
+
+    def selection_clear(self, first, last=None):
+        if last == tk.END and first == 0: self._selected.clear()  # the common "clear all", without a scan
+        else: self._selected.difference_update(self._slice(first, last))
+        self._schedule_redraw()
+
+    def activate(self, idx):
+        items = self._items()
+        if items:
+            self._active = items[max(0, min(self._index(idx), len(items) - 1))]
+            if self._anchor is None or self._anchor not in self._selected: self._anchor = self._active
+        self._schedule_redraw()
+
+    def index(self, which):  # only tk.ACTIVE / tk.END are needed by the app
+        if which == tk.END: return len(self._items())
+        if which != tk.ACTIVE: return int(which)
+        if self._active is None: raise tk.TclError("no active row")
+        idx = self._position(self._active)
+        if idx is None: raise tk.TclError("active row was removed")
+        return idx
+
+    def see(self, idx):
+        n = len(self._items())
+        if not n: return
+        top = self.canvas.canvasy(0); height = self.canvas.winfo_height()
+        y = self._index(idx) * ROW_HEIGHT
+        if y < top or y + ROW_HEIGHT > top + height:
+            self.canvas.yview_moveto(max(0.0, (y - max(0, height - ROW_HEIGHT) / 2) / (n * ROW_HEIGHT)))
+
+    def _index(self, idx):
+        return len(self._items()) - 1 if idx == tk.END else int(idx)
+
+    def _position(self, path):  # index of path in items(), or None
+        if self._index_of is not None: return self._index_of(path)
+        try:
+            return self._items().index(path)
+        except ValueError:
+            return None
+
+    def _slice(self, first, last):
+        items = self._items()
+        first = self._index(first); last = first if last is None else self._index(last)
+        return items[max(0, first):last + 1]
+
+    # --- mouse / keyboard ---
+    def _on_click(self, event, extend=False, toggle=False):
+        self.canvas.focus_set()
+        items = self._items()
+        idx = int(self.canvas.canvasy(event.y) // ROW_HEIGHT)
+        if not 0 <= idx < len(items): return "break"
+        path = items[idx]
+        if extend and self._anchor in self._selected:
+            a = self._position(self._anchor)
+            self._selected = set(items[min(a, idx):max(a, idx) + 1])
+        elif toggle:
+            self._selected.symmetric_difference_update((path,)); self._anchor = path
+        else:
+            self._selected = {path}; self._anchor = path
+        self._active = path
+        self._schedule_redraw()
+        self.canvas.event_generate("<<ListboxSelect>>")
+        return "break"
+
+    def _extend_by(self, step):  # Shift+Up / Shift+Down grow or shrink the range from the anchor
+        items = self._items()
+        if not items: return "break"
+        try:
+            idx = self.index(tk.ACTIVE)
+        except tk.TclError:
+            idx = 0
+        new = max(0, min(len(items) - 1, idx + step))
+        if self._anchor not in self._selected: self._anchor = items[idx]
+        a = self._position(self._anchor)
+        self._selected = set(items[min(a, new):max(a, new) + 1]); self._active = items[new]
+        self.see(new); self._schedule_redraw()
+        self.canvas.event_generate("<<ListboxSelect>>")
+        return "break"
+
+    # --- drawing ---
+    def _schedule_redraw(self):
+        if self._redraw_job is None:
+            self._redraw_job = self.canvas.after_idle(self._redraw)
+
+    def _redraw(self):  # delete and redraw the visible rows only; a few dozen canvas items regardless of list length
+        self._redraw_job = None
+        items = self._items()
+        self.canvas.delete("row"); self._on_canvas = []
+        top = self.canvas.canvasy(0); width = max(1, self.canvas.winfo_width())
+        start = max(0, int(top // ROW_HEIGHT)); end = min(len(items), int((top + self.canvas.winfo_height()) // ROW_HEIGHT) + 2)
+        fast = self._fast_decode()
+        plan = []
+        for idx in range(start, end):
+            path = items[idx]; y = idx * ROW_HEIGHT
+            selected = path in self._selected
+            if selected or path == self._active:
+                self.canvas.create_rectangle(0, y, width - 1, y + ROW_HEIGHT - 1, tags="row",
+                                             fill=SELECT_FILL if selected else "", outline=ACTIVE_OUTLINE if path == self._active else "")
+            key = (path, self._rotation_of(path), THUMB_SIZE, THUMB_SIZE, fast)
+            photo = self.thumbs.get(key)
+            if photo is not None:
+                self._on_canvas.append(photo)
+                self.canvas.create_image(2 + THUMB_SIZE // 2, y + ROW_HEIGHT // 2, image=photo, tags="row")
+            else:
+                self.canvas.create_rectangle(2, y + 2, 2 + THUMB_SIZE, y + 2 + THUMB_SIZE, fill="#e6e6e6", outline="", tags="row")
+                plan.append((key, (path, key[1], (THUMB_SIZE, THUMB_SIZE), fast)))
+            self.canvas.create_text(THUMB_SIZE + 10, y + 6, text=os.path.basename(path), anchor="nw", tags="row")
+            caption = self._describe(path) if self._describe else None
+            if caption:
+                self.canvas.create_text(THUMB_SIZE + 10, y + ROW_HEIGHT - 6, text=caption, anchor="sw", fill="#707070", tags="row")
+        self.renderer.schedule(plan)  # replaces rows that scrolled away
+        if plan and self._poll_job is None:
+            self._poll_job = self.canvas.after(30, self._collect_thumbs)
+
+    def _collect_thumbs(self):  # PhotoImages must be created on the Tk thread
+        from PIL import ImageTk  # on first use: the list is built before Pillow is loaded
+        self._poll_job = None
+        landed = False
+        while True:
+            try:
+                key, img = self.renderer.results.get_nowait()
+            except queue.Empty:
+                break
+            self.thumbs.put(key, ImageTk.PhotoImage(img), img.width * img.height * 4); landed = True
+        if landed: self._schedule_redraw()
+        if self.renderer.busy() or not self.renderer.results.empty():
+            self._poll_job = self.canvas.after(30, self._collect_thumbs)
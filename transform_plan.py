@@ -0,0 +1,94 @@
+import time  # per-step timings
+from PIL import Image  # transposes and resampling
+
+Transpose = Image.Transpose
+EXIF_ORIENTATION = 0x0112  # 1 = upright
+EXIF_TRANSPOSE = {2: Transpose.FLIP_LEFT_RIGHT, 3: Transpose.ROTATE_180, 4: Transpose.FLIP_TOP_BOTTOM,  # as ImageOps.exif_transpose
+                  5: Transpose.TRANSPOSE, 6: Transpose.ROTATE_270, 7: Transpose.TRANSVERSE, 8: Transpose.ROTATE_90}
+ROTATION_TRANSPOSE = {90: Transpose.ROTATE_90, 180: Transpose.ROTATE_180, 270: Transpose.ROTATE_270}  # counter-clockwise, as Image.rotate
+SWAPS_AXES = {Transpose.ROTATE_90, Transpose.ROTATE_270, Transpose.TRANSPOSE, Transpose.TRANSVERSE}
+RESIZE_BEFORE_CONVERT = {"L"}  # per-channel identical after conversion, so resample the single channel
+
+
+def _compose_table():  # (orientation, rotation) -> one transpose or None; a 2x2 probe tells the 8 results apart
+    probe = Image.frombytes("L", (2, 2), bytes((1, 2, 3, 4)))
+    single = {probe.tobytes(): None}
+    for method in Transpose: single[probe.transpose(method).tobytes()] = method
+    table = {}
+    for orientation in range(1, 9):
+        for rotation in (0, 90, 180, 270):
+            img = probe
+            for method in (EXIF_TRANSPOSE.get(orientation), ROTATION_TRANSPOSE.get(rotation)):
+                if method is not None: img = img.transpose(method)
+            table[orientation, rotation] = single[img.tobytes()]
+    return table
+
+
+COMPOSED_TRANSPOSE = _compose_table()
+
+
+def normalize_orientation(orientation):  # unknown / corrupt tags count as upright
+    return orientation if orientation in EXIF_TRANSPOSE else 1
+
+
+def read_orientation(img):  # EXIF orientation of an opened image, without forcing a decode
+    if img.format == "PNG" and "exif" not in img.info:
+        return 1  # PngImageFile.getexif() would decode the whole image looking for a trailing eXIf chunk
+    return normalize_orientation(img.getexif().get(EXIF_ORIENTATION, 1))
+
+
+def oriented_size(size, orientation):  # (w, h) as displayed once EXIF orientation is applied
+    w, h = size
+    return (h, w) if normalize_orientation(orientation) >= 5 else (w, h)
+
+
+class TransformPlan:  # one source's convert / transpose / resize steps, cheapest order first
+    # Downscaling before the transpose moves less data, but LANCZOS is not symmetric under a transpose of its input
+    # grid: rotated outputs of textured sources differ by up to a few tens of levels from transposing first. That's fine for the
+    # fast path (draft decoding already approximates), so exact=True keeps the transpose first, pixel for pixel as before
+    def __init__(self, size, mode, orientation, rotation, output_size, exact=False):
+        # size / mode: as stored in the file; rotation: user rotation (degrees counter-clockwise);
+        # output_size: final size, in display orientation
+        rotation %= 360
+        orientation = normalize_orientation(orientation)
+        self.output_size = output_size
+        self.angle = 0  # off-grid user rotation: generic rotate, as before (never produced by the GUI)
+        if rotation in (0, 90, 180, 270):
+            self.transpose = COMPOSED_TRANSPOSE[orientation, rotation]
+        else:
+            self.transpose = EXIF_TRANSPOSE.get(orientation); self.angle = rotation
+        swap = self.transpose in SWAPS_AXES and not self.angle
+        self.resize_size = (output_size[1], output_size[0]) if swap else output_size  # resize target in file orientation
+        self.convert = None if mode == "RGB" else "RGB"
+        self.convert_last = mode in RESIZE_BEFORE_CONVERT
+        self.transpose_first = exact or bool(self.angle) or size[0] * size[1] < output_size[0] * output_size[1]  # upscaling
+
+    def steps(self):  # readable step list, for logging
+        steps = []
+        if self.convert and not self.convert_last: steps.append("convert")
+        if self.transpose_first and self.transpose is not None: steps.append(self.transpose.name.lower())
+        if self.angle: steps.append(f"rotate{self.angle}")
+        steps.append("resize")
+        if not self.transpose_first and self.transpose is not None: steps.append(self.transpose.name.lower())
+        if self.convert and self.convert_last: steps.append("convert")
+        return steps
+
+    def execute(self, img, timings=None):  # img: the decoded source (never returned as is); timings: {stage: seconds}
+        t0 = time.perf_counter(); source = img
+        if self.convert and not self.convert_last: img = img.convert(self.convert)
+        t1 = time.perf_counter()
+        if self.transpose_first:
+            if self.transpose is not None: img = img.transpose(self.transpose)
+            if self.angle: img = img.rotate(self.angle, expand=True, fillcolor=(255, 255, 255))
+        t2 = time.perf_counter()
+        target = self.output_size if self.transpose_first else self.resize_size
+        if img.size != target: img = img.resize(target, Image.Resampling.LANCZOS)  # high-quality resample
+        t3 = time.perf_counter()
+        if not self.transpose_first and self.transpose is not None: img = img.transpose(self.transpose)  # lossless, on the small buffer
+        if self.convert and self.convert_last: img = img.convert(self.convert)
+        if img is source: img = img.copy()  # nothing to do: still detach from the (soon closed) source file
+        if timings is not None:
+            timings["decode"] = timings.get("decode", 0.0) + t1 - t0  # mode conversion finishes the decode
+            timings["resize"] = t3 - t2
+            if self.transpose is not None or self.angle: timings["rotate"] = t2 - t1 + time.perf_counter() - t3
+        return img